@@ -1,14 +1,25 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file
+from flask import (Flask, render_template, request, redirect, url_for, session, flash, send_file,
+                   jsonify, Response, stream_with_context)
 import os
+import json
 import pandas as pd
 import requests
+import time
 import uuid
+import shutil
 import sqlite3
+import zipfile
+import threading
 from datetime import datetime, timedelta
 import xml.etree.ElementTree as ET
 import urllib.parse
 import logging
 
+import evend_jobs
+import evend_pipeline
+import evend_scheduler
+import evend_storage
+
 app = Flask(__name__)
 app.secret_key = 'UN_SECRET_POUR_SESSION'
 
@@ -21,6 +32,18 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+# Exports préparés hors pointe : sous-dossier, pour que le watcher Selenium ne les publie pas
+PREFETCH_FOLDER = os.path.join(UPLOAD_FOLDER, "prefetch")
+os.makedirs(PREFETCH_FOLDER, exist_ok=True)
+# Pages des exports complets en cours (reprise par curseur) ; les CSV livrés vont dans evend_storage
+EXPORT_FOLDER = os.path.join(UPLOAD_FOLDER, "exports")
+os.makedirs(EXPORT_FOLDER, exist_ok=True)
+# Copies CSV facultatives des exports publiés en flux (hors racine : pas de republication par le watcher)
+PIPELINE_FOLDER = os.path.join(UPLOAD_FOLDER, "pipeline")
+os.makedirs(PIPELINE_FOLDER, exist_ok=True)
+# Rapports écrits par evend_publish (PublishJob.rejects_file / dead_letter_file)
+REPORT_FOLDERS = {"rejets": os.path.join(UPLOAD_FOLDER, "rejects"),
+                  "echecs": os.path.join(UPLOAD_FOLDER, "dead_letters")}
 
 # --- Configuration eBay API ---
 EBAY_CLIENT_ID = 'AlexBoss-eVendImp-PRD-bd29c22a7-4a223ad6'
@@ -34,6 +57,23 @@ EBAY_SITE_ID_PRIMARY = "2"
 # --- Limites ---
 MAX_PER_FILE = 500
 MAX_PER_DAY = 2000
+PREFETCH_MAX_AGE = timedelta(hours=int(os.environ.get("EBAY_PREFETCH_MAX_AGE_HOURS", "12")))
+
+EXPORT_PER_PAGE = 100  # taille de page fixe : le curseur reste aligné d'une reprise à l'autre
+# Tri par date de mise en ligne : les nouvelles annonces arrivent en fin de liste au lieu de décaler les pages
+EXPORT_SORT = "StartTime"
+EXPORT_CURSOR_MAX_AGE = timedelta(days=int(os.environ.get("EBAY_EXPORT_CURSOR_DAYS", "7")))
+
+# Suivi des logs : au plus LOG_CHUNK_MAX octets par réponse, quelle que soit la taille du log
+LOG_CHUNK_MAX = 64 * 1024
+SSE_POLL_INTERVAL = 0.5
+SSE_KEEPALIVE = 15
+# Chaque flux SSE est fermé au bout de SSE_MAX_DURATION s : EventSource se reconnecte avec ses offsets,
+# ce qui libère régulièrement le worker/thread occupé par le flux
+SSE_MAX_DURATION = int(os.environ.get("SSE_MAX_DURATION", "25"))
+SSE_RETRY_MS = 1000
+
+CSV_COLUMNS = ['item_id', 'sku', 'titre', 'description', 'prix', 'stock', 'condition', 'categorie', 'image_url']
 
 # --- SQLite ---
 DB_PATH = os.path.join(BASE_DIR, "evend.db")
@@ -61,10 +101,38 @@ def init_db():
         count INTEGER,
         PRIMARY KEY(user_id, date)
     )""")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS export_cursors (
+        user_id TEXT PRIMARY KEY,
+        export_id TEXT,
+        next_page INTEGER,
+        total_pages INTEGER,
+        delivered_page INTEGER,
+        pending_items INTEGER,
+        parts INTEGER,
+        items_done INTEGER,
+        started_at TEXT,
+        updated_at TEXT
+    )""")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS export_seen_items (
+        export_id TEXT,
+        item_id TEXT,
+        PRIMARY KEY(export_id, item_id)
+    )""")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS prefetch_exports (
+        user_id TEXT PRIMARY KEY,
+        csv_path TEXT,
+        items INTEGER,
+        created_at TEXT
+    )""")
     conn.commit()
     conn.close()
 
 init_db()
+# Ménage périodique d'uploads/ (un seul processus l'exécute à la fois)
+evend_storage.start_gc()
 
 # --- DB Helpers ---
 def save_tokens(user_id, access_token, refresh_token, expires_in):
@@ -112,6 +180,40 @@ def get_import_count_today(user_id):
     conn.close()
     return row['count'] if row else 0
 
+def save_prefetched_export(user_id, csv_path, items):
+    conn = get_db()
+    old = conn.execute("SELECT csv_path FROM prefetch_exports WHERE user_id=?", (user_id,)).fetchone()
+    conn.execute("""
+        INSERT INTO prefetch_exports (user_id, csv_path, items, created_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            csv_path=excluded.csv_path,
+            items=excluded.items,
+            created_at=excluded.created_at
+    """, (user_id, csv_path, items, datetime.utcnow().isoformat()))
+    conn.commit()
+    conn.close()
+    if old and old['csv_path'] != csv_path and os.path.exists(old['csv_path']):
+        os.remove(old['csv_path'])
+
+def take_prefetched_export(user_id, max_items):
+    """Export préparé s'il est récent et tient dans le quota, à ranger par l'appelant. Retourne (chemin, nb) ou (None, 0)."""
+    conn = get_db()
+    row = conn.execute("SELECT * FROM prefetch_exports WHERE user_id=?", (user_id,)).fetchone()
+    if not row:
+        conn.close()
+        return None, 0
+    conn.execute("DELETE FROM prefetch_exports WHERE user_id=?", (user_id,))
+    conn.commit()
+    conn.close()
+
+    fresh = datetime.utcnow() - datetime.fromisoformat(row['created_at']) < PREFETCH_MAX_AGE
+    if not fresh or row['items'] > max_items or not os.path.exists(row['csv_path']):
+        if os.path.exists(row['csv_path']):
+            os.remove(row['csv_path'])
+        return None, 0
+    return row['csv_path'], row['items']
+
 # --- OAuth Helpers ---
 def refresh_token(user_id, refresh_token):
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
@@ -160,7 +262,40 @@ def get_text(parent, tag):
     el = parent.find(f"ebay:{tag}", ns)
     return el.text if el is not None else None
 
-def fetch_active_items(oauth_token, max_items=MAX_PER_FILE):
+EBAY_NS = {'ebay': 'urn:ebay:apis:eBLBaseComponents'}
+
+def parse_item(it):
+    item_id = get_text(it, 'ItemID')
+    sku = get_text(it, 'SKU') or "NO_SKU"
+    title = get_text(it, 'Title') or "Titre manquant"
+    desc = get_text(it, 'Description') or "Description non disponible"
+    primary_cat = it.find(".//ebay:PrimaryCategory/ebay:CategoryName", EBAY_NS)
+    cat_name = primary_cat.text if primary_cat is not None else "Autre"
+    price_text = get_text(it, 'CurrentPrice')
+    prix = float(price_text) if price_text else 0.0
+    condition_name = get_text(it, 'ConditionDisplayName') or "Non spécifié"
+    qty_total_text = get_text(it, 'Quantity')
+    qty_sold_text = get_text(it, 'QuantitySold')
+    qty_total = int(qty_total_text) if qty_total_text and qty_total_text.isdigit() else 0
+    qty_sold = int(qty_sold_text) if qty_sold_text and qty_sold_text.isdigit() else 0
+    stock = max(qty_total - qty_sold, 0)
+    images = it.findall(".//ebay:PictureURL", EBAY_NS)
+    image_url = images[0].text if images else "https://via.placeholder.com/150"
+
+    return {
+        "item_id": item_id,
+        "sku": sku,
+        "titre": title,
+        "description": desc,
+        "prix": prix,
+        "condition": condition_name,
+        "categorie": cat_name,
+        "image_url": image_url,
+        "stock": stock
+    }
+
+def fetch_active_page(oauth_token, page_number, per_page, sort="TimeLeft"):
+    """Une page de GetMyeBaySelling. Retourne (items, nb total de pages) ; lève une exception si l'appel échoue."""
     headers = {
         "X-EBAY-API-CALL-NAME": "GetMyeBaySelling",
         "X-EBAY-API-SITEID": EBAY_SITE_ID_PRIMARY,
@@ -168,21 +303,14 @@ def fetch_active_items(oauth_token, max_items=MAX_PER_FILE):
         "X-EBAY-API-IAF-TOKEN": oauth_token,
         "Content-Type": "text/xml"
     }
-
-    items = []
-    page_number = 1
-    per_page = min(max_items, 100)
-    total_fetched = 0
-
-    while total_fetched < max_items:
-        body = f"""<?xml version="1.0" encoding="utf-8"?>
+    body = f"""<?xml version="1.0" encoding="utf-8"?>
 <GetMyeBaySellingRequest xmlns="urn:ebay:apis:eBLBaseComponents">
   <RequesterCredentials>
     <eBayAuthToken>{oauth_token}</eBayAuthToken>
   </RequesterCredentials>
   <ActiveList>
     <Include>true</Include>
-    <Sort>TimeLeft</Sort>
+    <Sort>{sort}</Sort>
     <Pagination>
       <EntriesPerPage>{per_page}</EntriesPerPage>
       <PageNumber>{page_number}</PageNumber>
@@ -190,72 +318,294 @@ def fetch_active_items(oauth_token, max_items=MAX_PER_FILE):
   </ActiveList>
 </GetMyeBaySellingRequest>
 """
+    resp = requests.post(
+        EBAY_TRADING_API_URL,
+        headers=headers,
+        data=body.encode("utf-8"),
+        timeout=60
+    )
+    resp.raise_for_status()
+
+    root = ET.fromstring(resp.text)
+    if get_text(root, 'Ack') == 'Failure':
+        errors = root.find("ebay:Errors", EBAY_NS)
+        message = get_text(errors, 'LongMessage') if errors is not None else None
+        raise RuntimeError(message or "Ack=Failure")
+
+    total_pages_el = root.find(".//ebay:ActiveList/ebay:PaginationResult/ebay:TotalNumberOfPages", EBAY_NS)
+    total_pages = int(total_pages_el.text) if total_pages_el is not None else 1
+
+    items = []
+    items_node = root.find(".//ebay:ActiveList/ebay:ItemArray", EBAY_NS)
+    for it in items_node.findall(".//ebay:Item", EBAY_NS) if items_node is not None else []:
         try:
-            resp = requests.post(
-                EBAY_TRADING_API_URL,
-                headers=headers,
-                data=body.encode("utf-8"),
-                timeout=60
-            )
-            resp.raise_for_status()
+            items.append(parse_item(it))
         except Exception as e:
-            logging.error(f"Erreur API eBay: {e}")
-            break
+            logging.warning(f"Erreur sur un item: {e}")
+    return items, total_pages
 
-        root = ET.fromstring(resp.text)
-        ns = {'ebay': 'urn:ebay:apis:eBLBaseComponents'}
-        items_node = root.find(".//ebay:ActiveList/ebay:ItemArray", ns)
-        if items_node is None:
-            break
+def fetch_active_items(oauth_token, max_items=MAX_PER_FILE, on_call=None):
+    """Annonces actives, page par page. Une page en échec lève l'exception : jamais de liste partielle."""
+    items = []
+    page_number = 1
+    per_page = min(max_items, 100)
 
-        item_elements = items_node.findall(".//ebay:Item", ns)
-        if not item_elements:
+    while len(items) < max_items:
+        if on_call:
+            on_call()
+        try:
+            page_items, total_pages = fetch_active_page(oauth_token, page_number, per_page)
+        except Exception as e:
+            logging.error(f"Erreur API eBay (page {page_number}): {e}")
+            raise
+        if not page_items:
             break
-
-        for it in item_elements:
-            try:
-                sku = get_text(it, 'SKU') or "NO_SKU"
-                title = get_text(it, 'Title') or "Titre manquant"
-                desc = get_text(it, 'Description') or "Description non disponible"
-                primary_cat = it.find(".//ebay:PrimaryCategory/ebay:CategoryName", ns)
-                cat_name = primary_cat.text if primary_cat is not None else "Autre"
-                price_text = get_text(it, 'CurrentPrice')
-                prix = float(price_text) if price_text else 0.0
-                condition_name = get_text(it, 'ConditionDisplayName') or "Non spécifié"
-                qty_total_text = get_text(it, 'Quantity')
-                qty_sold_text = get_text(it, 'QuantitySold')
-                qty_total = int(qty_total_text) if qty_total_text and qty_total_text.isdigit() else 0
-                qty_sold = int(qty_sold_text) if qty_sold_text and qty_sold_text.isdigit() else 0
-                stock = max(qty_total - qty_sold, 0)
-                images = it.findall(".//ebay:PictureURL", ns)
-                image_url = images[0].text if images else "https://via.placeholder.com/150"
-
-                items.append({
-                    "sku": sku,
-                    "titre": title,
-                    "description": desc,
-                    "prix": prix,
-                    "condition": condition_name,
-                    "categorie": cat_name,
-                    "image_url": image_url,
-                    "stock": stock
-                })
-                total_fetched += 1
-                if total_fetched >= max_items:
-                    break
-            except Exception as e:
-                logging.warning(f"Erreur sur un item: {e}")
-                continue
+        items.extend(page_items[:max_items - len(items)])
 
         page_number += 1
-        total_pages_el = root.find(".//ebay:PaginationResult/ebay:TotalNumberOfPages", ns)
-        total_pages = int(total_pages_el.text) if total_pages_el is not None else 1
         if page_number > total_pages:
             break
 
     print(f"✅ Nombre total d'items actifs trouvés : {len(items)}")
     return items
 
+def write_export_csv(items, csv_path):
+    df = pd.DataFrame(items, columns=CSV_COLUMNS)
+    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+    return len(df)
+
+# --- Export complet par curseur (reprise page par page) ---
+def get_export_cursor(user_id):
+    conn = get_db()
+    row = conn.execute("SELECT * FROM export_cursors WHERE user_id=?", (user_id,)).fetchone()
+    conn.close()
+    if not row:
+        return None
+    cursor = dict(row)
+    if datetime.utcnow() - datetime.fromisoformat(cursor['updated_at']) > EXPORT_CURSOR_MAX_AGE:
+        # Catalogue trop ancien pour être recollé : on repart de la page 1
+        drop_export_cursor(cursor)
+        return None
+    return cursor
+
+def new_export_cursor(user_id):
+    now = datetime.utcnow().isoformat()
+    cursor = {
+        'user_id': user_id, 'export_id': uuid.uuid4().hex, 'next_page': 1, 'total_pages': None,
+        'delivered_page': 0, 'pending_items': 0, 'parts': 0, 'items_done': 0,
+        'started_at': now, 'updated_at': now,
+    }
+    os.makedirs(export_dir(cursor), exist_ok=True)
+    save_export_cursor(cursor)
+    return cursor
+
+def save_export_cursor(cursor):
+    cursor['updated_at'] = datetime.utcnow().isoformat()
+    conn = get_db()
+    conn.execute("""
+        INSERT OR REPLACE INTO export_cursors
+            (user_id, export_id, next_page, total_pages, delivered_page, pending_items, parts, items_done, started_at, updated_at)
+        VALUES (:user_id, :export_id, :next_page, :total_pages, :delivered_page, :pending_items, :parts, :items_done, :started_at, :updated_at)
+    """, cursor)
+    conn.commit()
+    conn.close()
+
+def drop_export_cursor(cursor):
+    conn = get_db()
+    conn.execute("DELETE FROM export_cursors WHERE user_id=?", (cursor['user_id'],))
+    conn.execute("DELETE FROM export_seen_items WHERE export_id=?", (cursor['export_id'],))
+    conn.commit()
+    conn.close()
+    shutil.rmtree(export_dir(cursor), ignore_errors=True)
+
+def export_dir(cursor):
+    return os.path.join(EXPORT_FOLDER, cursor['export_id'])
+
+def export_page_path(cursor, page):
+    return os.path.join(export_dir(cursor), f"page_{page:05d}.csv")
+
+def export_finished(cursor):
+    return cursor['total_pages'] is not None and cursor['next_page'] > cursor['total_pages']
+
+def unseen_items(cursor, items):
+    """Annonces pas encore exportées par ce curseur (item_id)."""
+    conn = get_db()
+    seen = {row['item_id'] for row in conn.execute(
+        "SELECT item_id FROM export_seen_items WHERE export_id=?", (cursor['export_id'],))}
+    conn.close()
+    return [item for item in items if str(item['item_id']) not in seen]
+
+def mark_items_seen(cursor, items):
+    conn = get_db()
+    conn.executemany("INSERT OR IGNORE INTO export_seen_items (export_id, item_id) VALUES (?, ?)",
+                     [(cursor['export_id'], str(item['item_id'])) for item in items])
+    conn.commit()
+    conn.close()
+
+def advance_export(cursor, oauth_token, max_items):
+    """Récupère les pages suivantes tant que le lot non livré tient dans max_items.
+
+    Chaque page est écrite sur disque avant d'avancer le curseur. À la reprise, la dernière page
+    obtenue est relue : des annonces terminées entre-temps ont pu y faire remonter des annonces
+    pas encore exportées, ajoutées à la page suivante. Une annonce déjà exportée (item_id) est écartée.
+    Retourne le message d'erreur eBay, ou None.
+    """
+    carried = None  # annonces remontées, relues une fois par reprise
+    while not export_finished(cursor):
+        page = cursor['next_page']
+        try:
+            if carried is None:
+                carried = []
+                if page > 1:
+                    previous, _ = fetch_active_page(oauth_token, page - 1, EXPORT_PER_PAGE, sort=EXPORT_SORT)
+                    carried = unseen_items(cursor, previous)
+            if cursor['pending_items'] + len(carried) + EXPORT_PER_PAGE > max_items:
+                return None
+            items, total_pages = fetch_active_page(oauth_token, page, EXPORT_PER_PAGE, sort=EXPORT_SORT)
+        except Exception as e:
+            logging.error(f"Erreur API eBay (page {page}): {e}")
+            return str(e)
+
+        page_items = carried + unseen_items(cursor, items)
+        carried = []
+        path = export_page_path(cursor, page)
+        write_export_csv(page_items, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        mark_items_seen(cursor, page_items)
+
+        cursor['next_page'] = page + 1
+        cursor['total_pages'] = total_pages if items else page
+        cursor['pending_items'] += len(page_items)
+        save_export_cursor(cursor)
+    return None
+
+def deliver_export(cursor):
+    """Regroupe les pages récupérées non livrées en CSV numérotés de MAX_PER_FILE lignes. Retourne (chemins, nb)."""
+    pages = range(cursor['delivered_page'] + 1, cursor['next_page'])
+    frames = [pd.read_csv(export_page_path(cursor, page), dtype={'item_id': str, 'sku': str}, encoding='utf-8-sig')
+              for page in pages]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CSV_COLUMNS)
+
+    paths = []
+    for start in range(0, len(df), MAX_PER_FILE):
+        cursor['parts'] += 1
+        name = f"{cursor['user_id']}_ebay_{cursor['export_id'][:8]}_part{cursor['parts']:03d}.csv"
+        path = os.path.join(EXPORT_FOLDER, name)
+        df.iloc[start:start + MAX_PER_FILE].to_csv(path, index=False, encoding='utf-8-sig')
+        paths.append(evend_storage.store_file(cursor['user_id'], path, "export", name))
+
+    cursor['delivered_page'] = cursor['next_page'] - 1
+    cursor['pending_items'] = 0
+    cursor['items_done'] += len(df)
+    if export_finished(cursor):
+        drop_export_cursor(cursor)
+    else:
+        save_export_cursor(cursor)
+        for page in pages:
+            os.remove(export_page_path(cursor, page))
+    return paths, len(df)
+
+# --- Export en flux vers la publication ---
+def stream_export(user_id, oauth_token, max_items, stream_id, keep_csv=False, attempts=3):
+    """Pousse chaque page GetMyeBaySelling dans le flux dès réception : la publication démarre sur la page 1."""
+    kept = []
+    pushed = 0
+    page = 1
+    error = None
+    try:
+        while pushed < max_items:
+            for attempt in range(1, attempts + 1):
+                try:
+                    items, total_pages = fetch_active_page(oauth_token, page, EXPORT_PER_PAGE)
+                    error = None
+                    break
+                except Exception as e:
+                    error = str(e)
+                    logging.error(f"Erreur API eBay (page {page}, essai {attempt}/{attempts}): {e}")
+                    if attempt < attempts:
+                        time.sleep(2 ** attempt)
+            if error:
+                break
+
+            items = items[:max_items - pushed]
+            if page == 1:
+                evend_pipeline.set_expected(stream_id, min(total_pages * EXPORT_PER_PAGE, max_items))
+            if not evend_pipeline.push_items(stream_id, items):
+                logging.warning(f"Flux {stream_id} supprimé (job annulé ou en échec) : export arrêté page {page}")
+                break
+            add_import(user_id, len(items))
+            pushed += len(items)
+            if keep_csv:
+                kept.extend(items)
+
+            page += 1
+            if not items or page > total_pages:
+                break
+    finally:
+        evend_pipeline.close_stream(stream_id, error)
+
+    if kept:
+        csv_path = os.path.join(PIPELINE_FOLDER, f"{user_id}_ebay_{stream_id[:8]}.csv")
+        write_export_csv(kept, csv_path)
+        set_last_csv_path(user_id, evend_storage.store_file(user_id, csv_path, "export"))
+    print(f"✅ Export en flux terminé pour {user_id}: {pushed} articles")
+
+# --- Suivi des logs et de la progression ---
+def user_log_paths(user_id):
+    return {
+        "import_log": os.path.join(UPLOAD_FOLDER, f"{user_id}_import_log.txt"),
+        "selenium_log": os.path.join(UPLOAD_FOLDER, f"{user_id}_selenium_log.txt"),
+    }
+
+def read_log_since(path, offset):
+    """Lignes complètes écrites après `offset` (octets). Retourne (texte, nouvel offset, reset).
+
+    reset : le client doit repartir de zéro (log recréé, ou trop de retard : seule la fin est renvoyée).
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return "", 0, offset > 0
+    reset = False
+    if offset > size:
+        offset, reset = 0, True
+    skip_partial = False
+    if size - offset > LOG_CHUNK_MAX:
+        offset, reset, skip_partial = size - LOG_CHUNK_MAX, True, True
+    if offset == size:
+        return "", offset, reset
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size - offset)
+    if skip_partial:
+        start = data.find(b"\n") + 1
+        data, offset = data[start:], offset + start
+    # Ligne en cours d'écriture : renvoyée au prochain appel (ne coupe pas un caractère UTF-8)
+    end = data.rfind(b"\n") + 1
+    data = data[:end]
+    return data.decode("utf-8", errors="replace"), offset + len(data), reset
+
+def publish_progress(user_id):
+    jobs = evend_scheduler.load_queue()
+    entry = next((j for j in jobs if j["id"] == user_id), None)
+    if entry is None:
+        return {"queued": False}
+    wait, finish = evend_scheduler.estimate_wait(user_id, jobs)
+    return {
+        "queued": True,
+        "articles": entry["articles"],
+        "remaining": entry["remaining"],
+        "running": entry["running"],
+        "wait_s": round(wait),
+        "eta_s": round(finish),
+    }
+
+def sse_event(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, ensure_ascii=False)}"]
+    return "\n".join(lines) + "\n\n"
+
 # =====================================================
 # ROUTES
 # =====================================================
@@ -411,22 +761,29 @@ def download_ebay_csv():
         return redirect(url_for('index'))
 
     target_count = min(MAX_PER_FILE, remaining_quota)
-    items = fetch_active_items(access_token, target_count)
-    
-    if not items:
-        flash("📭 Aucune annonce active trouvée sur eBay.")
-        return redirect(url_for('index'))
 
-    df = pd.DataFrame(items)
-    column_order = ['sku', 'titre', 'description', 'prix', 'stock', 'condition', 'categorie', 'image_url']
-    df = df[column_order]
-    
-    csv_path = os.path.join(UPLOAD_FOLDER, f"{user_id}_ebay_{uuid.uuid4().hex}.csv")
-    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+    # Export déjà préparé hors pointe par ebay_prefetch.py : servi sans appel eBay
+    csv_path, count = take_prefetched_export(user_id, target_count)
+    if not csv_path:
+        try:
+            items = fetch_active_items(access_token, target_count)
+        except Exception as e:
+            flash(f"❌ Export eBay interrompu, réessaie dans un instant ({e}).")
+            return redirect(url_for('index'))
+
+        if not items:
+            flash("📭 Aucune annonce active trouvée sur eBay.")
+            return redirect(url_for('index'))
+
+        csv_path = os.path.join(EXPORT_FOLDER, f"{user_id}_ebay_{uuid.uuid4().hex}.csv")
+        count = write_export_csv(items, csv_path)
+
+    # Ré-export identique au précédent : aucune nouvelle copie sur disque, juste une référence
+    csv_path = evend_storage.store_file(user_id, csv_path, "export")
     set_last_csv_path(user_id, csv_path)
-    add_import(user_id, len(items))
+    add_import(user_id, count)
 
-    flash(f"✅ CSV eBay prêt avec {len(df)} annonces.")
+    flash(f"✅ CSV eBay prêt avec {count} annonces.")
     
     return send_file(
         csv_path, 
@@ -435,6 +792,254 @@ def download_ebay_csv():
         mimetype="text/csv"
     )
 
+@app.route('/download_ebay_export')
+def download_ebay_export():
+    """Export complet pour les gros catalogues : reprend à la dernière page obtenue, livre des CSV numérotés (zip si plusieurs)."""
+    print("=== DOWNLOAD EXPORT ===")
+    user_id = session.get('user_id')
+
+    if not user_id or not get_user_tokens(user_id):
+        flash("⚠️ Connecte d'abord ton compte eBay.")
+        return redirect(url_for('index'))
+
+    access_token = get_valid_token(user_id)
+    if not access_token:
+        flash("❌ Impossible d'obtenir un token eBay valide.")
+        return redirect(url_for('index'))
+
+    remaining_quota = max(0, MAX_PER_DAY - get_import_count_today(user_id))
+    if remaining_quota < EXPORT_PER_PAGE:
+        flash(f"⚠️ Quota journalier atteint ({MAX_PER_DAY}). L'export reprendra demain là où il s'est arrêté.")
+        return redirect(url_for('index'))
+
+    cursor = get_export_cursor(user_id) or new_export_cursor(user_id)
+    error = advance_export(cursor, access_token, remaining_quota)
+    paths, count = deliver_export(cursor)
+
+    if not paths:
+        if error:
+            flash(f"❌ Erreur eBay page {cursor['next_page']}: {error}. Réessaie, l'export reprendra à cette page.")
+        elif cursor['items_done']:
+            flash(f"✅ Export terminé : {cursor['items_done']} annonces au total.")
+        else:
+            flash("📭 Aucune annonce active trouvée sur eBay.")
+        return redirect(url_for('index'))
+
+    set_last_csv_path(user_id, paths[-1])
+    add_import(user_id, count)
+
+    if export_finished(cursor):
+        flash(f"✅ Export terminé : {count} annonces dans ce lot, {cursor['items_done']} au total.")
+    else:
+        reason = f"erreur eBay: {error}" if error else "quota du jour atteint"
+        flash(f"⏸️ {count} annonces livrées ({cursor['items_done']} au total), "
+              f"reprise à la page {cursor['next_page']}/{cursor['total_pages']} ({reason}).")
+
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if len(paths) == 1:
+        return send_file(paths[0], as_attachment=True,
+                         download_name=f"ebay_annonces_{stamp}_part{cursor['parts']:03d}.csv", mimetype="text/csv")
+
+    zip_path = os.path.join(EXPORT_FOLDER, f"{user_id}_ebay_{stamp}.zip")
+    first_part = cursor['parts'] - len(paths) + 1
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for part, path in enumerate(paths, first_part):
+            zf.write(path, arcname=f"ebay_annonces_part{part:03d}.csv")
+    return send_file(zip_path, as_attachment=True,
+                     download_name=f"ebay_annonces_{stamp}.zip", mimetype="application/zip")
+
+@app.route('/download_report/<kind>')
+def download_report(kind):
+    """Rapport du dernier import : lignes rejetées avant publication, ou articles abandonnés."""
+    user_id = session.get('user_id')
+    if not user_id or kind not in REPORT_FOLDERS:
+        return redirect(url_for('index'))
+    path = os.path.join(REPORT_FOLDERS[kind], f"{user_id}.csv")
+    if not os.path.exists(path):
+        flash("📭 Aucun rapport pour le dernier import.")
+        return redirect(url_for('index'))
+    return send_file(path, as_attachment=True, download_name=f"evend_{kind}.csv", mimetype="text/csv")
+
+@app.route('/export_and_publish', methods=['POST'])
+def export_and_publish():
+    """Export eBay et publication e-Vend en parallèle : les articles passent au publisher page par page."""
+    print("=== EXPORT AND PUBLISH ===")
+    user_id = session.get('user_id')
+
+    if not user_id or not get_user_tokens(user_id):
+        flash("⚠️ Connecte d'abord ton compte eBay.")
+        return redirect(url_for('index'))
+
+    evend_email = request.form.get('evend_email', '').strip()
+    evend_password = request.form.get('evend_password', '')
+    if not evend_email or not evend_password:
+        flash("⚠️ Email et mot de passe e-Vend requis pour publier.")
+        return redirect(url_for('index'))
+
+    access_token = get_valid_token(user_id)
+    if not access_token:
+        flash("❌ Impossible d'obtenir un token eBay valide.")
+        return redirect(url_for('index'))
+
+    remaining_quota = max(0, MAX_PER_DAY - get_import_count_today(user_id))
+    if remaining_quota <= 0:
+        flash(f"⚠️ Quota journalier atteint ({MAX_PER_DAY}).")
+        return redirect(url_for('index'))
+
+    stream_id = evend_pipeline.open_stream(user_id)
+    evend_jobs.submit_job(
+        user_id, None, evend_email, evend_password,
+        livraison_ramassage=request.form.get('livraison_ramassage') == 'on',
+        frais_port_article=request.form.get('frais_port_article') or 0,
+        frais_port_sup=request.form.get('frais_port_sup') or 0,
+        stream_id=stream_id,
+    )
+    threading.Thread(
+        target=stream_export,
+        args=(user_id, access_token, min(MAX_PER_FILE, remaining_quota), stream_id,
+              request.form.get('keep_csv') == 'on'),
+        daemon=True,
+    ).start()
+
+    flash("🚀 Export lancé : la publication sur e-Vend commence dès la première page eBay.")
+    return redirect(url_for('index'))
+
+def log_chunk(kind):
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify(log="", offset=0, reset=False)
+    offset = max(0, request.args.get('offset', default=0, type=int))
+    text, offset, reset = read_log_since(user_log_paths(user_id)[kind], offset)
+    return jsonify(log=text, offset=offset, reset=reset)
+
+@app.route('/get_import_log')
+def get_import_log():
+    return log_chunk("import_log")
+
+@app.route('/get_selenium_log')
+def get_selenium_log():
+    return log_chunk("selenium_log")
+
+@app.route('/get_progress')
+def get_progress():
+    user_id = session.get('user_id')
+    return jsonify(publish_progress(user_id) if user_id else {"queued": False})
+
+@app.route('/jobs')
+def list_jobs():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify(jobs=[])
+    return jsonify(jobs=evend_jobs.list_jobs(user_id))
+
+def owned_job(job_id):
+    job = evend_jobs.get_job(job_id)
+    if job is None or job['user_id'] != session.get('user_id'):
+        return None
+    return job
+
+@app.route('/jobs/<int:job_id>/<action>', methods=['POST'])
+def control_job(job_id, action):
+    """cancel / pause / resume : immédiat pour un job en attente, appliqué par le worker sous la seconde sinon."""
+    if action not in evend_jobs.JOB_ACTIONS:
+        return jsonify(error="Action inconnue"), 404
+    if owned_job(job_id) is None:
+        return jsonify(error="Job introuvable"), 404
+    status = evend_jobs.control_job(job_id, action)
+    if status is None:
+        return jsonify(error=f"Action « {action} » impossible dans l'état actuel du job"), 409
+    return jsonify(id=job_id, status=status)
+
+@app.route('/jobs/<int:job_id>/priority', methods=['POST'])
+def set_job_priority(job_id):
+    job = owned_job(job_id)
+    if job is None:
+        return jsonify(error="Job introuvable"), 404
+    data = request.get_json(silent=True) or request.form
+    try:
+        priority = int(data.get('priority'))
+    except (TypeError, ValueError):
+        return jsonify(error="Priorité entière attendue"), 400
+    evend_jobs.set_priority(job_id, priority)
+    if job['status'] == 'running':
+        evend_scheduler.set_priority(job['user_id'], priority)
+    return jsonify(id=job_id, priority=priority)
+
+@app.route('/cancel_csv', methods=['POST'])
+def cancel_csv():
+    """Bouton Annuler : annule les jobs actifs de l'utilisateur (et l'import en mode script via le flag)."""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify(message="⚠️ Aucune session active.")
+    cancelled = [job['id'] for job in evend_jobs.list_jobs(user_id)
+                 if job['status'] in ('pending', 'running', 'paused')
+                 and evend_jobs.control_job(job['id'], 'cancel')]
+    if not cancelled:
+        # Publisher lancé hors daemon : seul le flag historique est lu
+        open(os.path.join(UPLOAD_FOLDER, f"{user_id}_cancel_flag"), "w").close()
+    return jsonify(message="🛑 Annulation demandée, l'import s'arrête dans un instant.", jobs=cancelled)
+
+@app.route('/events')
+def events():
+    """Flux SSE : nouvelles lignes des logs et progression de la publication, dès qu'elles apparaissent.
+
+    L'id de chaque événement porte les offsets des logs : EventSource le renvoie à la reconnexion.
+    Le flux est borné à SSE_MAX_DURATION s ; le client se reconnecte et reprend là où il en était.
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return Response(status=204)  # 204 : EventSource arrête de se reconnecter
+
+    offsets = {
+        "import_log": request.args.get('import_offset', default=0, type=int),
+        "selenium_log": request.args.get('selenium_offset', default=0, type=int),
+    }
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if ':' in last_event_id:
+        import_offset, selenium_offset = last_event_id.split(':', 1)
+        if import_offset.isdigit() and selenium_offset.isdigit():
+            offsets = {"import_log": int(import_offset), "selenium_log": int(selenium_offset)}
+    paths = user_log_paths(user_id)
+
+    def stream():
+        last_progress, queue_mtime = None, None
+        last_sent = time.time()
+        deadline = last_sent + SSE_MAX_DURATION
+        # Offsets de départ en id : une reconnexion sans nouvelle ligne reprend au même point
+        yield f"id: {offsets['import_log']}:{offsets['selenium_log']}\nretry: {SSE_RETRY_MS}\n\n"
+        while time.time() < deadline:
+            sent = False
+            for kind, path in paths.items():
+                text, offset, reset = read_log_since(path, offsets[kind])
+                if text or reset:
+                    offsets[kind] = offset
+                    event_id = f"{offsets['import_log']}:{offsets['selenium_log']}"
+                    yield sse_event(kind, {"log": text, "offset": offset, "reset": reset}, event_id)
+                    sent = True
+
+            # File de publication relue seulement quand elle a changé
+            try:
+                mtime = os.path.getmtime(evend_scheduler.QUEUE_FILE)
+            except OSError:
+                mtime = None
+            if mtime != queue_mtime or last_progress is None:
+                queue_mtime = mtime
+                progress = publish_progress(user_id)
+                if progress != last_progress:
+                    last_progress = progress
+                    yield sse_event("progress", progress)
+                    sent = True
+
+            if sent:
+                last_sent = time.time()
+            elif time.time() - last_sent > SSE_KEEPALIVE:
+                yield ": keepalive\n\n"
+                last_sent = time.time()
+            time.sleep(SSE_POLL_INTERVAL)
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/reconnect')
 def reconnect():
     """Page pour reconnecter eBay quand le token est expiré"""
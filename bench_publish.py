@@ -0,0 +1,156 @@
+# bench_publish.py (banc de mesure du publisher contre le faux site e-Vend local)
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+from werkzeug.serving import make_server
+
+from evend_governor import process_tree_rss
+from evend_trace import percentile
+
+PHASES = [
+    ("get_driver", "démarrage navigateur"),
+    ("acquire_driver", "obtention navigateur"),
+    ("ensure_logged_in", "connexion"),
+    ("publish_item_selenium", "publication Selenium"),
+    ("fill_form", "remplissage formulaire"),
+    ("upload_images", "upload photos"),
+    ("wait_for_success_message", "attente confirmation"),
+    ("publish_item", "article complet"),
+]
+
+# =====================================================
+# Instrumentation
+# =====================================================
+class PhaseTimer:
+    def __init__(self):
+        self.samples = {name: [] for name, _ in PHASES}
+        self.lock = threading.Lock()
+
+    def wrap(self, module, name):
+        original = getattr(module, name)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.samples[name].append(time.perf_counter() - start)
+        setattr(module, name, timed)
+
+def write_csv(path, n_items, base_url):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sku", "titre", "description", "prix", "stock", "condition", "categorie", "image_url"])
+        for i in range(n_items):
+            writer.writerow([f"BENCH{i}", f"Article de test {i}", "Description de test", "19.99", "1",
+                             "Neuf", "Autre", f"{base_url}/photos/{i}.jpg"])
+
+# =====================================================
+# Main
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser(description="Banc de mesure du publisher e-Vend (faux site local)")
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--mode", choices=["selenium", "http"], default="selenium")
+    parser.add_argument("--latency", type=float, default=0.05, help="latence simulée par requête (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--json", dest="json_path", help="écrit aussi le rapport JSON dans ce fichier")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    # evend_publish lit sa configuration à l'import : l'environnement doit être prêt avant
+    os.environ.update({
+        "EVEND_BASE_URL": base_url,
+        "EVEND_EMAIL": "bench@example.com",
+        "EVEND_PASSWORD": "bench",
+        "EVEND_PUBLISH_MODE": args.mode,
+        "USER_ID": f"bench_{os.getpid()}",
+    })
+
+    import fake_evend
+    fake_evend.app.config["LATENCY"] = args.latency
+    fake_evend.app.config["FAILURE_RATE"] = args.failure_rate
+    server = make_server("127.0.0.1", args.port, fake_evend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    import evend_publish
+    timer = PhaseTimer()
+    for name, _ in PHASES:
+        timer.wrap(evend_publish, name)
+
+    # Échantillonnage RSS des navigateurs lancés par get_driver
+    drivers, peak_rss, stop = [], [0], threading.Event()
+    original_get_driver = evend_publish.get_driver
+    def tracked_get_driver(*a, **kw):
+        driver = original_get_driver(*a, **kw)
+        drivers.append(driver)
+        return driver
+    evend_publish.get_driver = tracked_get_driver
+
+    def sample_rss():
+        while not stop.wait(0.5):
+            for driver in list(drivers):
+                try:
+                    peak_rss[0] = max(peak_rss[0], process_tree_rss(driver.service.process.pid))
+                except Exception:
+                    pass
+    threading.Thread(target=sample_rss, daemon=True).start()
+
+    csv_path = os.path.join(tempfile.mkdtemp(), "bench.csv")
+    write_csv(csv_path, args.items, base_url)
+
+    start = time.perf_counter()
+    evend_publish.process_csv(csv_path)
+    elapsed = time.perf_counter() - start
+    if evend_publish._driver_pool is not None:
+        evend_publish._driver_pool.shutdown()
+    stop.set()
+    server.shutdown()
+
+    try:
+        os.remove(evend_publish.current_job().progress_file)
+    except OSError:
+        pass
+
+    report = {
+        "mode": args.mode,
+        "items": args.items,
+        "elapsed_s": round(elapsed, 2),
+        "items_per_minute": round(args.items / elapsed * 60, 2) if elapsed else 0,
+        "peak_browser_rss_mb": round(peak_rss[0] / 1024 / 1024, 1),
+        "server": dict(fake_evend.stats),
+        "phases": {
+            name: {
+                "label": label,
+                "count": len(timer.samples[name]),
+                "total_s": round(sum(timer.samples[name]), 3),
+                "p50_s": round(percentile(timer.samples[name], 50), 3),
+                "p95_s": round(percentile(timer.samples[name], 95), 3),
+            }
+            for name, label in PHASES
+        },
+    }
+
+    print(f"\n📊 {report['items']} articles en {report['elapsed_s']}s "
+          f"-> {report['items_per_minute']} articles/min (mode {args.mode})")
+    print(f"🧠 RSS navigateur max: {report['peak_browser_rss_mb']} Mo")
+    print(f"{'phase':<28}{'n':>5}{'total':>10}{'p50':>10}{'p95':>10}")
+    for name, phase in report["phases"].items():
+        print(f"{phase['label']:<28}{phase['count']:>5}{phase['total_s']:>10.3f}{phase['p50_s']:>10.3f}{phase['p95_s']:>10.3f}")
+    print(f"🌐 Faux e-Vend: {report['server']}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+# ebay_prefetch.py (exports eBay préparés hors pointe : téléchargement instantané dans /download_ebay_csv)
+import os
+import sys
+import math
+import time
+import uuid
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from app import (
+    MAX_PER_FILE, PREFETCH_FOLDER,
+    get_db, get_valid_token, fetch_active_items, write_export_csv, save_prefetched_export,
+)
+
+# ---------------------------- Configuration ----------------------------
+# Plages horaires (heure locale du serveur) séparées par des virgules ; une plage peut passer minuit
+PREFETCH_WINDOWS = os.environ.get("EBAY_PREFETCH_WINDOWS", "01:00-06:00")
+PREFETCH_CONCURRENCY = int(os.environ.get("EBAY_PREFETCH_CONCURRENCY", "2"))
+# Appels GetMyeBaySelling autorisés par jour pour le préchargement, tous comptes confondus
+PREFETCH_DAILY_CALLS = int(os.environ.get("EBAY_PREFETCH_DAILY_CALLS", "1000"))
+# Un export plus récent que ça n'est pas refait ; doit rester sous PREFETCH_MAX_AGE pour être servi
+PREFETCH_REFRESH_AFTER = timedelta(hours=int(os.environ.get("EBAY_PREFETCH_REFRESH_HOURS", "6")))
+POLL_INTERVAL = int(os.environ.get("EBAY_PREFETCH_INTERVAL", "600"))
+# Compte sans annonce ou token révoqué : pas de nouvel essai avant ce délai
+PREFETCH_SKIP_AFTER = timedelta(hours=int(os.environ.get("EBAY_PREFETCH_SKIP_HOURS", "24")))
+# Échec API : nouvel essai après PREFETCH_FAILURE_BACKOFF, doublé à chaque échec consécutif (plafonné à PREFETCH_SKIP_AFTER)
+PREFETCH_FAILURE_BACKOFF = timedelta(minutes=int(os.environ.get("EBAY_PREFETCH_FAILURE_BACKOFF_MIN", "30")))
+
+PER_PAGE = 100  # EntriesPerPage max de GetMyeBaySelling
+
+# =====================================================
+# Fenêtres hors pointe
+# =====================================================
+def parse_windows(spec):
+    windows = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, end = part.split("-")
+        windows.append((datetime.strptime(start.strip(), "%H:%M").time(),
+                        datetime.strptime(end.strip(), "%H:%M").time()))
+    return windows
+
+def in_window(now=None, windows=None):
+    now = (now or datetime.now()).time()
+    for start, end in windows if windows is not None else parse_windows(PREFETCH_WINDOWS):
+        if start <= end:
+            if start <= now < end:
+                return True
+        elif now >= start or now < end:
+            return True
+    return False
+
+# =====================================================
+# Budget d'appels API (partagé entre processus via evend.db)
+# =====================================================
+def init_budget():
+    conn = get_db()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS prefetch_budget (
+        date TEXT PRIMARY KEY,
+        calls INTEGER
+    )""")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS prefetch_attempts (
+        user_id TEXT PRIMARY KEY,
+        attempted_at TEXT,
+        status TEXT,
+        failures INTEGER DEFAULT 0,
+        retry_at TEXT
+    )""")
+    conn.commit()
+    conn.close()
+
+init_budget()
+
+def reserve_calls(count):
+    """Réserve `count` appels sur le budget du jour. Retourne False si le budget ne suffit pas."""
+    today = datetime.utcnow().date().isoformat()
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT calls FROM prefetch_budget WHERE date=?", (today,)).fetchone()
+        used = row['calls'] if row else 0
+        if used + count > PREFETCH_DAILY_CALLS:
+            conn.rollback()
+            return False
+        conn.execute("""
+            INSERT INTO prefetch_budget (date, calls) VALUES (?, ?)
+            ON CONFLICT(date) DO UPDATE SET calls = prefetch_budget.calls + excluded.calls
+        """, (today, count))
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+def refund_calls(count):
+    if count <= 0:
+        return
+    today = datetime.utcnow().date().isoformat()
+    conn = get_db()
+    conn.execute("UPDATE prefetch_budget SET calls = MAX(0, calls - ?) WHERE date=?", (count, today))
+    conn.commit()
+    conn.close()
+
+# =====================================================
+# Sélection des comptes
+# =====================================================
+def record_attempt(user_id, status):
+    """Note le résultat d'un préchargement : "ok", "empty" (aucune annonce), "no_token" ou "failed".
+
+    Hors "ok", le compte n'est pas resélectionné avant retry_at, sinon il repasserait à chaque tour.
+    """
+    now = datetime.utcnow()
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT failures FROM prefetch_attempts WHERE user_id=?", (user_id,)).fetchone()
+        failures = (row['failures'] if row else 0) + 1 if status == "failed" else 0
+        if status == "ok":
+            retry_at = None
+        elif status == "failed":
+            retry_at = now + min(PREFETCH_FAILURE_BACKOFF * 2 ** (failures - 1), PREFETCH_SKIP_AFTER)
+        else:
+            retry_at = now + PREFETCH_SKIP_AFTER
+        conn.execute("""
+            INSERT INTO prefetch_attempts (user_id, attempted_at, status, failures, retry_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET attempted_at=excluded.attempted_at, status=excluded.status,
+                failures=excluded.failures, retry_at=excluded.retry_at
+        """, (user_id, now.isoformat(), status, failures, retry_at.isoformat() if retry_at else None))
+        conn.commit()
+    finally:
+        conn.close()
+
+def users_due():
+    """Comptes connectés (refresh token présent) sans export préparé récent ni essai en attente, les plus anciens d'abord."""
+    now = datetime.utcnow()
+    cutoff = (now - PREFETCH_REFRESH_AFTER).isoformat()
+    conn = get_db()
+    rows = conn.execute("""
+        SELECT u.id FROM users u
+        LEFT JOIN prefetch_exports p ON p.user_id = u.id
+        LEFT JOIN prefetch_attempts a ON a.user_id = u.id
+        WHERE u.refresh_token IS NOT NULL
+          AND (p.created_at IS NULL OR p.created_at < ?)
+          AND (a.retry_at IS NULL OR a.retry_at <= ?)
+        ORDER BY p.created_at IS NOT NULL, p.created_at
+    """, (cutoff, now.isoformat())).fetchall()
+    conn.close()
+    return [row['id'] for row in rows]
+
+# =====================================================
+# Export
+# =====================================================
+def prefetch_user(user_id):
+    reserved = math.ceil(MAX_PER_FILE / PER_PAGE)
+    if not reserve_calls(reserved):
+        return False
+
+    calls = [0]
+    def on_call():
+        calls[0] += 1
+
+    status = "failed"
+    try:
+        access_token = get_valid_token(user_id)
+        if not access_token:
+            print(f"⚠️ Préchargement {user_id}: token eBay invalide, ignoré")
+            status = "no_token"
+            return True
+        items = fetch_active_items(access_token, MAX_PER_FILE, on_call=on_call)
+        if not items:
+            status = "empty"
+            return True
+        csv_path = os.path.join(PREFETCH_FOLDER, f"{user_id}_ebay_{uuid.uuid4().hex}.csv")
+        count = write_export_csv(items, csv_path)
+        save_prefetched_export(user_id, csv_path, count)
+        print(f"📦 Export préparé pour {user_id}: {count} annonces ({calls[0]} appels API)")
+        status = "ok"
+        return True
+    except Exception as e:
+        print(f"❌ Préchargement {user_id} en échec: {e}")
+        return True
+    finally:
+        refund_calls(reserved - calls[0])
+        try:
+            record_attempt(user_id, status)
+        except Exception as e:
+            print(f"⚠️ Préchargement {user_id}: essai non enregistré: {e}")
+
+def run_once(executor, in_flight):
+    """Soumet les comptes dus sans dépasser PREFETCH_CONCURRENCY exports simultanés."""
+    for user_id in users_due():
+        with in_flight["lock"]:
+            if len(in_flight["users"]) >= PREFETCH_CONCURRENCY:
+                return
+            if user_id in in_flight["users"]:
+                continue
+            in_flight["users"].add(user_id)
+
+        def job(uid=user_id):
+            try:
+                if not prefetch_user(uid):
+                    print("⏸️ Budget d'appels eBay du jour épuisé, préchargement suspendu")
+            finally:
+                with in_flight["lock"]:
+                    in_flight["users"].discard(uid)
+
+        executor.submit(job)
+
+def run_scheduler():
+    print(f"🕑 Préchargement eBay actif (fenêtres {PREFETCH_WINDOWS}, {PREFETCH_CONCURRENCY} en parallèle, "
+          f"{PREFETCH_DAILY_CALLS} appels/jour)")
+    in_flight = {"lock": threading.Lock(), "users": set()}
+    with ThreadPoolExecutor(max_workers=PREFETCH_CONCURRENCY) as executor:
+        while True:
+            if in_window():
+                try:
+                    run_once(executor, in_flight)
+                except Exception as e:
+                    print(f"❌ Erreur planificateur de préchargement: {e}")
+            time.sleep(POLL_INTERVAL)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--once":
+        with ThreadPoolExecutor(max_workers=PREFETCH_CONCURRENCY) as executor:
+            for uid in users_due():
+                executor.submit(prefetch_user, uid)
+    else:
+        run_scheduler()
@@ -0,0 +1,316 @@
+# evend_categories.py (index précalculé catégorie eBay -> catégorie e-Vend : normalisation, mots-clés, approché, forçages)
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import difflib
+import threading
+import unicodedata
+from datetime import datetime
+from html.parser import HTMLParser
+
+# ---------------------------- Configuration ----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "evend.db")
+INDEX_FILE = os.environ.get("EVEND_CATEGORY_INDEX", os.path.join(BASE_DIR, "uploads", "evend_categories.json"))
+DEFAULT_CATEGORY = os.environ.get("EVEND_DEFAULT_CATEGORY", "Autre / Divers")
+FUZZY_CUTOFF = float(os.environ.get("EVEND_CATEGORY_FUZZY_CUTOFF", "0.8"))
+RELOAD_INTERVAL = 300  # forçages ajoutés depuis un autre processus : pris en compte sous 5 min
+
+# Arbre e-Vend de repli tant qu'aucun index n'a été construit (mêmes valeurs que le formulaire de l'app)
+DEFAULT_CATEGORIES = [
+    "Accessoires et bijoux", "Aliments", "Animaux", "Antiquités", "Art", "Articles pour animaux",
+    "Artisanat", "Automobile / Machinerie", "Bluray", "Bureau / papeterie", "CD", "Collection",
+    "Cours et jardin", "Décoration / maison", "DVD", "Électronique", "Hydraulique",
+    "Jeux video / console", "Jouets / Jeux", "Livres", "Meuble", "Outils",
+    "Produits hygiène et beauté", "Quincaillerie", "Sports et plein-air",
+    "Vêtements / Chaussures et accessoires", "Vinyles / VHS / Cassettes", "Autre / Divers",
+]
+
+# Mots (normalisés) des noms de catégories eBay, anglais et français, vers la catégorie e-Vend
+KEYWORDS = {
+    "Accessoires et bijoux": "jewelry jewellery bijou bijoux watch watches montre montres bracelet necklace collier ring bague handbag sac",
+    "Aliments": "food aliment aliments epicerie grocery",
+    "Articles pour animaux": "pet pets animal animaux dog chien cat chat aquarium",
+    "Antiquités": "antique antiques antiquite antiquites vintage",
+    "Art": "art painting peinture sculpture print affiche poster",
+    "Artisanat": "craft crafts artisanat sewing couture knitting tricot",
+    "Automobile / Machinerie": "auto automotive car cars truck trucks vehicle vehicule motor moteur motorcycle moto parts pieces machinery machinerie",
+    "Bluray": "bluray blu ray",
+    "Bureau / papeterie": "office bureau stationery papeterie school",
+    "CD": "cd cds",
+    "Collection": "collectible collectibles collection coin coins monnaie stamp stamps timbre timbres card cards carte cartes trading",
+    "Cours et jardin": "garden jardin yard patio lawn pelouse outdoor",
+    "Décoration / maison": "home maison decor decoration kitchen cuisine bedding literie lighting eclairage",
+    "DVD": "dvd dvds movie movies film films",
+    "Électronique": "electronics electronique phone phones smartphone smartphones telephone cell computer computers ordinateur laptop tablet tablette camera cameras audio tv television",
+    "Hydraulique": "hydraulic hydraulique pump pompe",
+    "Jeux video / console": "video game games jeu jeux console consoles playstation xbox nintendo",
+    "Jouets / Jeux": "toy toys jouet jouets lego puzzle board doll poupee hobby hobbies",
+    "Livres": "book books livre livres magazine magazines comic comics bd",
+    "Meuble": "furniture meuble meubles chair chaise table sofa",
+    "Outils": "tool tools outil outils",
+    "Produits hygiène et beauté": "health beauty beaute sante hygiene cosmetic cosmetics makeup maquillage fragrance parfum",
+    "Quincaillerie": "hardware quincaillerie screw vis plumbing plomberie electrical",
+    "Sports et plein-air": "sport sports sporting fitness camping hunting chasse fishing peche bike velo golf hockey",
+    "Vêtements / Chaussures et accessoires": "clothing clothes vetement vetements shoe shoes chaussure chaussures apparel fashion mode shirt dress robe",
+    "Vinyles / VHS / Cassettes": "vinyl vinyle vinyles record records vhs cassette cassettes lp",
+}
+# Mots qui ne distinguent aucune catégorie
+STOP_WORDS = {"de", "des", "du", "la", "le", "les", "the", "of", "for", "pour", "autre", "autres",
+              "other", "divers", "accessories", "accessoires", "misc", "general", "more"}
+
+# =====================================================
+# Normalisation
+# =====================================================
+def normalize(name):
+    """« Vêtements / Chaussures & Accessoires » -> « vetements chaussures accessoires »."""
+    text = unicodedata.normalize("NFKD", str(name or "")).encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join(word for word in re.sub(r"[^a-z0-9]+", " ", text).split() if word not in ("and", "et"))
+
+def tokens(name):
+    return [word for word in normalize(name).split() if word not in STOP_WORDS]
+
+# =====================================================
+# Index (construit une fois, fichier local)
+# =====================================================
+class CategoryParser(HTMLParser):
+    """Options du <select id="categorie"> de la page de création d'annonce e-Vend."""
+
+    def __init__(self):
+        super().__init__()
+        self.in_select = False
+        self.option = None
+        self.categories = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "select" and "categorie" in (attrs.get("id"), attrs.get("name")):
+            self.in_select = True
+        elif tag == "option" and self.in_select and "disabled" not in attrs:
+            self.option = {"value": attrs.get("value"), "label": ""}
+
+    def handle_data(self, data):
+        if self.option is not None:
+            self.option["label"] += data
+
+    def handle_endtag(self, tag):
+        if tag == "option" and self.option is not None:
+            label = self.option["label"].strip()
+            value = self.option["value"] if self.option["value"] is not None else label
+            if value:
+                self.categories.append({"value": value, "label": label or value})
+            self.option = None
+        elif tag == "select":
+            self.in_select = False
+
+def categories_from_html(html):
+    parser = CategoryParser()
+    parser.feed(html)
+    return parser.categories
+
+def build_index(categories):
+    """categories : [{'value', 'label'}] (libellé « Parent > Enfant » accepté). Retourne l'index sérialisable.
+
+    Tout le travail est fait ici : la résolution d'un nom ne fait plus que des recherches de dictionnaire.
+    """
+    exact, keywords = {}, {}
+    values = [c["value"] for c in categories]
+    for category in categories:
+        value, label = category["value"], category.get("label") or category["value"]
+        for name in [value, label] + [part for part in label.split(">")]:
+            key = normalize(name)
+            if key and key not in STOP_WORDS:
+                exact.setdefault(key, value)
+        for word in tokens(value):
+            keywords.setdefault(word, value)
+    for value, words in KEYWORDS.items():
+        target = value if value in values else None
+        if target is None:
+            # Arbre e-Vend renommé : on rattache les mots-clés à la valeur la plus proche
+            close = difflib.get_close_matches(normalize(value), [normalize(v) for v in values], n=1, cutoff=0.6)
+            target = next((v for v in values if close and normalize(v) == close[0]), None)
+        if target:
+            for word in words.split():
+                keywords.setdefault(word, target)
+    default = DEFAULT_CATEGORY if DEFAULT_CATEGORY in values else (values[-1] if values else DEFAULT_CATEGORY)
+    return {
+        "built_at": datetime.utcnow().isoformat(),
+        "default": default,
+        "categories": categories,
+        "exact": exact,
+        "keywords": keywords,
+    }
+
+def save_index(index, path=INDEX_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    reload()
+
+def fetch_category_tree(email, password):
+    """Page de création d'annonce lue avec la session e-Vend en cache de `email` (se connecter une fois avant)."""
+    import requests
+    import evend_sessions
+    from evend_http import EVEND_NEW_LISTING_URL
+
+    cookies = evend_sessions.load_cookies(email, password)
+    if not cookies:
+        raise RuntimeError(f"Aucune session e-Vend en cache pour {email}")
+    jar = requests.cookies.RequestsCookieJar()
+    for cookie in cookies:
+        jar.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+    resp = requests.get(EVEND_NEW_LISTING_URL, cookies=jar, timeout=20)
+    resp.raise_for_status()
+    categories = categories_from_html(resp.text)
+    if not categories:
+        raise RuntimeError("Liste des catégories introuvable sur la page e-Vend")
+    return categories
+
+# =====================================================
+# Forçages manuels (evend.db)
+# =====================================================
+def get_db():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_overrides_table():
+    conn = get_db()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS category_overrides (
+        ebay_key TEXT PRIMARY KEY,
+        ebay_name TEXT,
+        category TEXT,
+        updated_at TEXT
+    )""")
+    conn.commit()
+    conn.close()
+
+init_overrides_table()
+
+def set_override(ebay_name, category):
+    """Lève ValueError si `category` n'est pas une valeur de l'arbre e-Vend indexé (le formulaire la refuserait)."""
+    values = {c["value"] for c in current_index()["categories"]}
+    if category not in values:
+        close = difflib.get_close_matches(category, list(values), n=1)
+        hint = f" (vouliez-vous dire « {close[0]} » ?)" if close else ""
+        raise ValueError(f"Catégorie e-Vend inconnue: « {category} »{hint}")
+    conn = get_db()
+    conn.execute("""
+        INSERT INTO category_overrides (ebay_key, ebay_name, category, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(ebay_key) DO UPDATE SET category=excluded.category, updated_at=excluded.updated_at
+    """, (normalize(ebay_name), ebay_name, category, datetime.utcnow().isoformat()))
+    conn.commit()
+    conn.close()
+    reload()
+
+def remove_override(ebay_name):
+    conn = get_db()
+    conn.execute("DELETE FROM category_overrides WHERE ebay_key=?", (normalize(ebay_name),))
+    conn.commit()
+    conn.close()
+    reload()
+
+def load_overrides():
+    conn = get_db()
+    rows = conn.execute("SELECT ebay_key, category FROM category_overrides").fetchall()
+    conn.close()
+    return {row["ebay_key"]: row["category"] for row in rows}
+
+# =====================================================
+# Résolution (mémoïsée)
+# =====================================================
+_state = {"index": None, "overrides": {}, "cache": {}, "loaded_at": 0.0}
+_lock = threading.Lock()
+
+def _load():
+    try:
+        with open(INDEX_FILE, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = build_index([{"value": c, "label": c} for c in DEFAULT_CATEGORIES])
+    _state.update(index=index, overrides=load_overrides(), cache={}, loaded_at=time.time())
+
+def reload():
+    with _lock:
+        _state["index"] = None
+
+def _ensure_loaded():
+    if _state["index"] is None or time.time() - _state["loaded_at"] > RELOAD_INTERVAL:
+        _load()
+
+def current_index():
+    with _lock:
+        _ensure_loaded()
+        return _state["index"]
+
+def _resolve_uncached(name, index, overrides):
+    key = normalize(name)
+    if key in overrides:
+        return overrides[key], "forçage"
+    if key in index["exact"]:
+        return index["exact"][key], "exact"
+
+    votes = {}
+    for word in tokens(name):
+        category = index["keywords"].get(word)
+        if category:
+            votes[category] = votes.get(category, 0) + 1
+    if votes:
+        best = max(votes.values())
+        leaders = [category for category, count in votes.items() if count == best]
+        if len(leaders) == 1:
+            return leaders[0], "mots-clés"
+        # Égalité entre catégories : l'ordre des mots ne doit pas trancher, on passe à l'approché
+
+    close = difflib.get_close_matches(key, index["exact"].keys(), n=1, cutoff=FUZZY_CUTOFF)
+    if close:
+        return index["exact"][close[0]], "approché"
+    return index["default"], "défaut"
+
+def resolve(name, with_method=False):
+    """Catégorie e-Vend pour un nom de catégorie eBay (ou une valeur e-Vend déjà résolue, inchangée)."""
+    with _lock:
+        _ensure_loaded()
+        cache = _state["cache"]
+        if name not in cache:
+            cache[name] = _resolve_uncached(name, _state["index"], _state["overrides"])
+        result = cache[name]
+    return result if with_method else result[0]
+
+def resolve_series(series):
+    """Résolution vectorisée d'une colonne pandas : un seul calcul par nom distinct."""
+    mapping = {name: resolve(name) for name in series.dropna().unique()}
+    return series.map(mapping).fillna(resolve(""))
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "build":
+        if len(sys.argv) > 2:
+            with open(sys.argv[2], "r", encoding="utf-8") as f:
+                tree = categories_from_html(f.read())
+        else:
+            tree = fetch_category_tree(os.environ["EVEND_EMAIL"], os.environ["EVEND_PASSWORD"])
+        save_index(build_index(tree))
+        print(f"✅ Index des catégories construit: {len(tree)} catégories -> {INDEX_FILE}")
+    elif command == "override" and len(sys.argv) == 4:
+        try:
+            set_override(sys.argv[2], sys.argv[3])
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ « {sys.argv[2]} » -> « {sys.argv[3]} »")
+    elif command == "unoverride" and len(sys.argv) == 3:
+        remove_override(sys.argv[2])
+    elif command == "lookup" and len(sys.argv) > 2:
+        for name in sys.argv[2:]:
+            category, method = resolve(name, with_method=True)
+            print(f"{name} -> {category} ({method})")
+    else:
+        print("Usage: python evend_categories.py build [page.html] | override <nom eBay> <catégorie e-Vend>"
+              " | unoverride <nom eBay> | lookup <nom eBay>...")
@@ -0,0 +1,111 @@
+# evend_daemon.py (daemon de publication multi-utilisateurs : un seul processus, pool de workers partagé)
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import evend_scheduler
+import evend_publish
+import evend_pipeline
+from evend_publish import PublishJob
+from evend_jobs import claim_next_job, finish_job, pause_job, requeue_interrupted_jobs
+
+# ---------------------------- Configuration ----------------------------
+DAEMON_WORKERS = int(os.environ.get("EVEND_DAEMON_WORKERS", "2"))
+POLL_INTERVAL = 2
+# Préchargement eBay hors pointe (ebay_prefetch.py) lancé avec le daemon ; "0" si un autre processus s'en charge
+PREFETCH_IN_DAEMON = os.environ.get("EBAY_PREFETCH_IN_DAEMON", "1") == "1"
+
+# =====================================================
+# Jobs
+# =====================================================
+def job_from_record(record):
+    return PublishJob(
+        record['user_id'],
+        record['evend_email'],
+        record['evend_password'],
+        livraison_ramassage=bool(record['livraison_ramassage']),
+        frais_port_article=record['frais_port_article'],
+        frais_port_sup=record['frais_port_sup'],
+        job_id=record['id'],
+        priority=record.get('priority') or 0,
+    )
+
+# =====================================================
+# Exécution
+# =====================================================
+def run_job(record):
+    job = job_from_record(record)
+    paused = False
+    try:
+        if not job.email or not job.password:
+            raise ValueError("Email ou mot de passe e-Vend manquant")
+        if record.get('stream_id'):
+            status = evend_publish.process_stream(record['stream_id'], job)
+        else:
+            status = evend_publish.process_csv(record['csv_path'], job)
+        if status == "paused":
+            paused = True
+            status = pause_job(record['id'])
+            print(f"⏸️ Job {record['id']} ({record['user_id']}) "
+                  f"{'en pause' if status == 'paused' else 'repris aussitôt'}", flush=True)
+        else:
+            # "done" ou "empty" (CSV vide, aucune ligne valide) : visible tel quel dans /jobs
+            finish_job(record['id'], status)
+            if status == "empty":
+                print(f"📭 Job {record['id']} ({record['user_id']}) : rien à publier", flush=True)
+    except Exception as e:
+        finish_job(record['id'], "failed", str(e))
+        print(f"❌ Job {record['id']} ({record['user_id']}) en échec: {e}", flush=True)
+    finally:
+        # Un job en pause garde son flux : la reprise relit les articles déjà exportés
+        if record.get('stream_id') and not paused:
+            evend_pipeline.drop_stream(record['stream_id'])
+
+def start_prefetch():
+    """Planificateur de préchargement eBay dans un thread du daemon (il dort hors des fenêtres)."""
+    import ebay_prefetch  # importe app : seulement si le préchargement est actif
+
+    def run():
+        try:
+            ebay_prefetch.run_scheduler()
+        except Exception as e:
+            print(f"❌ Planificateur de préchargement arrêté: {e}", flush=True)
+    threading.Thread(target=run, daemon=True, name="ebay-prefetch").start()
+
+def run_daemon(workers=DAEMON_WORKERS):
+    # Sans réglage explicite, autant de tours de publication simultanés que de workers
+    if "EVEND_PUBLISH_SLOTS" not in os.environ:
+        evend_scheduler.PUBLISH_SLOTS = workers
+
+    requeue_interrupted_jobs()
+    if PREFETCH_IN_DAEMON:
+        start_prefetch()
+    print(f"👀 Daemon de publication démarré ({workers} workers)", flush=True)
+
+    active = set()
+    active_lock = threading.Lock()
+
+    def done(future):
+        with active_lock:
+            active.discard(future)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="evend-worker") as pool:
+        while True:
+            with active_lock:
+                free = workers - len(active)
+            record = claim_next_job() if free > 0 else None
+            if record is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+            print(f"▶ Job {record['id']} pour {record['user_id']}", flush=True)
+            future = pool.submit(run_job, record)
+            with active_lock:
+                active.add(future)
+            future.add_done_callback(done)
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else DAEMON_WORKERS
+    run_daemon(workers)
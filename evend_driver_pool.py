@@ -0,0 +1,137 @@
+# evend_driver_pool.py (navigateurs headless pré-démarrés pour masquer le démarrage à froid)
+import threading
+
+
+class DriverPool:
+    """Garde `size` navigateurs démarrés et prêts.
+
+    factory(slot) démarre un navigateur pour un numéro de slot (profil/cache du slot) ;
+    closer(driver) l'arrête. Après usage, un navigateur n'est jamais réutilisé :
+    il est arrêté et remplacé en arrière-plan, ce qui repart d'un état propre.
+    """
+
+    def __init__(self, factory, closer, size=1, log=print):
+        self.factory = factory
+        self.closer = closer
+        self.size = size
+        self.log = log
+        self.lock = threading.Condition()
+        self.idle = []          # [(driver, slot)]
+        self.starting = 0
+        self.slots_in_use = set()
+        self.driver_slots = {}  # id(driver) -> slot
+        self.closed = False
+
+    # =====================================================
+    # Slots (un profil / cache disque par slot)
+    # =====================================================
+    def _take_slot(self):
+        slot = 0
+        while slot in self.slots_in_use:
+            slot += 1
+        self.slots_in_use.add(slot)
+        return slot
+
+    def _free_slot(self, slot):
+        self.slots_in_use.discard(slot)
+
+    # =====================================================
+    # Préchauffage
+    # =====================================================
+    def _warm_one(self, slot):
+        driver = None
+        try:
+            driver = self.factory(slot)
+        except Exception as e:
+            self.log(f"⚠️ Préchauffage navigateur impossible: {e}")
+        with self.lock:
+            self.starting -= 1
+            if driver is None:
+                self._free_slot(slot)
+            elif self.closed:
+                self._free_slot(slot)
+            else:
+                self.driver_slots[id(driver)] = slot
+                self.idle.append((driver, slot))
+                driver = None
+            self.lock.notify_all()
+        if driver is not None:  # pool fermé entre-temps
+            self.closer(driver)
+
+    def _refill(self):
+        """À appeler sous verrou : relance les navigateurs manquants en arrière-plan."""
+        while not self.closed and len(self.idle) + self.starting < self.size:
+            self.starting += 1
+            slot = self._take_slot()
+            threading.Thread(target=self._warm_one, args=(slot,), daemon=True).start()
+
+    def start(self):
+        with self.lock:
+            self._refill()
+
+    # =====================================================
+    # Emprunt / restitution
+    # =====================================================
+    @staticmethod
+    def healthy(driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, wait_timeout=None):
+        """Retourne un navigateur sain. Attend un préchauffage en cours plutôt que d'en démarrer un de plus."""
+        while True:
+            with self.lock:
+                if not self.idle and self.starting == 0:
+                    self._refill()
+                if not self.idle and self.starting > 0:
+                    self.lock.wait(timeout=wait_timeout)
+                if self.idle:
+                    driver, slot = self.idle.pop(0)
+                    self._refill()
+                else:
+                    driver = None
+            if driver is None:
+                if self.starting == 0:
+                    # Préchauffage en échec : démarrage à froid, l'erreur remonte à l'appelant
+                    with self.lock:
+                        slot = self._take_slot()
+                    try:
+                        driver = self.factory(slot)
+                    except Exception:
+                        with self.lock:
+                            self._free_slot(slot)
+                        raise
+                    with self.lock:
+                        self.driver_slots[id(driver)] = slot
+                    return driver
+                continue
+            if self.healthy(driver):
+                return driver
+            self.log("♻️ Navigateur préchauffé hors service, remplacement")
+            self._retire(driver)
+
+    def _retire(self, driver):
+        def stop():
+            try:
+                self.closer(driver)
+            finally:
+                with self.lock:
+                    self._free_slot(self.driver_slots.pop(id(driver), None))
+                    self._refill()
+        threading.Thread(target=stop, daemon=True).start()
+
+    def release(self, driver):
+        """Arrête le navigateur utilisé en arrière-plan ; un remplaçant est préchauffé."""
+        if driver is None:
+            return
+        self._retire(driver)
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for driver, slot in idle:
+            self.closer(driver)
@@ -0,0 +1,184 @@
+# evend_governor.py (surveillance mémoire/CPU des navigateurs et concurrence adaptative)
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+# ---------------------------- Configuration ----------------------------
+DRIVER_MAX_RSS_MB = float(os.environ.get("EVEND_DRIVER_MAX_RSS_MB", "1200"))
+DRIVER_MAX_CPU = float(os.environ.get("EVEND_DRIVER_MAX_CPU", "0"))  # % d'un cœur, 0 = pas de limite
+LOW_MEM_MB = float(os.environ.get("EVEND_LOW_MEM_MB", "400"))
+HIGH_MEM_MB = float(os.environ.get("EVEND_HIGH_MEM_MB", "1200"))
+LOW_TMP_MB = float(os.environ.get("EVEND_LOW_TMP_MB", "200"))  # --disable-dev-shm-usage écrit dans /tmp
+MIN_SLOTS = int(os.environ.get("EVEND_MIN_SLOTS", "1"))
+SAMPLE_INTERVAL = float(os.environ.get("EVEND_GOVERNOR_INTERVAL", "5"))
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+# =====================================================
+# Lecture /proc
+# =====================================================
+def _children_map():
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+def _process_tree(pid, children=None):
+    children = children if children is not None else _children_map()
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+def _rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+def _cpu_ticks(pid):
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return int(fields[11]) + int(fields[12])  # utime + stime
+    except (OSError, IndexError, ValueError):
+        return 0
+
+def process_tree_rss(pid):
+    """RSS cumulée (octets) d'un processus et de tous ses descendants."""
+    return sum(_rss_bytes(p) for p in _process_tree(pid))
+
+def process_tree_cpu_ticks(pid, children=None):
+    return sum(_cpu_ticks(p) for p in _process_tree(pid, children))
+
+def mem_available_mb():
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("inf")
+
+def tmp_free_mb():
+    try:
+        return shutil.disk_usage(tempfile.gettempdir()).free / 1024 / 1024
+    except OSError:
+        return float("inf")
+
+def driver_pid(driver):
+    try:
+        return driver.service.process.pid
+    except Exception:
+        return None
+
+# =====================================================
+# Gouverneur
+# =====================================================
+class ResourceGovernor:
+    """Échantillonne les navigateurs enregistrés et ajuste le nombre de slots de publication.
+
+    on_slots(n) est appelé quand la concurrence autorisée change.
+    """
+
+    def __init__(self, max_slots, on_slots=None, log=print, interval=SAMPLE_INTERVAL):
+        self.max_slots = max(max_slots, MIN_SLOTS)
+        self.slots = self.max_slots
+        self.on_slots = on_slots
+        self.log = log
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.drivers = {}       # pid -> {"rss": .., "cpu": .., "ticks": .., "at": ..}
+        self.recycle = set()    # pids à recycler
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def register(self, driver):
+        pid = driver_pid(driver)
+        if pid:
+            with self.lock:
+                self.drivers[pid] = {"rss": 0, "cpu": 0.0, "ticks": None, "at": None}
+
+    def unregister(self, driver):
+        pid = driver_pid(driver)
+        with self.lock:
+            self.drivers.pop(pid, None)
+            self.recycle.discard(pid)
+
+    def should_recycle(self, driver):
+        with self.lock:
+            return driver_pid(driver) in self.recycle
+
+    def sample(self):
+        children = _children_map()
+        now = time.monotonic()
+        with self.lock:
+            pids = list(self.drivers)
+        for pid in pids:
+            tree = _process_tree(pid, children)
+            rss = sum(_rss_bytes(p) for p in tree)
+            ticks = sum(_cpu_ticks(p) for p in tree)
+            with self.lock:
+                stats = self.drivers.get(pid)
+                if stats is None:
+                    continue
+                if stats["ticks"] is not None and now > stats["at"]:
+                    stats["cpu"] = (ticks - stats["ticks"]) / CLK_TCK / (now - stats["at"]) * 100
+                stats.update(rss=rss, ticks=ticks, at=now)
+                rss_mb = rss / 1024 / 1024
+                over_rss = DRIVER_MAX_RSS_MB and rss_mb > DRIVER_MAX_RSS_MB
+                over_cpu = DRIVER_MAX_CPU and stats["cpu"] > DRIVER_MAX_CPU
+                if (over_rss or over_cpu) and pid not in self.recycle:
+                    self.recycle.add(pid)
+                    self.log(f"♻️ Navigateur {pid} à recycler ({rss_mb:.0f} Mo, CPU {stats['cpu']:.0f}%)")
+        self._adjust_slots()
+
+    def _adjust_slots(self):
+        mem = mem_available_mb()
+        tmp = tmp_free_mb()
+        load = os.getloadavg()[0] if hasattr(os, "getloadavg") else 0.0
+        cpus = os.cpu_count() or 1
+
+        slots = self.slots
+        if mem < LOW_MEM_MB or tmp < LOW_TMP_MB or load > cpus * 1.5:
+            slots = max(MIN_SLOTS, slots - 1)
+        elif mem > HIGH_MEM_MB and tmp > LOW_TMP_MB * 2 and load < cpus * 0.7:
+            slots = min(self.max_slots, slots + 1)
+
+        if slots != self.slots:
+            self.log(f"⚖️ Concurrence ajustée: {self.slots} -> {slots} "
+                     f"(mémoire dispo {mem:.0f} Mo, /tmp {tmp:.0f} Mo, charge {load:.2f})")
+            self.slots = slots
+            if self.on_slots:
+                self.on_slots(slots)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                self.log(f"⚠️ Gouverneur: échantillonnage impossible: {e}")
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True, name="evend-governor")
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,162 @@
+# evend_http.py (publication directe e-Vend par HTTP, repli Selenium géré par l'appelant)
+import os
+import re
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ---------------------------- Configuration ----------------------------
+EVEND_BASE_URL = os.environ.get("EVEND_BASE_URL", "https://www.e-vend.ca").rstrip("/")
+EVEND_LOGIN_URL = f"{EVEND_BASE_URL}/login"
+EVEND_NEW_LISTING_URL = f"{EVEND_BASE_URL}/l/draft/00000000-0000-0000-0000-000000000000/new/details"
+EVEND_DRAFT_URL = f"{EVEND_BASE_URL}/l/draft"
+EVEND_DETAILS_URL = EVEND_BASE_URL + "/l/draft/{draft_id}/details"
+EVEND_EDIT_LISTING_URL = os.environ.get("EVEND_EDIT_LISTING_URL", EVEND_BASE_URL + "/l/{listing_id}/edit")
+EVEND_END_LISTING_URL = os.environ.get("EVEND_END_LISTING_URL", EVEND_BASE_URL + "/l/{listing_id}/end")
+
+HTTP_PHOTO_FIELD = os.environ.get("EVEND_HTTP_PHOTO_FIELD", "photos")
+HTTP_TIMEOUT = 20
+
+UUID_RE = re.compile(r"/l/draft/([0-9a-fA-F-]{36})")
+LISTING_ID_RE = re.compile(r"/l/(?:draft/)?([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})")
+EMPTY_DRAFT_ID = "00000000-0000-0000-0000-000000000000"
+CSRF_RES = [
+    re.compile(r'<meta[^>]+name="csrf-token"[^>]+content="([^"]+)"'),
+    re.compile(r'<input[^>]+name="(?:_token|csrf_token|csrfmiddlewaretoken)"[^>]+value="([^"]+)"'),
+]
+SUCCESS_MARKERS = ("success-message", "alert-success")
+
+
+class HttpPublishError(Exception):
+    """Réponse e-Vend inattendue : l'article doit repasser par Selenium."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status  # code HTTP ; None si aucune réponse (erreur réseau, délai dépassé)
+
+
+class HttpSubmitUncertain(HttpPublishError):
+    """Formulaire envoyé sans issue claire : l'annonce existe peut-être, ne pas la republier."""
+
+
+def listing_id_from_url(url):
+    match = LISTING_ID_RE.search(url or "")
+    if match and match.group(1) != EMPTY_DRAFT_ID:
+        return match.group(1)
+    return None
+
+
+# =====================================================
+# Publisher HTTP
+# =====================================================
+class EvendHttpPublisher:
+    def __init__(self, cookies, user_agent=None, timeout=HTTP_TIMEOUT, pool_size=4):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if user_agent:
+            self.session.headers["User-Agent"] = user_agent
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie["name"], cookie["value"],
+                domain=cookie.get("domain", ""), path=cookie.get("path", "/"),
+            )
+
+    @classmethod
+    def from_driver(cls, driver, **kwargs):
+        user_agent = None
+        try:
+            user_agent = driver.execute_script("return navigator.userAgent")
+        except Exception:
+            pass
+        return cls(driver.get_cookies(), user_agent=user_agent, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, method, url, **kwargs):
+        try:
+            resp = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise HttpPublishError(f"erreur réseau {method} {url}: {e}")
+        if resp.status_code >= 400:
+            raise HttpPublishError(f"{method} {url} -> HTTP {resp.status_code}", resp.status_code)
+        if "/login" in resp.url and not url.endswith("/login"):
+            raise HttpPublishError("session expirée (redirigé vers /login)", resp.status_code)
+        return resp
+
+    @staticmethod
+    def _json(resp, error=HttpPublishError):
+        try:
+            body = resp.json()
+        except ValueError:
+            raise error(f"JSON illisible (HTTP {resp.status_code})", resp.status_code)
+        if not isinstance(body, dict):
+            raise error(f"JSON inattendu: {body!r}"[:200], resp.status_code)
+        return body
+
+    def _csrf_token(self):
+        resp = self._request("GET", EVEND_NEW_LISTING_URL)
+        for regex in CSRF_RES:
+            match = regex.search(resp.text)
+            if match:
+                return match.group(1)
+        return None
+
+    def create_draft(self, csrf_token=None):
+        headers = {"X-CSRF-Token": csrf_token} if csrf_token else {}
+        resp = self._request("POST", EVEND_DRAFT_URL, headers=headers, allow_redirects=False)
+
+        # Brouillon retourné soit en JSON, soit par redirection vers /l/draft/<uuid>/...
+        if resp.headers.get("Content-Type", "").startswith("application/json"):
+            data = self._json(resp)
+            draft_id = data.get("id") or data.get("draft_id")
+            if draft_id:
+                return str(draft_id)
+        match = UUID_RE.search(resp.headers.get("Location", ""))
+        if match:
+            return match.group(1)
+        raise HttpPublishError(f"création du brouillon: réponse inattendue (HTTP {resp.status_code})")
+
+    def submit_details(self, draft_id, fields, radios=None, image_paths=(), csrf_token=None):
+        data = dict(fields)
+        data.update(radios or {})
+        if csrf_token:
+            data["_token"] = csrf_token
+
+        handles = []
+        try:
+            files = []
+            for path in image_paths:
+                fh = open(path, "rb")
+                handles.append(fh)
+                files.append((HTTP_PHOTO_FIELD, (os.path.basename(path), fh, "image/jpeg")))
+            resp = self._request("POST", EVEND_DETAILS_URL.format(draft_id=draft_id),
+                                 data=data, files=files or None)
+        except HttpPublishError as e:
+            # Sans réponse ou erreur serveur : le POST a pu être traité, un repli Selenium ferait un doublon
+            if e.status is None or e.status >= 500:
+                raise HttpSubmitUncertain(f"soumission: {e}", e.status) from e
+            raise
+        finally:
+            for fh in handles:
+                fh.close()
+
+        if resp.headers.get("Content-Type", "").startswith("application/json"):
+            body = self._json(resp, HttpSubmitUncertain)
+            if body.get("success") is True or body.get("status") == "ok":
+                return body
+            if body.get("success") is False or body.get("errors"):
+                raise HttpPublishError(f"soumission refusée: {body}", resp.status_code)
+            raise HttpSubmitUncertain(f"soumission: réponse JSON inattendue: {body}", resp.status_code)
+        if any(marker in resp.text for marker in SUCCESS_MARKERS):
+            return {"success": True}
+        raise HttpSubmitUncertain("soumission: confirmation absente de la réponse", resp.status_code)
+
+    def publish(self, fields, radios=None, image_paths=()):
+        csrf_token = self._csrf_token()
+        draft_id = self.create_draft(csrf_token)
+        self.submit_details(draft_id, fields, radios, image_paths, csrf_token)
+        return draft_id
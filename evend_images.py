@@ -0,0 +1,157 @@
+# evend_images.py (réduction des photos avant upload vers e-Vend)
+import os
+import io
+import json
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import requests
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # sans Pillow, les photos sont envoyées telles quelles
+    Image = None
+
+# ---------------------------- Configuration ----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_CACHE_DIR = os.path.join(BASE_DIR, "uploads", "images_cache")
+os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+URL_INDEX_FILE = os.path.join(IMAGE_CACHE_DIR, "url_index.json")
+
+IMAGE_MAX_DIM = int(os.environ.get("EVEND_IMAGE_MAX_DIM", "1600"))
+IMAGE_QUALITY = int(os.environ.get("EVEND_IMAGE_QUALITY", "82"))
+IMAGE_WORKERS = int(os.environ.get("EVEND_IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+DOWNLOAD_TIMEOUT = 10
+
+_index_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+# =====================================================
+# Transcodage
+# =====================================================
+def transcode(data):
+    """Redimensionne, retire les métadonnées et ré-encode en JPEG."""
+    if Image is None:
+        return data
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((IMAGE_MAX_DIM, IMAGE_MAX_DIM), Image.LANCZOS)
+        out = io.BytesIO()
+        # Nouvelle image sans exif/icc : seules les données pixel sont conservées
+        img.save(out, format="JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+        return out.getvalue()
+
+def cache_path(source_hash, cache_dir=None):
+    return os.path.join(cache_dir or IMAGE_CACHE_DIR, f"{source_hash}_{IMAGE_MAX_DIM}_{IMAGE_QUALITY}.jpg")
+
+def _fetch_and_transcode(url, cache_dir):
+    """Exécuté dans le pool de processus. Retourne (url, hash source, chemin) ou (url, None, erreur).
+
+    Le dossier du cache est passé explicitement : un processus "spawn" ne voit que la config d'origine.
+    """
+    try:
+        response = requests.get(url, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        source_hash = hashlib.sha256(response.content).hexdigest()
+        path = cache_path(source_hash, cache_dir)
+        if not os.path.exists(path):
+            try:
+                data = transcode(response.content)
+            except Exception:
+                data = response.content  # image illisible par Pillow : on garde l'original
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return url, source_hash, path
+    except Exception as e:
+        return url, None, str(e)
+
+# =====================================================
+# Index URL -> hash source (évite de re-télécharger)
+# =====================================================
+def _load_index():
+    try:
+        with open(URL_INDEX_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _save_index(index):
+    tmp_path = f"{URL_INDEX_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, URL_INDEX_FILE)
+
+def get_pool():
+    """Pool de processus unique du processus courant, en mode "spawn" : jamais de fork depuis un daemon à threads."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+class ImageBatch:
+    """Photos d'un lot, téléchargées et réduites en tâche de fond dès la création.
+
+    Créé avant l'attente du tour, result() ne fait ensuite que ramasser ce qui est déjà prêt.
+    """
+
+    def __init__(self, urls, log=print):
+        self.log = log
+        self.urls = list(dict.fromkeys(u for u in urls if u))
+        self.ready = {}
+        with _index_lock:
+            index = _load_index()
+        to_fetch = []
+        for url in self.urls:
+            source_hash = index.get(url)
+            if source_hash and os.path.exists(cache_path(source_hash)):
+                self.ready[url] = cache_path(source_hash)
+                try:
+                    os.utime(self.ready[url])  # réutilisée : le ménage garde les photos récentes
+                except OSError:
+                    pass
+            else:
+                to_fetch.append(url)
+        self.cached = len(self.urls) - len(to_fetch)
+        pool = get_pool() if to_fetch else None
+        self.futures = {pool.submit(_fetch_and_transcode, url, IMAGE_CACHE_DIR): url for url in to_fetch}
+
+    def result(self, on_poll=None, poll_interval=1.0):
+        """Attend les photos restantes (on_poll appelé entre deux attentes). Retourne {url: chemin}."""
+        pending = set(self.futures)
+        while pending:
+            _, pending = wait(pending, timeout=poll_interval)
+            if pending and on_poll:
+                on_poll()
+
+        fetched = {}
+        for future, url in self.futures.items():
+            try:
+                _, source_hash, result = future.result()
+            except Exception as e:  # pool cassé (processus tué)
+                source_hash, result = None, str(e)
+            if source_hash:
+                fetched[url] = source_hash
+                self.ready[url] = result
+            else:
+                self.log(f"⚠️ Erreur image {url}: {result}")
+        if fetched:
+            with _index_lock:
+                merged = _load_index()
+                merged.update(fetched)
+                _save_index(merged)
+        self.futures = {}
+
+        self.log(f"🖼️ Photos prêtes: {len(self.ready)}/{len(self.urls)} ({self.cached} depuis le cache)")
+        return self.ready
+
+def prepare_images(urls, log=print, on_poll=None):
+    """Prépare les photos et attend qu'elles soient prêtes. Retourne {url: chemin}."""
+    return ImageBatch(urls, log=log).result(on_poll=on_poll)
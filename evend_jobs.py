@@ -0,0 +1,202 @@
+# evend_jobs.py (file des jobs de publication dans evend.db, sans dépendance Selenium : utilisable par l'app web)
+import os
+import sqlite3
+from datetime import datetime
+
+import evend_scheduler
+
+# ---------------------------- Configuration ----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "evend.db")
+
+# =====================================================
+# Stockage des jobs (SQLite, même base que l'app)
+# =====================================================
+def get_db():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_jobs_table():
+    conn = get_db()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS publish_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        csv_path TEXT NOT NULL,
+        evend_email TEXT,
+        evend_password TEXT,
+        livraison_ramassage INTEGER DEFAULT 0,
+        frais_port_article REAL DEFAULT 0,
+        frais_port_sup REAL DEFAULT 0,
+        status TEXT DEFAULT 'pending',
+        error TEXT,
+        created_at TEXT,
+        started_at TEXT,
+        finished_at TEXT
+    )""")
+    # Colonnes ajoutées après coup : migration des bases existantes
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(publish_jobs)")}
+    if "stream_id" not in columns:
+        conn.execute("ALTER TABLE publish_jobs ADD COLUMN stream_id TEXT")
+    if "priority" not in columns:
+        conn.execute("ALTER TABLE publish_jobs ADD COLUMN priority INTEGER DEFAULT 0")
+    if "control" not in columns:
+        conn.execute("ALTER TABLE publish_jobs ADD COLUMN control TEXT")
+    conn.commit()
+    conn.close()
+
+init_jobs_table()
+
+def submit_job(user_id, csv_path, evend_email, evend_password, livraison_ramassage=False,
+               frais_port_article=0.0, frais_port_sup=0.0, stream_id=None):
+    """csv_path vide et stream_id renseigné : articles lus dans le flux evend_pipeline au fil de l'export."""
+    conn = get_db()
+    cur = conn.execute("""
+        INSERT INTO publish_jobs (user_id, csv_path, evend_email, evend_password,
+                                  livraison_ramassage, frais_port_article, frais_port_sup, created_at, stream_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (user_id, csv_path or "", evend_email, evend_password, int(bool(livraison_ramassage)),
+          float(frais_port_article or 0), float(frais_port_sup or 0), datetime.utcnow().isoformat(), stream_id))
+    conn.commit()
+    job_id = cur.lastrowid
+    conn.close()
+    return job_id
+
+def claim_next_job():
+    """Passe atomiquement le job en attente le plus prioritaire à 'running' (un seul job actif par utilisateur)."""
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("""
+            SELECT * FROM publish_jobs
+            WHERE status='pending'
+              AND user_id NOT IN (SELECT user_id FROM publish_jobs WHERE status='running')
+            ORDER BY priority DESC, id LIMIT 1
+        """).fetchone()
+        if row:
+            conn.execute("UPDATE publish_jobs SET status='running', started_at=? WHERE id=?",
+                         (datetime.utcnow().isoformat(), row['id']))
+        conn.commit()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def finish_job(job_id, status, error=None):
+    # Le mot de passe n'est gardé que le temps du job
+    conn = get_db()
+    conn.execute("""
+        UPDATE publish_jobs SET status=?, error=?, finished_at=?, evend_password=NULL, control=NULL WHERE id=?
+    """, (status, error, datetime.utcnow().isoformat(), job_id))
+    conn.commit()
+    conn.close()
+
+def pause_job(job_id):
+    """Job arrêté par une pause : garde son mot de passe et sa progression pour la reprise.
+
+    Si la pause a été levée entre-temps (reprise demandée avant que le worker ne rende la main),
+    le job repart directement en attente. Retourne le nouvel état.
+    """
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT control FROM publish_jobs WHERE id=?", (job_id,)).fetchone()
+        status = "paused" if row and row['control'] == "pause" else "pending"
+        conn.execute("UPDATE publish_jobs SET status=?, control=NULL WHERE id=?", (status, job_id))
+        conn.commit()
+        return status
+    finally:
+        conn.close()
+
+def requeue_interrupted_jobs():
+    """Au démarrage : les jobs 'running' d'un daemon arrêté reprennent (progress_file fait la reprise).
+
+    Une annulation ou une pause demandée avant l'arrêt est appliquée au lieu de la reprise.
+    """
+    conn = get_db()
+    conn.execute("""
+        UPDATE publish_jobs SET
+            status = CASE control WHEN 'cancel' THEN 'cancelled' WHEN 'pause' THEN 'paused' ELSE 'pending' END,
+            control = NULL
+        WHERE status='running'
+    """)
+    conn.execute("UPDATE publish_jobs SET evend_password=NULL WHERE status='cancelled'")
+    conn.commit()
+    conn.close()
+    # Les entrées de file des jobs interrompus n'ont plus de processus : elles bloqueraient les autres
+    evend_scheduler.reset_queue()
+
+# =====================================================
+# Contrôle des jobs (annulation, pause, reprise, priorité)
+# =====================================================
+JOB_ACTIONS = ("cancel", "pause", "resume")
+
+def get_job(job_id):
+    conn = get_db()
+    row = conn.execute("SELECT * FROM publish_jobs WHERE id=?", (job_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def list_jobs(user_id, limit=20):
+    conn = get_db()
+    rows = conn.execute("""
+        SELECT id, status, control, priority, error, stream_id, created_at, started_at, finished_at
+        FROM publish_jobs WHERE user_id=? ORDER BY id DESC LIMIT ?
+    """, (user_id, limit)).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def get_control(job_id):
+    """Action demandée pour un job en cours ('cancel', 'pause') ou None. Lu par les workers à chaque attente."""
+    conn = get_db()
+    row = conn.execute("SELECT control FROM publish_jobs WHERE id=?", (job_id,)).fetchone()
+    conn.close()
+    return row['control'] if row else None
+
+def control_job(job_id, action):
+    """Applique cancel / pause / resume. Retourne le nouvel état du job, ou None si l'action est sans objet.
+
+    Un job en attente change d'état tout de suite ; un job en cours reçoit une demande ('control')
+    que son worker applique à sa prochaine attente.
+    """
+    if action not in JOB_ACTIONS:
+        raise ValueError(f"Action inconnue: {action}")
+    now = datetime.utcnow().isoformat()
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT status FROM publish_jobs WHERE id=?", (job_id,)).fetchone()
+        status = row['status'] if row else None
+        result = None
+        if action == "cancel" and status in ("pending", "paused"):
+            conn.execute("""
+                UPDATE publish_jobs SET status='cancelled', finished_at=?, evend_password=NULL, control=NULL
+                WHERE id=?
+            """, (now, job_id))
+            result = "cancelled"
+        elif action == "pause" and status == "pending":
+            conn.execute("UPDATE publish_jobs SET status='paused' WHERE id=?", (job_id,))
+            result = "paused"
+        elif action in ("cancel", "pause") and status == "running":
+            conn.execute("UPDATE publish_jobs SET control=? WHERE id=?", (action, job_id))
+            result = "cancelling" if action == "cancel" else "pausing"
+        elif action == "resume" and status == "paused":
+            conn.execute("UPDATE publish_jobs SET status='pending', control=NULL WHERE id=?", (job_id,))
+            result = "pending"
+        elif action == "resume" and status == "running" and conn.execute(
+                "SELECT control FROM publish_jobs WHERE id=?", (job_id,)).fetchone()['control'] == "pause":
+            # Pause demandée mais pas encore appliquée : on l'annule simplement
+            conn.execute("UPDATE publish_jobs SET control=NULL WHERE id=?", (job_id,))
+            result = "running"
+        conn.commit()
+        return result
+    finally:
+        conn.close()
+
+def set_priority(job_id, priority):
+    """Priorité du job (plus grand = servi avant) ; prise en compte au prochain tour de publication."""
+    conn = get_db()
+    cur = conn.execute("UPDATE publish_jobs SET priority=? WHERE id=?", (int(priority), job_id))
+    conn.commit()
+    conn.close()
+    return cur.rowcount > 0
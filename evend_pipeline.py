@@ -0,0 +1,150 @@
+# evend_pipeline.py (flux export eBay -> publication : articles transmis page par page via evend.db, sans CSV)
+import os
+import json
+import time
+import uuid
+import sqlite3
+from datetime import datetime
+
+# ---------------------------- Configuration ----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "evend.db")
+
+# Producteur silencieux depuis ce délai (app redémarrée en plein export) : le flux est considéré fini
+STREAM_IDLE_TIMEOUT = int(os.environ.get("EVEND_STREAM_IDLE_TIMEOUT", "600"))
+
+# =====================================================
+# Tables
+# =====================================================
+def get_db():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_pipeline_tables():
+    conn = get_db()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS pipeline_streams (
+        stream_id TEXT PRIMARY KEY,
+        user_id TEXT,
+        expected INTEGER,
+        received INTEGER DEFAULT 0,
+        closed INTEGER DEFAULT 0,
+        error TEXT,
+        created_at TEXT,
+        updated_at TEXT
+    )""")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS pipeline_items (
+        stream_id TEXT,
+        seq INTEGER,
+        item TEXT,
+        PRIMARY KEY(stream_id, seq)
+    )""")
+    conn.commit()
+    conn.close()
+
+init_pipeline_tables()
+
+# =====================================================
+# Producteur (app web)
+# =====================================================
+def open_stream(user_id, expected=None):
+    stream_id = uuid.uuid4().hex
+    now = datetime.utcnow().isoformat()
+    conn = get_db()
+    conn.execute("""
+        INSERT INTO pipeline_streams (stream_id, user_id, expected, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (stream_id, user_id, expected, now, now))
+    conn.commit()
+    conn.close()
+    return stream_id
+
+def set_expected(stream_id, expected):
+    conn = get_db()
+    conn.execute("UPDATE pipeline_streams SET expected=? WHERE stream_id=?", (expected, stream_id))
+    conn.commit()
+    conn.close()
+
+def push_items(stream_id, items):
+    """Ajoute une page d'articles (dicts de l'export eBay) à la suite du flux.
+
+    Retourne False si le flux n'existe plus (job annulé ou terminé en échec) : le producteur doit s'arrêter.
+    """
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT received FROM pipeline_streams WHERE stream_id=?",
+                           (stream_id,)).fetchone()
+        if row is None:
+            conn.rollback()
+            return False
+        if not items:
+            conn.rollback()
+            return True
+        received = row['received']
+        conn.executemany("INSERT INTO pipeline_items (stream_id, seq, item) VALUES (?, ?, ?)",
+                         [(stream_id, received + i, json.dumps(item, ensure_ascii=False))
+                          for i, item in enumerate(items)])
+        conn.execute("UPDATE pipeline_streams SET received=?, updated_at=? WHERE stream_id=?",
+                     (received + len(items), datetime.utcnow().isoformat(), stream_id))
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+def close_stream(stream_id, error=None):
+    conn = get_db()
+    conn.execute("UPDATE pipeline_streams SET closed=1, error=?, updated_at=? WHERE stream_id=?",
+                 (error, datetime.utcnow().isoformat(), stream_id))
+    conn.commit()
+    conn.close()
+
+# =====================================================
+# Consommateur (publisher)
+# =====================================================
+def stream_info(stream_id):
+    conn = get_db()
+    row = conn.execute("SELECT * FROM pipeline_streams WHERE stream_id=?", (stream_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def read_items(stream_id, from_seq, limit):
+    conn = get_db()
+    rows = conn.execute("""
+        SELECT seq, item FROM pipeline_items
+        WHERE stream_id=? AND seq>=? ORDER BY seq LIMIT ?
+    """, (stream_id, from_seq, limit)).fetchall()
+    conn.close()
+    return [(row['seq'], json.loads(row['item'])) for row in rows]
+
+def iter_chunks(stream_id, size, on_poll=None, poll_interval=1.0):
+    """Produit des listes [(seq, article)] de `size` articles dès qu'elles sont disponibles.
+
+    Le dernier paquet peut être plus court. S'arrête quand le flux est fermé et entièrement lu.
+    """
+    next_seq = 0
+    while True:
+        info = stream_info(stream_id)
+        if info is None:
+            return
+        chunk = read_items(stream_id, next_seq, size)
+        producer_done = info['closed'] or (
+            datetime.utcnow() - datetime.fromisoformat(info['updated_at'])).total_seconds() > STREAM_IDLE_TIMEOUT
+        if len(chunk) == size or (chunk and producer_done):
+            next_seq = chunk[-1][0] + 1
+            yield chunk
+            continue
+        if producer_done and not chunk:
+            return
+        if on_poll:
+            on_poll()
+        time.sleep(poll_interval)
+
+def drop_stream(stream_id):
+    conn = get_db()
+    conn.execute("DELETE FROM pipeline_items WHERE stream_id=?", (stream_id,))
+    conn.execute("DELETE FROM pipeline_streams WHERE stream_id=?", (stream_id,))
+    conn.commit()
+    conn.close()
@@ -3,6 +3,7 @@ import os
 import sys
 import time
 import json
+import shutil
 import threading
 import tempfile
 from datetime import datetime
@@ -14,7 +15,21 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.common.exceptions import TimeoutException, WebDriverException, InvalidArgumentException
+
+import evend_categories
+import evend_images
+import evend_jobs
+import evend_pipeline
+from evend_driver_pool import DriverPool
+from evend_governor import ResourceGovernor
+import evend_scheduler
+import evend_sessions
+import evend_sync
+import evend_trace
+from evend_http import (EVEND_LOGIN_URL, EVEND_NEW_LISTING_URL, EVEND_EDIT_LISTING_URL,
+                        EVEND_END_LISTING_URL, EvendHttpPublisher, HttpPublishError,
+                        HttpSubmitUncertain, listing_id_from_url)
 
 # ---------------------------- Configuration ----------------------------
 USER_ID = os.environ.get("USER_ID", f"user_{os.getpid()}")
@@ -22,11 +37,7 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-LOG_FILE = os.path.join(UPLOAD_FOLDER, f"{USER_ID}_selenium_log.txt")
-SESSION_FILE = os.path.join(UPLOAD_FOLDER, f"session_{USER_ID}.json")
-QUEUE_FILE = os.path.join(UPLOAD_FOLDER, "evend_publish_queue.json")
-PROGRESS_FILE = os.path.join(UPLOAD_FOLDER, f"progress_{USER_ID}.txt")
-
+# Réglages du job par défaut (mode script : un processus par USER_ID)
 EVEND_EMAIL = os.environ.get("EVEND_EMAIL")
 EVEND_PASSWORD = os.environ.get("EVEND_PASSWORD")
 
@@ -34,11 +45,56 @@ LIVRAISON_RAMASSAGE_CHECK = os.environ.get("livraison_ramassage_check") == 'on'
 FRAIS_PORT_ARTICLE = float(os.environ.get("frais_port_article", "0"))
 FRAIS_PORT_SUP = float(os.environ.get("frais_port_sup", "0"))
 
-SESSION_MAX_AGE = 24 * 3600
-BATCH_SIZE = 20
+BATCH_SIZE = evend_scheduler.TURN_SIZE
+
+# "selenium" (défaut) ou "http" : publication directe avec repli Selenium par article
+PUBLISH_MODE = os.environ.get("EVEND_PUBLISH_MODE", "selenium")
+
+# Blocage réseau via DevTools : "aucun", "standard" ou "strict"
+BLOCK_PROFILE = os.environ.get("EVEND_BLOCK_PROFILE", "standard")
+EXTRA_BLOCKED_URLS = [p.strip() for p in os.environ.get("EVEND_BLOCKED_URLS", "").split(",") if p.strip()]
+PAGE_LOAD_STRATEGY = os.environ.get("EVEND_PAGE_LOAD_STRATEGY", "eager")
+
+# Navigateurs préchauffés gardés prêts (0 = démarrage à la demande)
+DRIVER_POOL_SIZE = int(os.environ.get("EVEND_DRIVER_POOL_SIZE", "1"))
+
+# Gouverneur de ressources : recyclage des navigateurs trop gros et concurrence adaptative
+GOVERNOR_ENABLED = os.environ.get("EVEND_GOVERNOR", "on") == "on"
+
+# ---------------------------- Reprises ----------------------------
+MAX_ATTEMPTS = int(os.environ.get("EVEND_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF = float(os.environ.get("EVEND_RETRY_BACKOFF", "2"))  # secondes, doublé à chaque essai
+FIELD_ERROR_SELECTOR = ".invalid-feedback, .field-error, .has-error .help-block"
+PAGE_ERROR_SELECTOR = ".alert-danger, .error-message"
 
-EVEND_LOGIN_URL = "https://www.e-vend.ca/login"
-EVEND_NEW_LISTING_URL = "https://www.e-vend.ca/l/draft/00000000-0000-0000-0000-000000000000/new/details"
+_BLOCK_FONTS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*fonts.googleapis.com*", "*fonts.gstatic.com*"]
+_BLOCK_MEDIA = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.mp4", "*.webm"]
+_BLOCK_TRACKERS = [
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*facebook.net*", "*facebook.com/tr*",
+    "*hotjar.com*", "*clarity.ms*", "*tiktok.com*", "*pinterest.com*",
+    "*youtube.com*", "*intercom.io*", "*sentry.io*",
+]
+BLOCK_PROFILES = {
+    "aucun": [],
+    "standard": _BLOCK_FONTS + _BLOCK_MEDIA + _BLOCK_TRACKERS,
+    "strict": _BLOCK_FONTS + _BLOCK_MEDIA + _BLOCK_TRACKERS + ["*.css"],
+}
+
+PLACEHOLDER_IMAGE_URL = "https://via.placeholder.com/150"
+END_LISTING_BUTTON = os.environ.get("EVEND_END_BUTTON_SELECTOR", "#endBtn")
+
+# Valeurs par défaut appliquées aux cellules vides du CSV
+CSV_DEFAULTS = {
+    "type_annonce": "Vente classique",
+    "categorie": "Autre",
+    "titre": "",
+    "description": "Description non disponible",
+    "condition": "Non spécifié",
+    "retour": "Non",
+    "garantie": "Non",
+    "photo_defaut": "",
+}
 
 # =====================================================
 # Log thread-safe centralisé
@@ -60,26 +116,92 @@ class LogWrapper:
     def flush(self):
         pass
 
-log = LogWrapper(LOG_FILE)
+# =====================================================
+# Job de publication (identifiants et réglages d'un utilisateur)
+# =====================================================
+class PublishJob:
+    def __init__(self, user_id, email, password, livraison_ramassage=False,
+                 frais_port_article=0.0, frais_port_sup=0.0, sync_mode=None, job_id=None, priority=0,
+                 export_complete=False):
+        self.user_id = user_id
+        # Job du daemon (evend_jobs) : porte les demandes d'annulation / pause et la priorité
+        self.job_id = job_id
+        self.priority = priority
+        self.sync_mode = sync_mode or evend_sync.SYNC_MODE
+        # Le CSV est l'export eBay entier : seule condition pour terminer les annonces disparues
+        self.export_complete = export_complete
+        self.email = email
+        self.password = password
+        self.livraison_ramassage = livraison_ramassage
+        self.frais_port_article = float(frais_port_article or 0)
+        self.frais_port_sup = float(frais_port_sup or 0)
+
+        self.log_file = os.path.join(UPLOAD_FOLDER, f"{user_id}_selenium_log.txt")
+        self.progress_file = os.path.join(UPLOAD_FOLDER, f"progress_{user_id}.txt")
+        # Rapports hors de la racine d'uploads/ : le watcher ne doit pas les republier comme un import
+        self.rejects_file = os.path.join(UPLOAD_FOLDER, "rejects", f"{user_id}.csv")
+        self.dead_letter_file = os.path.join(UPLOAD_FOLDER, "dead_letters", f"{user_id}.csv")
+        # Profil Chrome persistant : le cache disque garde les assets utiles entre les pages
+        self.profile_dir = os.path.join(BASE_DIR, "chrome_profiles", user_id)
+        self.log = LogWrapper(self.log_file)
+
+    @classmethod
+    def from_env(cls):
+        return cls(USER_ID, EVEND_EMAIL, EVEND_PASSWORD, LIVRAISON_RAMASSAGE_CHECK,
+                   FRAIS_PORT_ARTICLE, FRAIS_PORT_SUP)
+
+# Job courant du thread : les logs d'un worker vont dans le fichier de son utilisateur
+_current = threading.local()
+_default_job = None
+
+def current_job():
+    global _default_job
+    job = getattr(_current, "job", None)
+    if job is None:
+        if _default_job is None:
+            _default_job = PublishJob.from_env()
+        job = _default_job
+    return job
 
 def write_log(msg):
     ts_msg = f"[{time.strftime('%Y-%m-%dT%H:%M:%S')}] {msg}"
     print(ts_msg, flush=True)
     try:
-        log.write(msg)
+        current_job().log.write(msg)
     except Exception as e:
         print(f"⚠️ Impossible d'écrire dans le log: {e}", flush=True)
 
-# Test log immédiat
-write_log("🔧 Script démarré, log utilisateur OK")
-
 # =====================================================
 # Selenium driver
 # =====================================================
-log_lock = threading.Lock()
 
-def get_driver(timeout=15):
+def blocked_url_patterns(profile=None):
+    profile = profile or BLOCK_PROFILE
+    if profile not in BLOCK_PROFILES:
+        write_log(f"⚠️ Profil de blocage inconnu: {profile}, profil standard utilisé")
+        profile = "standard"
+    return BLOCK_PROFILES[profile] + EXTRA_BLOCKED_URLS
+
+def apply_network_blocking(driver, profile=None):
+    patterns = blocked_url_patterns(profile)
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        write_log(f"⚠️ Blocage réseau DevTools indisponible: {e}")
+
+def get_driver(timeout=15, profile_dir=None, block_profile=None, cache_dir=None):
+    profile_dir = profile_dir or current_job().profile_dir
+    cache_dir = cache_dir or os.path.join(profile_dir, 'cache')
+    os.makedirs(profile_dir, exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+
     chrome_options = Options()
+    chrome_options.page_load_strategy = PAGE_LOAD_STRATEGY
+    chrome_options.add_argument(f"--user-data-dir={profile_dir}")
+    chrome_options.add_argument(f"--disk-cache-dir={cache_dir}")
     chrome_options.add_argument("--headless=new")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
@@ -92,6 +214,7 @@ def get_driver(timeout=15):
     try:
         driver = webdriver.Chrome(options=chrome_options)
         driver.set_page_load_timeout(timeout)
+        apply_network_blocking(driver, block_profile)
         write_log("✅ Driver Selenium initialisé")
         return driver
     except WebDriverException as e:
@@ -108,72 +231,101 @@ def cleanup_driver(driver):
             write_log("♻️ Driver Selenium arrêté")
         except Exception as e:
             write_log(f"⚠️ Erreur lors du cleanup du driver: {e}")
+        tmp_profile = getattr(driver, "evend_tmp_profile", None)
+        if tmp_profile:
+            shutil.rmtree(tmp_profile, ignore_errors=True)
 
 # =====================================================
-# File / queue / session utilities
+# Pool de navigateurs préchauffés
 # =====================================================
-def load_queue():
-    if os.path.exists(QUEUE_FILE):
-        try:
-            with open(QUEUE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+_driver_pool = None
+_driver_pool_lock = threading.Lock()
 
-def save_queue(queue):
+def _pooled_driver(slot):
+    # Profil temporaire (aucun cookie d'un autre utilisateur), cache disque persistant par slot
+    profile_dir = tempfile.mkdtemp(prefix="evend_chrome_")
+    cache_dir = os.path.join(BASE_DIR, "chrome_profiles", f"pool_{slot}", "cache")
     try:
-        with open(QUEUE_FILE, "w", encoding="utf-8") as f:
-            json.dump(queue, f)
-    except:
-        pass
+        driver = get_driver(profile_dir=profile_dir, cache_dir=cache_dir)
+    except Exception:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+        raise
+    driver.evend_tmp_profile = profile_dir
+    return driver
 
-def enter_queue(user_id, total_articles):
-    queue = load_queue()
-    if user_id not in [u['id'] for u in queue]:
-        queue.append({'id': user_id, 'articles': total_articles})
-        save_queue(queue)
-    return queue
+def get_driver_pool():
+    global _driver_pool
+    with _driver_pool_lock:
+        if _driver_pool is None:
+            _driver_pool = DriverPool(_pooled_driver, cleanup_driver, size=DRIVER_POOL_SIZE, log=write_log)
+            _driver_pool.start()
+        return _driver_pool
 
-def leave_queue(user_id):
-    queue = load_queue()
-    queue = [u for u in queue if u['id'] != user_id]
-    save_queue(queue)
+# =====================================================
+# Gouverneur de ressources
+# =====================================================
+_governor = None
+
+def _set_publish_slots(slots):
+    evend_scheduler.PUBLISH_SLOTS = slots
+
+def get_governor():
+    global _governor
+    with _driver_pool_lock:
+        if _governor is None and GOVERNOR_ENABLED:
+            _governor = ResourceGovernor(evend_scheduler.PUBLISH_SLOTS, on_slots=_set_publish_slots, log=write_log)
+            _governor.start()
+        return _governor
+
+@evend_trace.traced("acquire_driver")
+def acquire_driver():
+    if DRIVER_POOL_SIZE <= 0:
+        driver = get_driver()
+    else:
+        driver = get_driver_pool().acquire()
+    governor = get_governor()
+    if governor is not None:
+        governor.register(driver)
+    return driver
+
+def release_driver(driver):
+    if driver is None:
+        return
+    governor = get_governor()
+    if governor is not None:
+        governor.unregister(driver)
+    if DRIVER_POOL_SIZE <= 0:
+        cleanup_driver(driver)
+    else:
+        get_driver_pool().release(driver)
+
+def driver_needs_recycle(driver):
+    governor = get_governor()
+    return governor is not None and governor.should_recycle(driver)
 
-def save_session(driver):
+# =====================================================
+# Session utilities
+# =====================================================
+def save_session(driver, job):
     try:
-        cookies = driver.get_cookies()
-        session_data = {"timestamp": time.time(), "cookies": cookies}
-        with open(SESSION_FILE, "w", encoding="utf-8") as f:
-            json.dump(session_data, f)
+        evend_sessions.save_cookies(job.email, driver.get_cookies(), job.password)
     except Exception as e:
         write_log(f"⚠️ Impossible de sauvegarder la session: {e}")
 
-def load_session(driver):
-    if os.path.exists(SESSION_FILE):
-        try:
-            with open(SESSION_FILE, "r", encoding="utf-8") as f:
-                session_data = json.load(f)
-            if time.time() - session_data.get("timestamp", 0) > SESSION_MAX_AGE:
-                write_log("⚠️ Session expirée, suppression.")
-                os.remove(SESSION_FILE)
-                return False
-            driver.get(EVEND_LOGIN_URL)
-            for cookie in session_data.get("cookies", []):
-                cookie.pop('sameSite', None)
-                try:
-                    driver.add_cookie(cookie)
-                except:
-                    pass
+def load_session(driver, job):
+    try:
+        cookies = evend_sessions.load_cookies(job.email, job.password)
+        if cookies:
+            evend_sessions.apply_to_driver(driver, cookies)
             return True
-        except Exception as e:
-            write_log(f"⚠️ Impossible de charger la session: {e}")
+    except Exception as e:
+        write_log(f"⚠️ Impossible de charger la session: {e}")
     return False
 
 # =====================================================
 # Login / Upload utilities
 # =====================================================
-def login(driver, wait):
+def login(driver, wait, job):
     write_log("🔹 Naviguer vers e-Vend")
     driver.get(EVEND_LOGIN_URL)
     write_log("🔹 Cliquer sur Connexion")
@@ -183,200 +335,868 @@ def login(driver, wait):
     write_log("🔹 Attendre le formulaire de connexion")
     wait.until(EC.presence_of_element_located((By.NAME, "email")))
     write_log("🔹 Remplir email et mot de passe")
-    driver.find_element(By.NAME, "email").send_keys(EVEND_EMAIL)
-    driver.find_element(By.NAME, "password").send_keys(EVEND_PASSWORD)
+    driver.find_element(By.NAME, "email").send_keys(job.email)
+    driver.find_element(By.NAME, "password").send_keys(job.password)
     write_log("🔹 Cliquer sur Se connecter")
     driver.find_element(By.XPATH, "//button[contains(text(),'Se connecter')]").click()
     write_log("🔹 Attente du tableau de bord")
     wait.until(EC.presence_of_element_located((By.ID, "dashboard")))
     write_log("✅ Login réussi")
-    save_session(driver)
+    save_session(driver, job)
+
+@evend_trace.traced("ensure_logged_in")
+def ensure_logged_in(driver, wait, job):
+    try:
+        cookies, relogged = evend_sessions.get_session(job.email, job.password,
+                                                     lambda: login(driver, wait, job))
+    except ImportInterrupted:
+        raise
+    except Exception as e:
+        raise LoginFailed(f"Connexion e-Vend impossible ({type(e).__name__}: {e})") from e
+    if not relogged:
+        evend_sessions.apply_to_driver(driver, cookies)
+        write_log("♻️ Session e-Vend réutilisée, connexion évitée")
 
 def check_radio(driver, name, value_to_check):
     try:
         radios = driver.find_elements(By.NAME, name)
         for r in radios:
-            if r.get_attribute("value") == value_to_check and not r.is_selected():
-                r.click()
-                return True
+            if r.get_attribute("value") == value_to_check:
+                if not r.is_selected():
+                    r.click()
+                return True  # déjà cochée : c'est aussi un succès
     except:
         pass
     return False
 
-def upload_images(driver, image_urls):
-    tmp_files = []
+# Remplit tout le formulaire en un seul aller-retour WebDriver.
+# Passe par le setter natif de "value" pour que le framework de la page
+# voie la modification, puis déclenche input/change/blur.
+FILL_FORM_SCRIPT = """
+var fields = arguments[0], radios = arguments[1], failed = [];
+function fire(el) {
+    ['input', 'change', 'blur'].forEach(function (t) {
+        el.dispatchEvent(new Event(t, {bubbles: true}));
+    });
+}
+function setNative(el, value) {
+    var proto = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    var desc = Object.getOwnPropertyDescriptor(proto, 'value');
+    if (desc && desc.set) { desc.set.call(el, value); } else { el.value = value; }
+}
+Object.keys(fields).forEach(function (id) {
+    var el = document.getElementById(id), value = fields[id], expected = value;
+    if (!el) { failed.push(id); return; }
+    if (el.tagName === 'SELECT') {
+        var opt = Array.prototype.find.call(el.options, function (o) {
+            return o.value === value || o.text.trim() === value;
+        });
+        if (!opt) { failed.push(id); return; }
+        el.value = opt.value;
+        expected = opt.value;
+    } else if (el.tagName === 'INPUT' || el.tagName === 'TEXTAREA') {
+        setNative(el, value);
+    } else {
+        failed.push(id);
+        return;
+    }
+    fire(el);
+    if (String(el.value) !== String(expected)) { failed.push(id); }
+});
+Object.keys(radios).forEach(function (name) {
+    var match = Array.prototype.find.call(
+        document.querySelectorAll('input[type="radio"][name="' + name + '"]'),
+        function (r) { return r.value === radios[name]; });
+    if (!match) { failed.push('radio:' + name); return; }
+    if (!match.checked) { match.click(); }
+});
+return failed;
+"""
+
+@evend_trace.traced("fill_form")
+def fill_form(driver, fields, radios=None):
+    radios = radios or {}
     try:
-        photo_fields = driver.find_elements(By.CSS_SELECTOR, "input[type='file']")
-        for i, url in enumerate(image_urls):
-            if i >= len(photo_fields):
-                write_log(f"⚠️ Pas assez de champs photo pour {url}")
-                break
-            field = photo_fields[i]
-            try:
-                response = requests.get(url, timeout=10)
-                if response.status_code == 200:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_file:
-                        tmp_file.write(response.content)
-                        tmp_files.append(tmp_file.name)
-                    field.send_keys(tmp_file.name)
-                    write_log(f"📸 Image uploadée: {url}")
-            except Exception as e:
-                write_log(f"⚠️ Erreur image {url}: {e}")
-    finally:
-        for f in tmp_files:
-            try: os.remove(f)
-            except: pass
+        failed = driver.execute_script(FILL_FORM_SCRIPT, fields, radios) or []
+    except Exception as e:
+        write_log(f"⚠️ Remplissage par script impossible, saisie champ par champ: {e}")
+        failed = list(fields) + [f"radio:{name}" for name in radios]
+
+    # Repli : saisie classique pour les champs que le script n'a pas pu remplir
+    still_failed = []
+    for field_id in failed:
+        if field_id.startswith("radio:"):
+            name = field_id.split(":", 1)[1]
+            if not check_radio(driver, name, radios[name]):
+                still_failed.append(field_id)
+            continue
+        try:
+            el = driver.find_element(By.ID, field_id)
+            el.clear()
+            el.send_keys(fields[field_id])
+        except:
+            still_failed.append(field_id)
+
+    for field_id in still_failed:
+        write_log(f"⚠️ Impossible de remplir le champ {field_id}")
+    return still_failed
+
+@evend_trace.traced("download_images")
+def download_images(image_urls):
+    tmp_files = []
+    for url in image_urls:
+        try:
+            response = requests.get(url, timeout=10)
+            if response.status_code == 200:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_file:
+                    tmp_file.write(response.content)
+                    tmp_files.append(tmp_file.name)
+        except Exception as e:
+            write_log(f"⚠️ Erreur image {url}: {e}")
+    return tmp_files
 
+def remove_files(paths):
+    for f in paths:
+        try: os.remove(f)
+        except: pass
+
+@evend_trace.traced("upload_images")
+def upload_images(driver, image_paths):
+    photo_fields = driver.find_elements(By.CSS_SELECTOR, "input[type='file']")
+    for i, path in enumerate(image_paths):
+        if i >= len(photo_fields):
+            write_log(f"⚠️ Pas assez de champs photo pour {path}")
+            break
+        try:
+            photo_fields[i].send_keys(path)
+            write_log(f"📸 Image uploadée: {os.path.basename(path)}")
+        except Exception as e:
+            write_log(f"⚠️ Erreur image {path}: {e}")
+
+@evend_trace.traced("wait_for_success")
 def wait_for_success_message(wait):
+    # Attente après soumission : l'annonce existe peut-être déjà, une pause ou une annulation ici
+    # ferait republier l'article à la reprise (ou laisserait une annonce jamais enregistrée)
+    if isinstance(wait, ControlledWait):
+        wait = wait.uncontrolled()
     try:
         wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ".success-message, .alert-success")))
         return True
     except TimeoutException:
         return False
 
-def save_progress(batch_index, idx):
+def save_progress(job, batch_index, idx, source=""):
     try:
-        with open(PROGRESS_FILE, "w", encoding="utf-8") as f:
-            f.write(f"{batch_index},{idx}\n")
+        with open(job.progress_file, "w", encoding="utf-8") as f:
+            f.write(f"{batch_index},{idx},{source}\n")
     except:
         pass
 
-def load_progress():
-    if os.path.exists(PROGRESS_FILE):
+def load_progress(job, source=""):
+    """Reprise (lot, index) ; ignorée si elle concerne une autre source (autre CSV ou flux)."""
+    if os.path.exists(job.progress_file):
         try:
-            with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
+            with open(job.progress_file, "r", encoding="utf-8") as f:
                 line = f.readline()
                 if line:
-                    parts = line.strip().split(",")
+                    parts = line.strip().split(",", 2)
+                    if len(parts) > 2 and parts[2] != source:
+                        return 0, -1
                     return int(parts[0]), int(parts[1])
         except:
             pass
     return 0, -1
 
 # =====================================================
-# Annulation
+# Publication d'un article
+# =====================================================
+def build_listing_fields(row, job):
+    return {
+        "type_annonce": row['type_annonce'],
+        "categorie": row['categorie'],
+        "titre": row['titre'],
+        "description": row['description'],
+        "condition": row['condition'],
+        "retour": row['retour'],
+        "garantie": row['garantie'],
+        "prix": str(row['prix']),
+        "stock": str(row['stock']),
+        "frais_port_article": str(job.frais_port_article),
+        "frais_port_sup": str(job.frais_port_sup)
+    }
+
+def publish_item_selenium(driver, wait, fields, radios, image_paths):
+    """Retourne (True, id annonce e-Vend ou None) ; lève une exception classée par classify_failure sinon."""
+    with evend_trace.span("driver_get"):
+        driver.get(EVEND_NEW_LISTING_URL)
+    with evend_trace.span("wait_form"):
+        wait.until(EC.presence_of_element_located((By.ID, "type_annonce")))
+    fill_form(driver, fields, radios)
+    upload_images(driver, image_paths)
+
+    submit_button = driver.find_element(By.ID, "submitBtn")
+    with evend_trace.span("submit"):
+        try:
+            submit_button.click()
+        except TimeoutException as e:
+            # Le clic attend la navigation : le formulaire est peut-être parti
+            raise PublishUnconfirmed(f"délai dépassé pendant la soumission: {e}") from e
+
+    # Au-delà du clic, toute erreur est ambiguë : l'annonce existe peut-être, la republier ferait un doublon
+    try:
+        if wait_for_success_message(wait):
+            write_log("✅ Article publié avec succès.")
+            return True, listing_id_from_url(driver.current_url)
+
+        field_errors = [el.text.strip() for el in driver.find_elements(By.CSS_SELECTOR, FIELD_ERROR_SELECTOR)]
+        if any(field_errors):
+            raise PublishRejected("; ".join(e for e in field_errors if e))
+        page_errors = [el.text.strip() for el in driver.find_elements(By.CSS_SELECTOR, PAGE_ERROR_SELECTOR)]
+    except WebDriverException as e:
+        raise PublishUnconfirmed(f"navigateur en échec après soumission ({type(e).__name__}: {e})") from e
+    if any(page_errors):
+        raise PublishUnconfirmed("erreur e-Vend après soumission: " + "; ".join(e for e in page_errors if e))
+    raise PublishUnconfirmed("confirmation non détectée après soumission")
+
+def publish_item(driver, wait, http_publisher, row, job, prepared_images=None):
+    fields = build_listing_fields(row, job)
+    radios = {"livraison": "ramassage"} if job.livraison_ramassage else {}
+    image_urls = [row['photo_defaut']] if row['photo_defaut'] else []
+
+    # Photos déjà réduites par evend_images ; téléchargement direct en dernier recours
+    # (photo jamais préparée, ou retirée du cache par le ménage pendant l'attente du lot)
+    prepared = {u: p for u, p in (prepared_images or {}).items() if u in image_urls and os.path.exists(p)}
+    cached_paths = [prepared[u] for u in image_urls if u in prepared]
+    tmp_paths = download_images([u for u in image_urls if u not in prepared])
+    image_paths = cached_paths + tmp_paths
+    try:
+        if http_publisher is not None:
+            try:
+                with evend_trace.span("http_publish"):
+                    draft_id = http_publisher.publish(fields, radios, image_paths)
+                write_log(f"✅ Article publié avec succès (HTTP, brouillon {draft_id}).")
+                return True, draft_id
+            except HttpSubmitUncertain as e:
+                # Détails déjà envoyés : pas de repli ni de nouvel essai, l'annonce existe peut-être
+                raise PublishUnconfirmed(f"HTTP: {e}") from e
+            except HttpPublishError as e:
+                write_log(f"↩️ Publication HTTP impossible ({e}), repli Selenium.")
+        return publish_item_selenium(driver, wait, fields, radios, image_paths)
+    finally:
+        remove_files(tmp_paths)
+
+# =====================================================
+# Synchronisation : mise à jour prix/stock et fin d'annonce
 # =====================================================
-def check_cancel(user_id=USER_ID):
+def update_listing_selenium(driver, wait, listing_id, prix, stock):
+    driver.get(EVEND_EDIT_LISTING_URL.format(listing_id=listing_id))
+    wait.until(EC.presence_of_element_located((By.ID, "prix")))
+    if fill_form(driver, {"prix": str(prix), "stock": str(int(stock))}):
+        return False
+    driver.find_element(By.ID, "submitBtn").click()
+    return wait_for_success_message(wait)
+
+def end_listing_selenium(driver, wait, listing_id):
+    driver.get(EVEND_END_LISTING_URL.format(listing_id=listing_id))
+    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, END_LISTING_BUTTON))).click()
+    return wait_for_success_message(wait)
+
+def run_sync_operation(driver, wait, op, job):
+    if not op.get("evend_listing_id"):
+        write_log(f"⚠️ Annonce e-Vend inconnue pour {op['sync_key']}, synchro impossible")
+        return
+    if op["action"] == "update":
+        write_log(f"🔁 Mise à jour {op['sync_key']}: prix {op['prix']}, stock {op['stock']}")
+        if update_listing_selenium(driver, wait, op["evend_listing_id"], op["prix"], op["stock"]):
+            evend_sync.record_listing(job.user_id, op["sync_key"], op["evend_listing_id"], op["prix"], op["stock"])
+            write_log("✅ Annonce mise à jour.")
+        else:
+            write_log("⚠️ Mise à jour non confirmée.")
+    elif op["action"] == "end":
+        write_log(f"🏁 Fin de l'annonce {op['sync_key']} (absente de l'export eBay)")
+        if end_listing_selenium(driver, wait, op["evend_listing_id"]):
+            evend_sync.forget_listing(job.user_id, op["sync_key"])
+            write_log("✅ Annonce terminée.")
+        else:
+            write_log("⚠️ Fin d'annonce non confirmée.")
+
+# =====================================================
+# Pré-validation CSV (vectorisée, avant tout travail navigateur)
+# =====================================================
+def prevalidate_dataframe(df):
+    """Normalise le CSV et sépare les lignes publiables des lignes rejetées."""
+    df = df.copy()
+
+    # L'export eBay écrit image_url, le formulaire attend photo_defaut
+    if "photo_defaut" not in df.columns and "image_url" in df.columns:
+        df["photo_defaut"] = df["image_url"]
+
+    for col, default in CSV_DEFAULTS.items():
+        if col not in df.columns:
+            df[col] = default
+        values = df[col].astype("string").str.strip()
+        df[col] = values.mask(values.isna() | (values == ""), default).astype(object)
+    df.loc[df["photo_defaut"] == PLACEHOLDER_IMAGE_URL, "photo_defaut"] = ""
+    # Nom de catégorie eBay -> valeur du formulaire e-Vend (index précalculé, un calcul par nom distinct)
+    df["categorie"] = evend_categories.resolve_series(df["categorie"])
+
+    prix = pd.to_numeric(df["prix"], errors="coerce") if "prix" in df.columns else pd.Series(float("nan"), index=df.index)
+    stock = pd.to_numeric(df["stock"], errors="coerce") if "stock" in df.columns else pd.Series(1, index=df.index)
+    df["prix"] = prix.round(2)
+    df["stock"] = stock.fillna(1)
+
+    reasons = pd.Series("", index=df.index, dtype=object)
+    if "sku" in df.columns:
+        sku = df["sku"].astype("string").str.strip()
+        reasons = reasons.mask(sku.isna() | (sku == ""), reasons + "sku manquant;")
+    reasons = reasons.mask(df["titre"] == "", reasons + "titre manquant;")
+    reasons = reasons.mask(prix.isna(), reasons + "prix manquant ou invalide;")
+    reasons = reasons.mask(prix <= 0, reasons + "prix nul ou négatif;")
+    reasons = reasons.mask(df["stock"] < 1, reasons + "stock épuisé;")
+
+    rejected_mask = reasons != ""
+    valid = df[~rejected_mask].copy()
+    valid["stock"] = valid["stock"].astype(int)
+    rejected = df[rejected_mask].copy()
+    rejected.insert(0, "motif_rejet", reasons[rejected_mask].str.rstrip(";"))
+    return valid, rejected
+
+def write_rejection_report(rejected, path):
+    try:
+        if rejected.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        report = rejected.copy()
+        report.insert(0, "ligne_csv", report.index + 2)  # +2 : en-tête et index 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        report.to_csv(path, index=False, encoding="utf-8-sig")
+        write_log(f"📝 Rapport de rejet écrit: {path}")
+    except Exception as e:
+        write_log(f"⚠️ Impossible d'écrire le rapport de rejet: {e}")
+
+# =====================================================
+# Annulation / pause
+# =====================================================
+class ImportInterrupted(Exception):
+    """Arrêt demandé : remonte jusqu'à _process_csv sans être traité comme un échec d'article."""
+
+class ImportCancelled(ImportInterrupted):
+    pass
+
+class ImportPaused(ImportInterrupted):
+    """Pause : la progression est gardée, le job reprend au même article."""
+
+def check_cancel(user_id):
     cancel_flag = os.path.join(UPLOAD_FOLDER, f"{user_id}_cancel_flag")
     if os.path.exists(cancel_flag):
         write_log("🛑 Flag d’annulation détecté, arrêt du bot Selenium...")
         os.remove(cancel_flag)
-        raise Exception("Import annulé par l’utilisateur")
+        raise ImportCancelled("🛑 Import annulé par l’utilisateur")
+
+def check_control(job):
+    """Appelé à chaque article et à chaque attente : flag d'annulation historique puis demande du job store."""
+    check_cancel(job.user_id)
+    if job.job_id is None:
+        return
+    action = evend_jobs.get_control(job.job_id)
+    if action == "cancel":
+        write_log("🛑 Annulation demandée, arrêt du bot Selenium...")
+        raise ImportCancelled("🛑 Import annulé par l’utilisateur")
+    if action == "pause":
+        raise ImportPaused("⏸️ Import mis en pause, il reprendra à l'article en cours")
+
+def interruptible_sleep(job, seconds, step=0.5):
+    deadline = time.time() + seconds
+    while True:
+        check_control(job)
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        time.sleep(min(step, remaining))
+
+class ControlledWait(WebDriverWait):
+    """WebDriverWait qui vérifie annulation / pause à chaque sondage (toutes les 0,5 s par défaut)."""
+
+    def __init__(self, driver, timeout, on_poll, **kwargs):
+        super().__init__(driver, timeout, **kwargs)
+        self.on_poll = on_poll
+        self.driver_ref, self.timeout_s = driver, timeout
+
+    def uncontrolled(self):
+        """Même attente sans contrôle : pour les attentes qu'une interruption ne doit pas couper."""
+        return WebDriverWait(self.driver_ref, self.timeout_s)
+
+    def until(self, method, message=""):
+        def checked(driver):
+            self.on_poll()
+            return method(driver)
+        return super().until(checked, message)
+
+    def until_not(self, method, message=""):
+        def checked(driver):
+            self.on_poll()
+            return method(driver)
+        return super().until_not(checked, message)
+
+# =====================================================
+# Échecs : classement, reprises, lettres mortes
+# =====================================================
+class PublishRejected(Exception):
+    """e-Vend refuse le formulaire (champ invalide) : inutile de réessayer."""
+
+class LoginFailed(Exception):
+    """Connexion e-Vend impossible : réessayée comme un échec temporaire, puis fait échouer tout l'import."""
+
+class PublishUnconfirmed(Exception):
+    """Soumis sans confirmation : peut-être publié, on ne réessaie pas pour éviter un doublon."""
+
+TRANSIENT = "temporaire"
+PERMANENT = "définitif"
+
+def classify_failure(exc):
+    if isinstance(exc, (PublishRejected, PublishUnconfirmed, InvalidArgumentException, KeyError, ValueError)):
+        return PERMANENT
+    # WebDriverException ne vient ici que d'avant la soumission (après, publish_item_selenium lève PublishUnconfirmed)
+    if isinstance(exc, (LoginFailed, WebDriverException, HttpPublishError,
+                        requests.RequestException, ConnectionError, OSError)):
+        return TRANSIENT
+    return PERMANENT
+
+class BrowserSession:
+    """Navigateur connecté (et publisher HTTP éventuel) d'un tour, remplaçable en cours de route."""
+
+    def __init__(self, job):
+        self.job = job
+        self.driver = None
+        self.wait = None
+        self.http_publisher = None
+
+    def open(self):
+        self.driver = acquire_driver()
+        self.wait = ControlledWait(self.driver, 20, on_poll=lambda: check_control(self.job))
+        try:
+            ensure_logged_in(self.driver, self.wait, self.job)
+            if PUBLISH_MODE == "http":
+                self.http_publisher = EvendHttpPublisher.from_driver(self.driver)
+        except BaseException:
+            # Navigateur non connecté : le rendre, sinon l'essai suivant publierait sur une page déconnectée
+            self.close()
+            raise
+
+    def close(self):
+        if self.http_publisher is not None:
+            self.http_publisher.close()
+            self.http_publisher = None
+        release_driver(self.driver)
+        self.driver = None
+
+    def recycle(self):
+        self.close()
+        self.open()
+
+def run_with_retries(browser, label, action):
+    """Exécute action(browser) avec reprises sur page neuve. Retourne None si réussi, sinon (type, exception)."""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            if browser.driver is None:
+                browser.open()
+            action(browser)
+            return None
+        except ImportInterrupted:
+            raise
+        except Exception as e:
+            kind = classify_failure(e)
+            if isinstance(e, LoginFailed) and attempt == MAX_ATTEMPTS:
+                raise  # identifiants refusés : aucun article ne passera, le job échoue
+            if kind == PERMANENT or attempt == MAX_ATTEMPTS:
+                return kind, e
+            delay = RETRY_BACKOFF * 2 ** (attempt - 1)
+            write_log(f"🔁 {label}: échec {kind} ({type(e).__name__}: {e}), "
+                      f"essai {attempt + 1}/{MAX_ATTEMPTS} dans {delay:.0f}s")
+            interruptible_sleep(browser.job, delay)
+            # Navigateur mort ou dans un état douteux : on repart d'un neuf, sinon d'une page neuve suffit
+            if browser.driver is not None and not DriverPool.healthy(browser.driver):
+                browser.close()
+
+def _dead_letter_key(record):
+    """Ligne CSV + clé de synchro + action : une même ligne abandonnée deux fois n'est listée qu'une fois."""
+    def text(value):
+        return "" if value is None or value != value else str(value)  # None / NaN -> ""
+    return tuple(text(record.get(col)) for col in ("ligne_csv", "sync_key", "action"))
+
+def write_dead_letter_report(dead, path):
+    """Lignes abandonnées avec leur numéro de ligne CSV, le type d'échec et l'erreur.
+
+    Complète la liste déjà écrite (import repris après une pause ou un arrêt) : elle n'est vidée
+    qu'au début d'un import neuf, par ImportRun.
+    """
+    try:
+        records = {}
+        if os.path.exists(path):
+            previous = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+            for record in previous.to_dict("records"):
+                records[_dead_letter_key(record)] = record
+        for record in dead:
+            records[_dead_letter_key(record)] = record
+        if not records:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pd.DataFrame(list(records.values())).to_csv(tmp_path, index=False, encoding="utf-8-sig")
+        os.replace(tmp_path, path)
+        write_log(f"📝 {len(records)} article(s) en échec définitif, liste écrite: {path}")
+    except Exception as e:
+        write_log(f"⚠️ Impossible d'écrire la liste des échecs: {e}")
 
 # =====================================================
 # CSV Processing
 # =====================================================
-def process_csv(csv_path):
+def _run_as(job, func, *args):
+    """Exécute func avec `job` comme job courant du thread, sous une trace evend_trace. Retourne son résultat."""
+    previous_job = getattr(_current, "job", None)
+    _current.job = job
+    evend_trace.begin_job(job.user_id)
     try:
-        check_cancel(USER_ID)
+        return func(*args)
+    finally:
+        evend_trace.end_job()
+        _current.job = previous_job
 
-        if not os.path.exists(csv_path):
-            write_log(f"❌ CSV introuvable: {csv_path}")
+def process_csv(csv_path, job=None):
+    """Retourne "done", "empty" (rien à publier), "paused" ou "cancelled".
+
+    Une erreur globale, CSV introuvable compris, est relevée après journalisation : le job passe en "failed".
+    """
+    job = job or current_job()
+    return _run_as(job, _process_csv, csv_path, job)
+
+def process_stream(stream_id, job=None):
+    """Publie les articles d'un flux evend_pipeline au fil de l'export eBay, sans passer par un CSV.
+
+    Même résultat que process_csv.
+    """
+    job = job or current_job()
+    return _run_as(job, _process_stream, stream_id, job)
+
+class ImportRun:
+    """Un import en cours (CSV ou flux) : reprise, photos préparées, échecs reportés et abandonnés."""
+
+    def __init__(self, job, source):
+        self.job = job
+        self.source = source
+        self.prepared_images = {}
+        self.image_batches = {}  # lot -> evend_images.ImageBatch en cours de préparation
+        self.deferred = []  # (lot, index, ligne, exception) : échecs temporaires à repasser en fin d'import
+        self.dead = []      # lignes abandonnées, écrites dans job.dead_letter_file
+        self.last_batch, self.last_idx = load_progress(job, source)
+        self.first_turn = True
+        if (self.last_batch, self.last_idx) == (0, -1):
+            # Import neuf : les échecs d'un import précédent ne le concernent plus
+            try:
+                os.remove(job.dead_letter_file)
+            except OSError:
+                pass
+
+    def queue_images(self, batch_index, batch):
+        """Lance la préparation des photos du lot ; elles avancent pendant l'attente du tour."""
+        if batch_index >= self.last_batch:
+            self.image_batches[batch_index] = evend_images.ImageBatch(batch["photo_defaut"].tolist(), log=write_log)
+
+    def collect_images(self, batch_index):
+        images = self.image_batches.pop(batch_index, None)
+        if images is not None:
+            self.prepared_images.update(images.result(on_poll=lambda: check_control(self.job)))
+
+    def add_dead(self, idx, row, kind, exc):
+        self.dead.append({"ligne_csv": idx + 2, **row.to_dict(),
+                          "type_erreur": kind, "erreur": f"{type(exc).__name__}: {exc}"})
+
+    def attempt_row(self, browser, batch_index, idx, row):
+        job = self.job
+        result = {}
+        def publish(b):
+            result["published"], result["listing_id"] = publish_item(
+                b.driver, b.wait, b.http_publisher, row, job, self.prepared_images)
+
+        with evend_trace.item(row.get('sync_key') or row.get('sku') or f"{batch_index+1}:{idx+1}") as traced_item:
+            failure = run_with_retries(browser, f"Article {idx+1} lot {batch_index+1}", publish)
+            traced_item.ok = failure is None
+        if failure is None and row.get('sync_key'):
+            if not result["listing_id"]:
+                write_log(f"⚠️ Article {row['sync_key']} publié mais id d'annonce e-Vend introuvable : "
+                          f"ses modifications seront signalées dans le rapport de rejet")
+            try:
+                evend_sync.record_listing(job.user_id, row['sync_key'], result["listing_id"],
+                                          row['prix'], row['stock'], row['titre'])
+            except Exception as e:
+                # Article publié : un échec d'écriture du suivi ne doit pas arrêter l'import
+                write_log(f"⚠️ Suivi de synchro non enregistré pour {row['sync_key']}: {e}")
+        return failure
+
+    def recycle_if_needed(self, browser):
+        """Navigateur au-delà des seuils mémoire/CPU : fermé, le suivant s'ouvre au prochain article.
+
+        Appelé après save_progress : un échec ici ne doit pas faire republier l'article déjà traité.
+        """
+        try:
+            if browser.driver is not None and driver_needs_recycle(browser.driver):
+                write_log("♻️ Navigateur recyclé (seuil mémoire/CPU dépassé)")
+                browser.close()
+        except Exception as e:
+            write_log(f"⚠️ Recyclage du navigateur impossible: {e}")
+            browser.driver = None
+
+    def publish_batch(self, batch_index, batch, label):
+        """Un lot = un tour de file. `label` : numéro affiché du lot (« 3/10 », ou « 3 » pour un flux)."""
+        job = self.job
+        if batch_index < self.last_batch:
             return
+
+        # Un lot par tour : les petits imports s'intercalent entre les lots des gros
+        evend_scheduler.wait_for_turn(job.user_id, log=write_log, on_poll=lambda: check_control(job))
+        if self.first_turn:
+            write_log("✅ C'est votre tour ! Début de l'import automatique...")
+            self.first_turn = False
+        self.collect_images(batch_index)
+
+        browser = BrowserSession(job)
+        items_done = 0
+        turn_started = time.time()
+        try:
+            write_log(f"--- DÉBUT lot {label} ---")
+
+            for idx, row in batch.iterrows():
+                check_control(job)
+
+                if batch_index == self.last_batch and idx <= self.last_idx:
+                    continue
+
+                write_log(f"📌 Publication article {idx+1} lot {batch_index+1}: {row['titre']}")
+                items_done += 1
+                failure = self.attempt_row(browser, batch_index, idx, row)
+                if failure is not None:
+                    kind, exc = failure
+                    if kind == TRANSIENT:
+                        write_log(f"⏭️ Article {idx+1} lot {batch_index+1} reporté à la passe finale: {exc}")
+                        self.deferred.append((batch_index, idx, row, exc))
+                    else:
+                        write_log(f"❌ Erreur article {idx+1} lot {batch_index+1} ({kind}): {exc}")
+                        self.add_dead(idx, row, kind, exc)
+
+                save_progress(job, batch_index, idx, self.source)
+                self.recycle_if_needed(browser)
+
+            write_log(f"--- FIN lot {label} ---")
+
+        finally:
+            browser.close()
+            evend_scheduler.release_turn(job.user_id, items_done, time.time() - turn_started)
+
+    def final_pass(self):
+        """Dernière chance des échecs temporaires, sur un navigateur neuf."""
+        if not self.deferred:
+            return
+        job = self.job
+        write_log(f"🔁 Passe finale: {len(self.deferred)} article(s) à réessayer sur un navigateur neuf")
+        evend_scheduler.wait_for_turn(job.user_id, log=write_log, on_poll=lambda: check_control(job))
+        browser = BrowserSession(job)
+        items_done = 0
+        turn_started = time.time()
+        try:
+            while self.deferred:
+                check_control(job)
+                batch_index, idx, row, _ = self.deferred[0]
+                items_done += 1
+                failure = self.attempt_row(browser, batch_index, idx, row)
+                self.deferred.pop(0)
+                if failure is not None:
+                    write_log(f"❌ Article {idx+1} lot {batch_index+1} toujours en échec: {failure[1]}")
+                    self.add_dead(idx, row, *failure)
+                self.recycle_if_needed(browser)
+        finally:
+            browser.close()
+            evend_scheduler.release_turn(job.user_id, items_done, time.time() - turn_started)
+
+    def run_sync_ops(self, sync_ops):
+        job = self.job
+        for start in range(0, len(sync_ops), BATCH_SIZE):
+            chunk = sync_ops[start:start+BATCH_SIZE]
+            evend_scheduler.wait_for_turn(job.user_id, log=write_log, on_poll=lambda: check_control(job))
+            browser = BrowserSession(job)
+            items_done = 0
+            turn_started = time.time()
+            try:
+                for op in chunk:
+                    check_control(job)
+                    items_done += 1
+                    with evend_trace.item(op['sync_key'], phase="sync_item") as traced_item:
+                        failure = run_with_retries(browser, f"Synchro {op['sync_key']}",
+                                                   lambda b: run_sync_operation(b.driver, b.wait, op, job))
+                        traced_item.ok = failure is None
+                    if failure is not None:
+                        kind, exc = failure
+                        write_log(f"❌ Erreur synchro {op['sync_key']} ({kind}): {exc}")
+                        self.dead.append(dict(op, type_erreur=kind, erreur=f"{type(exc).__name__}: {exc}"))
+            finally:
+                browser.close()
+                evend_scheduler.release_turn(job.user_id, items_done, time.time() - turn_started)
+
+    def close(self):
+        # Reportés jamais repassés (annulation, erreur globale) : listés avec les échecs définitifs
+        for batch_index, idx, row, exc in self.deferred:
+            self.add_dead(idx, row, TRANSIENT, exc)
+        self.deferred = []
+        write_dead_letter_report(self.dead, self.job.dead_letter_file)
+
+def _process_csv(csv_path, job):
+    run = ImportRun(job, os.path.basename(csv_path))
+    try:
+        check_control(job)
+
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError(f"CSV introuvable: {csv_path}")
         df = pd.read_csv(csv_path)
         if df.empty:
             write_log("❌ CSV vide.")
-            return
+            return "empty"
 
-        # ----------------- Gestion de la file -----------------
-        queue = enter_queue(USER_ID, len(df))
-        position = next((i for i, u in enumerate(queue) if u['id'] == USER_ID), 0)
+        # ----------------- Pré-validation -----------------
+        df, rejected = prevalidate_dataframe(df)
+        write_rejection_report(rejected, job.rejects_file)
+        if not rejected.empty:
+            write_log(f"⚠️ {len(rejected)} ligne(s) rejetée(s) avant publication, voir le rapport de rejet.")
+        if df.empty:
+            write_log("❌ Aucune ligne valide à publier.")
+            return "empty"
 
-        # Boucle d'attente si pas en tête de file
-        while position > 0:
-            est_time = sum(u['articles'] for u in queue[:position]) * 3
-            write_log(f"⚠️ En position #{position+1}, attente avant de commencer l'import (~{est_time}s estimé)...")
-            time.sleep(5)
-            queue = load_queue()
-            position = next((i for i, u in enumerate(queue) if u['id'] == USER_ID), 0)
+        # ----------------- Synchronisation incrémentale -----------------
+        sync_ops = []
+        if job.sync_mode != "off":
+            df, to_update, to_end, unchanged, sync_rejected = evend_sync.plan_sync(
+                job.user_id, df, end_missing=job.sync_mode == "end", export_complete=job.export_complete,
+                log=write_log)
+            if not sync_rejected.empty:
+                rejected = pd.concat([rejected, sync_rejected]).sort_index()
+                write_rejection_report(rejected, job.rejects_file)
+                write_log(f"⚠️ {len(sync_rejected)} ligne(s) écartée(s) par la synchro, voir le rapport de rejet.")
+            sync_ops = ([dict(r, action="update") for r in to_update.to_dict("records")]
+                        + [dict(r, action="end") for r in to_end.to_dict("records")])
+            write_log(f"🔄 Synchro: {len(df)} nouveau(x), {len(to_update)} modifié(s), "
+                      f"{len(to_end)} à terminer, {unchanged} inchangé(s)")
+            if df.empty and not sync_ops:
+                write_log("✅ Catalogue déjà à jour, rien à publier.")
+                return "done"
 
-        write_log("✅ C'est votre tour ! Début de l'import automatique...")
+        # ----------------- Gestion de la file -----------------
+        evend_scheduler.enter_queue(job.user_id, len(df) + len(sync_ops), priority=job.priority)
 
         # ----------------- Traitement du CSV -----------------
-        last_batch, last_idx = load_progress()
         batches = [df[i:i+BATCH_SIZE] for i in range(0, len(df), BATCH_SIZE)]
-
+        # Photos téléchargées et réduites en tâche de fond pendant l'attente dans la file
         for batch_index, batch in enumerate(batches):
-            if batch_index < last_batch:
-                continue
+            run.queue_images(batch_index, batch)
+        for batch_index, batch in enumerate(batches):
+            run.publish_batch(batch_index, batch, f"{batch_index+1}/{len(batches)}")
 
-            driver = None
-            try:
-                driver = get_driver()
-                wait = WebDriverWait(driver, 20)
-                login(driver, wait)
-
-                write_log(f"--- DÉBUT lot {batch_index+1}/{len(batches)} ---")
-
-                for idx, row in batch.iterrows():
-                    try:
-                        check_cancel(USER_ID)
-
-                        if batch_index == last_batch and idx <= last_idx:
-                            continue
-
-                        titre = str(row.get('titre', 'Titre manquant') or 'Titre manquant')
-                        write_log(f"📌 Publication article {idx+1} lot {batch_index+1}: {titre}")
-
-                        driver.get(EVEND_NEW_LISTING_URL)
-                        wait.until(EC.presence_of_element_located((By.ID, "type_annonce")))
-
-                        fields = {
-                            "type_annonce": str(row.get('type_annonce', 'Vente classique')),
-                            "categorie": str(row.get('categorie', 'Autre')),
-                            "titre": titre,
-                            "description": str(row.get('description', 'Description non disponible')),
-                            "condition": str(row.get('condition', 'Non spécifié')),
-                            "retour": str(row.get('retour', 'Non')),
-                            "garantie": str(row.get('garantie', 'Non')),
-                            "prix": str(float(row.get('prix', 0.0))),
-                            "stock": str(int(row.get('stock', 1))),
-                            "frais_port_article": str(FRAIS_PORT_ARTICLE),
-                            "frais_port_sup": str(FRAIS_PORT_SUP)
-                        }
-
-                        for field_id, value in fields.items():
-                            try:
-                                el = driver.find_element(By.ID, field_id)
-                                el.clear()
-                                el.send_keys(value)
-                            except:
-                                write_log(f"⚠️ Impossible de remplir le champ {field_id}")
-
-                        if LIVRAISON_RAMASSAGE_CHECK:
-                            check_radio(driver, "livraison", "ramassage")
-
-                        image_urls = [row.get('photo_defaut')] if row.get('photo_defaut') else []
-                        upload_images(driver, image_urls)
-
-                        try:
-                            driver.find_element(By.ID, "submitBtn").click()
-                            if wait_for_success_message(wait):
-                                write_log("✅ Article publié avec succès.")
-                            else:
-                                write_log("⚠️ Article publié mais confirmation non détectée.")
-                        except:
-                            write_log("❌ Impossible de soumettre l'article.")
-
-                        save_progress(batch_index, idx)
-
-                    except Exception as e_row:
-                        write_log(f"❌ Erreur article {idx+1} lot {batch_index+1}: {e_row}")
-
-                write_log(f"--- FIN lot {batch_index+1}/{len(batches)} ---")
-
-            except Exception as e_batch:
-                write_log(f"❌ Erreur lot {batch_index+1}: {e_batch}")
+        run.final_pass()
 
-            finally:
-                cleanup_driver(driver)
+        # ----------------- Mises à jour / fins d'annonces -----------------
+        run.run_sync_ops(sync_ops)
 
         write_log("🎉 Tous les articles du CSV ont été traités.")
-        leave_queue(USER_ID)
+        evend_scheduler.leave_queue(job.user_id)
+        return "done"
+
+    except ImportInterrupted as e:
+        # En pause comme en annulation, le job quitte la file : son tour passe à l'utilisateur suivant
+        write_log(str(e))
+        evend_scheduler.leave_queue(job.user_id)
+        return "paused" if isinstance(e, ImportPaused) else "cancelled"
 
     except Exception as e_global:
         write_log(f"❌ Erreur globale lors du traitement du CSV: {e_global}")
-        leave_queue(USER_ID)
+        evend_scheduler.leave_queue(job.user_id)
+        raise  # le job store (evend_daemon) l'enregistre comme 'failed'
+
+    finally:
+        run.close()
+
+def _process_stream(stream_id, job):
+    run = ImportRun(job, f"stream:{stream_id}")
+    rejected_parts = []
+    sync_ops = []
+    queued = False
+    try:
+        check_control(job)
+        write_log("📡 Publication au fil de l'export eBay")
+        if job.sync_mode == "end":
+            # Les annonces disparues ne sont connues qu'en fin d'export : seules les modifications sont suivies
+            write_log("ℹ️ Mode flux : les annonces absentes d'eBay ne seront pas terminées.")
+
+        def on_stream_poll():
+            check_control(job)
+            if queued:  # en file mais sans sonder wait_for_turn pendant l'attente de l'export
+                evend_scheduler.heartbeat(job.user_id)
+
+        chunks = evend_pipeline.iter_chunks(stream_id, BATCH_SIZE, on_poll=on_stream_poll)
+        for batch_index, chunk in enumerate(chunks):
+            if not queued:
+                info = evend_pipeline.stream_info(stream_id)
+                evend_scheduler.enter_queue(job.user_id, info['expected'] or info['received'], priority=job.priority)
+                queued = True
+            if batch_index < run.last_batch:
+                continue
+
+            # Articles déjà typés (dicts de l'export) : DataFrame direct, index = rang dans l'export
+            df = pd.DataFrame([item for _, item in chunk], index=[seq for seq, _ in chunk])
+            df, rejected = prevalidate_dataframe(df)
+            if not rejected.empty:
+                rejected_parts.append(rejected)
+            if job.sync_mode != "off" and not df.empty:
+                df, to_update, _, _, sync_rejected = evend_sync.plan_sync(job.user_id, df)
+                if not sync_rejected.empty:
+                    rejected_parts.append(sync_rejected)
+                sync_ops += [dict(r, action="update") for r in to_update.to_dict("records")]
+            if df.empty:
+                continue
+
+            run.queue_images(batch_index, df)
+            run.publish_batch(batch_index, df, str(batch_index + 1))
+
+        info = evend_pipeline.stream_info(stream_id)
+        if info and info['error']:
+            write_log(f"⚠️ Export eBay interrompu: {info['error']}")
+            if not info['received']:
+                raise RuntimeError(f"Export eBay en échec avant le premier article: {info['error']}")
+        rejected = pd.concat(rejected_parts) if rejected_parts else pd.DataFrame()
+        write_rejection_report(rejected, job.rejects_file)
+        if not rejected.empty:
+            write_log(f"⚠️ {len(rejected)} ligne(s) rejetée(s) avant publication, voir le rapport de rejet.")
+
+        run.final_pass()
+        run.run_sync_ops(sync_ops)
+
+        if info and not info['received']:
+            write_log("📭 Aucune annonce reçue de l'export eBay.")
+            return "empty"
+        write_log("🎉 Tous les articles de l'export ont été traités.")
+        evend_scheduler.leave_queue(job.user_id)
+        return "done"
+
+    except ImportInterrupted as e:
+        # En pause comme en annulation, le job quitte la file : son tour passe à l'utilisateur suivant
+        write_log(str(e))
+        evend_scheduler.leave_queue(job.user_id)
+        return "paused" if isinstance(e, ImportPaused) else "cancelled"
+
+    except Exception as e_global:
+        write_log(f"❌ Erreur globale lors de la publication du flux: {e_global}")
+        evend_scheduler.leave_queue(job.user_id)
+        raise
+
+    finally:
+        run.close()
 
 
 # =====================================================
@@ -390,7 +1210,10 @@ def watch_folder():
             path = os.path.join(UPLOAD_FOLDER, file)
             if path.endswith(".csv") and path not in processed:
                 write_log(f"🆕 Nouveau CSV détecté: {file}")
-                process_csv(path)
+                try:
+                    process_csv(path)
+                except Exception:
+                    pass  # déjà journalisé ; le watcher passe au fichier suivant
                 processed.add(path)
         time.sleep(5)
 
@@ -398,6 +1221,8 @@ def watch_folder():
 # Main
 # =====================================================
 if __name__ == "__main__":
+    write_log("🔧 Script démarré, log utilisateur OK")
+
     missing = []
     if not EVEND_EMAIL:
         missing.append("EVEND_EMAIL")
@@ -410,9 +1235,21 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         csv_arg = sys.argv[1]
         write_log(f"▶ Démarrage traitement fichier fourni: {csv_arg}")
-        process_csv(csv_arg)
+        # --complet : le CSV est l'export eBay entier, les annonces absentes peuvent être terminées (mode "end")
+        current_job().export_complete = "--complet" in sys.argv[2:]
+        status = 0
+        try:
+            process_csv(csv_arg)
+        except Exception:
+            status = 1
+        if _driver_pool is not None:
+            _driver_pool.shutdown()
         write_log("▶ Fin traitement argument, exiting.")
-        sys.exit(0)
+        sys.exit(status)
 
-    watch_folder()
+    try:
+        watch_folder()
+    finally:
+        if _driver_pool is not None:
+            _driver_pool.shutdown()
 
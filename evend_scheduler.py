@@ -0,0 +1,244 @@
+# evend_scheduler.py (file de publication partagée : tours par lot, équité et ETA apprise)
+import os
+import json
+import time
+import fcntl
+from contextlib import contextmanager
+
+# ---------------------------- Configuration ----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+QUEUE_FILE = os.path.join(UPLOAD_FOLDER, "evend_publish_queue.json")
+QUEUE_LOCK_FILE = QUEUE_FILE + ".lock"
+THROUGHPUT_FILE = os.path.join(UPLOAD_FOLDER, "evend_throughput.json")
+
+# "fair" (part équitable pondérée), "srpt" (plus petit reste d'abord) ou "fifo"
+SCHEDULER_POLICY = os.environ.get("EVEND_SCHEDULER_POLICY", "fair")
+PUBLISH_SLOTS = int(os.environ.get("EVEND_PUBLISH_SLOTS", "1"))
+TURN_SIZE = 20              # un tour = un lot de publication
+STALE_TURN_SECONDS = 15 * 60  # tour abandonné par un worker mort
+STALE_ENTRY_SECONDS = 15 * 60  # entrée en attente sans nouvelles de son processus (plantage, kill)
+DEFAULT_SECONDS_PER_ITEM = 3.0
+EWMA_ALPHA = 0.2
+
+# =====================================================
+# Verrou et persistance
+# =====================================================
+@contextmanager
+def _locked():
+    with open(QUEUE_LOCK_FILE, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _read_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def load_queue():
+    jobs = _read_json(QUEUE_FILE, [])
+    if not isinstance(jobs, list):
+        return []
+    for job in jobs:  # entrées de l'ancien format {'id', 'articles'}
+        job.setdefault("remaining", job.get("articles", 0))
+        job.setdefault("served", 0)
+        job.setdefault("enqueued_at", 0)
+        job.setdefault("last_seen", job["enqueued_at"])
+    return jobs
+
+# =====================================================
+# Débit appris (secondes par article)
+# =====================================================
+def seconds_per_item():
+    return _read_json(THROUGHPUT_FILE, {}).get("seconds_per_item", DEFAULT_SECONDS_PER_ITEM)
+
+def record_throughput(items, elapsed):
+    if items <= 0 or elapsed <= 0:
+        return
+    with _locked():
+        stats = _read_json(THROUGHPUT_FILE, {})
+        previous = stats.get("seconds_per_item")
+        sample = elapsed / items
+        stats["seconds_per_item"] = sample if previous is None else (1 - EWMA_ALPHA) * previous + EWMA_ALPHA * sample
+        stats["items"] = stats.get("items", 0) + items
+        stats["updated_at"] = time.time()
+        _write_json(THROUGHPUT_FILE, stats)
+
+# =====================================================
+# Politique d'ordonnancement
+# =====================================================
+def _priority(job, policy):
+    # Priorité du job (evend_jobs) d'abord : la politique départage les jobs de même priorité
+    level = -job.get("priority", 0)
+    if policy == "srpt":
+        return (level, job["remaining"], job["enqueued_at"])
+    if policy == "fifo":
+        return (level, job["enqueued_at"])
+    return (level, job["served"] / max(job.get("weight", 1), 0.01), job["enqueued_at"])
+
+def _pick_next(jobs, policy=None, skip_done=False):
+    candidates = [j for j in jobs if not j.get("running") and not (skip_done and j["remaining"] <= 0)]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda j: _priority(j, policy or SCHEDULER_POLICY))
+
+def _clear_stale(jobs):
+    """Libère les tours abandonnés et retire les entrées dont le processus ne donne plus signe de vie.
+
+    Une entrée en attente est rafraîchie à chaque sondage de wait_for_turn (last_seen) : sans ça,
+    un processus mort pendant son attente resterait le prochain élu et bloquerait tout le monde.
+    """
+    now = time.time()
+    for job in jobs:
+        if job.get("running") and now - job.get("turn_started_at", now) > STALE_TURN_SECONDS:
+            job["running"] = False
+    jobs[:] = [j for j in jobs if j.get("running") or now - j["last_seen"] <= STALE_ENTRY_SECONDS]
+
+# =====================================================
+# API file d'attente
+# =====================================================
+def _start_served(jobs, weight):
+    """Temps virtuel de départ (file équitable à temps de départ) : le minimum des entrées actives.
+
+    Partir de 0 ferait passer chaque nouveau venu devant un job déjà bien servi jusqu'à l'avoir rattrapé.
+    """
+    active = [j["served"] / max(j.get("weight", 1), 0.01) for j in jobs if j["remaining"] > 0]
+    return min(active) * max(weight, 0.01) if active else 0
+
+def enter_queue(user_id, total_articles, weight=1, priority=0):
+    with _locked():
+        jobs = load_queue()
+        if user_id not in [j['id'] for j in jobs]:
+            jobs.append({
+                "id": user_id,
+                "articles": total_articles,
+                "remaining": total_articles,
+                "served": _start_served(jobs, weight),
+                "weight": weight,
+                "priority": priority,
+                "enqueued_at": time.time(),
+                "last_seen": time.time(),
+                "running": False,
+            })
+            _write_json(QUEUE_FILE, jobs)
+        return jobs
+
+def set_priority(user_id, priority):
+    """Change la priorité d'un utilisateur déjà en file ; effet au prochain tour attribué."""
+    with _locked():
+        jobs = load_queue()
+        for job in jobs:
+            if job["id"] == user_id:
+                job["priority"] = priority
+        _write_json(QUEUE_FILE, jobs)
+
+def leave_queue(user_id):
+    with _locked():
+        jobs = [j for j in load_queue() if j['id'] != user_id]
+        _write_json(QUEUE_FILE, jobs)
+
+def heartbeat(user_id):
+    """Signe de vie d'un import en file qui ne sonde pas wait_for_turn (attente du flux d'export, photos)."""
+    with _locked():
+        jobs = load_queue()
+        for job in jobs:
+            if job["id"] == user_id:
+                job["last_seen"] = time.time()
+        _write_json(QUEUE_FILE, jobs)
+
+def reset_queue():
+    """Vide la file : au démarrage du daemon, aucune entrée existante n'a plus de processus derrière elle."""
+    with _locked():
+        _write_json(QUEUE_FILE, [])
+
+def try_acquire_turn(user_id):
+    with _locked():
+        jobs = load_queue()
+        if user_id not in [j['id'] for j in jobs]:
+            return True
+        for job in jobs:
+            if job["id"] == user_id:
+                job["last_seen"] = time.time()
+        _clear_stale(jobs)
+        running = sum(1 for j in jobs if j.get("running"))
+        nxt = _pick_next(jobs)
+        if running >= PUBLISH_SLOTS or nxt is None or nxt["id"] != user_id:
+            _write_json(QUEUE_FILE, jobs)
+            return False
+        nxt["running"] = True
+        nxt["turn_started_at"] = time.time()
+        _write_json(QUEUE_FILE, jobs)
+        return True
+
+def release_turn(user_id, items_done, elapsed=None):
+    with _locked():
+        jobs = load_queue()
+        for job in jobs:
+            if job["id"] == user_id:
+                job["running"] = False
+                job["last_seen"] = time.time()
+                job["served"] += items_done
+                job["remaining"] = max(job["remaining"] - items_done, 0)
+        _write_json(QUEUE_FILE, jobs)
+    if elapsed is not None:
+        record_throughput(items_done, elapsed)
+
+def estimate_wait(user_id, jobs=None, policy=None):
+    """Simule la politique tour par tour. Retourne (attente avant le prochain tour, fin estimée), en secondes."""
+    jobs = [dict(j) for j in (jobs if jobs is not None else load_queue())]
+    spi = seconds_per_item()
+    slots = max(PUBLISH_SLOTS, 1)
+    elapsed = 0.0
+    wait = None
+
+    # Les tours en cours occupent leurs slots jusqu'à la fin du lot
+    for job in jobs:
+        if job.get("running"):
+            in_turn = min(TURN_SIZE, job["remaining"])
+            elapsed += in_turn * spi / slots
+            job["served"] += in_turn
+            job["remaining"] -= in_turn
+            job["running"] = False
+            if job["id"] == user_id:
+                wait = 0.0
+
+    for _ in range(100000):
+        nxt = _pick_next(jobs, policy, skip_done=True)
+        if nxt is None:
+            break
+        if nxt["id"] == user_id and wait is None:
+            wait = elapsed
+        turn = min(TURN_SIZE, nxt["remaining"])
+        elapsed += turn * spi / slots
+        nxt["served"] += turn
+        nxt["remaining"] -= turn
+        if nxt["id"] == user_id and nxt["remaining"] <= 0:
+            return wait, elapsed
+    return (wait or 0.0), elapsed
+
+def wait_for_turn(user_id, log=print, on_poll=None, poll_interval=1.0, log_every=15.0):
+    last_log = 0.0
+    while not try_acquire_turn(user_id):
+        if on_poll:
+            on_poll()
+        now = time.time()
+        if now - last_log >= log_every:
+            jobs = load_queue()
+            ahead = sum(1 for j in jobs if j["id"] != user_id and j["remaining"] > 0)
+            wait, finish = estimate_wait(user_id, jobs)
+            log(f"⚠️ {ahead} autre(s) import(s) en cours, prochain lot dans ~{int(wait)}s, fin estimée dans ~{int(finish)}s")
+            last_log = now
+        time.sleep(poll_interval)
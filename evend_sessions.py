@@ -0,0 +1,167 @@
+# evend_sessions.py (cache de sessions e-Vend partagé entre workers et redémarrages)
+import os
+import json
+import time
+import hmac
+import fcntl
+import hashlib
+import secrets
+import threading
+from contextlib import contextmanager
+
+import requests
+
+from evend_http import EVEND_BASE_URL, EVEND_NEW_LISTING_URL
+
+# ---------------------------- Configuration ----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSIONS_DIR = os.path.join(BASE_DIR, "uploads", "sessions")
+os.makedirs(SESSIONS_DIR, exist_ok=True)
+
+SESSION_MAX_AGE = 24 * 3600
+PROBE_URL = os.environ.get("EVEND_PROBE_URL", EVEND_NEW_LISTING_URL)
+PROBE_TTL = 60  # une session validée n'est pas re-sondée pendant 60 s
+PROBE_TIMEOUT = 10
+# Clé des vérificateurs de mot de passe : fixée par l'environnement, sinon générée une fois (0600)
+SESSION_SECRET = os.environ.get("EVEND_SESSION_SECRET")
+SECRET_FILE = os.path.join(SESSIONS_DIR, ".secret")
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+_probe_cache = {}  # clé compte -> (timestamp sonde, timestamp session)
+
+
+def account_key(email):
+    return hashlib.sha256((email or "").strip().lower().encode("utf-8")).hexdigest()[:16]
+
+def _session_path(email):
+    return os.path.join(SESSIONS_DIR, f"{account_key(email)}.json")
+
+def _secret():
+    if SESSION_SECRET:
+        return SESSION_SECRET.encode("utf-8")
+    try:
+        with open(SECRET_FILE, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    try:
+        fd = os.open(SECRET_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:  # créé entre-temps par un autre processus
+        with open(SECRET_FILE, "rb") as f:
+            return f.read()
+    with os.fdopen(fd, "wb") as f:
+        f.write(secrets.token_bytes(32))
+    with open(SECRET_FILE, "rb") as f:
+        return f.read()
+
+def password_verifier(email, password):
+    """HMAC du mot de passe : une session en cache ne sert qu'à qui connaît le mot de passe du compte."""
+    message = f"{account_key(email)}:{password or ''}".encode("utf-8")
+    return hmac.new(_secret(), message, hashlib.sha256).hexdigest()
+
+# =====================================================
+# Lecture / écriture
+# =====================================================
+def _read(email, password):
+    """Session en cache de `email`, ou None si absente, expirée ou enregistrée avec un autre mot de passe."""
+    path = _session_path(email)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    if time.time() - data.get("timestamp", 0) > SESSION_MAX_AGE:
+        invalidate(email)
+        return None
+    # Mauvais mot de passe : simple absence de cache, la session du titulaire reste intacte
+    if not hmac.compare_digest(str(data.get("verifier", "")), password_verifier(email, password)):
+        return None
+    return data
+
+def load_cookies(email, password):
+    data = _read(email, password)
+    return data.get("cookies") if data else None
+
+def save_cookies(email, cookies, password):
+    """À n'appeler qu'après une connexion réussie avec `password`."""
+    path = _session_path(email)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": time.time(), "verifier": password_verifier(email, password), "cookies": cookies}, f)
+    os.replace(tmp_path, path)  # écriture atomique : aucun worker ne lit un fichier partiel
+
+def invalidate(email):
+    _probe_cache.pop(account_key(email), None)
+    try:
+        os.remove(_session_path(email))
+    except OSError:
+        pass
+
+# =====================================================
+# Validation par requête authentifiée légère
+# =====================================================
+def probe(cookies):
+    jar = requests.cookies.RequestsCookieJar()
+    for cookie in cookies:
+        jar.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/"))
+    try:
+        resp = requests.get(PROBE_URL, cookies=jar, timeout=PROBE_TIMEOUT, allow_redirects=True)
+    except requests.RequestException:
+        return False
+    return resp.status_code == 200 and "/login" not in resp.url
+
+def _valid_cached_cookies(email, password):
+    data = _read(email, password)
+    if not data:
+        return None
+    key = account_key(email)
+    cached = _probe_cache.get(key)
+    if cached and cached[1] == data["timestamp"] and time.time() - cached[0] < PROBE_TTL:
+        return data["cookies"]
+    if probe(data["cookies"]):
+        _probe_cache[key] = (time.time(), data["timestamp"])
+        return data["cookies"]
+    invalidate(email)
+    return None
+
+# =====================================================
+# Verrou par compte (threads + processus)
+# =====================================================
+@contextmanager
+def account_lock(email):
+    key = account_key(email)
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(key, threading.Lock())
+    with thread_lock:
+        with open(os.path.join(SESSIONS_DIR, f"{key}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_session(email, password, login_fn):
+    """Retourne (cookies, reconnecté). login_fn se connecte avec `password` et enregistre la session."""
+    cookies = _valid_cached_cookies(email, password)
+    if cookies:
+        return cookies, False
+    with account_lock(email):
+        # Un autre worker a pu se connecter pendant l'attente du verrou
+        cookies = _valid_cached_cookies(email, password)
+        if cookies:
+            return cookies, False
+        login_fn()
+        return load_cookies(email, password), True
+
+def apply_to_driver(driver, cookies):
+    driver.get(EVEND_BASE_URL + "/")
+    for cookie in cookies:
+        cookie = dict(cookie)
+        cookie.pop('sameSite', None)
+        try:
+            driver.add_cookie(cookie)
+        except Exception:
+            pass
@@ -0,0 +1,417 @@
+# evend_storage.py (stockage adressé par contenu des exports, références par utilisateur, rétention et ménage d'uploads/)
+import os
+import re
+import sys
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+# ---------------------------- Configuration ----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "evend.db")
+UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
+# Hors de la racine d'uploads/ : le watcher ne voit pas les exports, et ne parcourt plus qu'un dossier court
+STORE_FOLDER = os.path.join(UPLOAD_FOLDER, "store")
+SESSIONS_FOLDER = os.path.join(UPLOAD_FOLDER, "sessions")
+EXPORT_FOLDER = os.path.join(UPLOAD_FOLDER, "exports")
+IMAGE_CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, "images_cache")
+REPORT_FOLDERS = [os.path.join(UPLOAD_FOLDER, "rejects"), os.path.join(UPLOAD_FOLDER, "dead_letters")]
+PROFILES_FOLDER = os.path.join(BASE_DIR, "chrome_profiles")
+os.makedirs(STORE_FOLDER, exist_ok=True)
+
+# Rétention des références : les N plus récentes par utilisateur, et aucune au-delà de N jours
+STORE_KEEP_PER_USER = int(os.environ.get("EVEND_STORE_KEEP_PER_USER", "10"))
+STORE_RETENTION = timedelta(days=int(os.environ.get("EVEND_STORE_RETENTION_DAYS", "30")))
+# Fichier orphelin gardé ce délai : une référence peut être en cours d'écriture
+ORPHAN_GRACE = 3600
+LOG_RETENTION = timedelta(days=int(os.environ.get("EVEND_LOG_RETENTION_DAYS", "14")))
+PROGRESS_RETENTION = timedelta(days=int(os.environ.get("EVEND_PROGRESS_RETENTION_DAYS", "7")))
+SESSION_RETENTION = timedelta(hours=24)  # SESSION_MAX_AGE d'evend_sessions : au-delà, jamais relue
+SCRATCH_RETENTION = timedelta(days=1)    # zips livrés, flags d'annulation oubliés
+# Rapports de rejets / d'échecs : relus à la reprise d'un job, gardés pour consultation ensuite
+REPORT_RETENTION = timedelta(days=int(os.environ.get("EVEND_REPORT_RETENTION_DAYS", "30")))
+# Photos réduites : âge depuis la dernière utilisation, puis plafond de taille (les plus anciennes d'abord)
+IMAGE_CACHE_RETENTION = timedelta(days=int(os.environ.get("EVEND_IMAGE_CACHE_RETENTION_DAYS", "14")))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("EVEND_IMAGE_CACHE_MAX_MB", "2048")) * 1024 * 1024
+# Sous le plafond de taille, une photo utilisée depuis moins que ça reste : un lot en file peut l'attendre
+IMAGE_CACHE_GRACE = SCRATCH_RETENTION
+# Profils Chrome : supprimés après ce délai sans activité, cache vidé au-delà du plafond
+PROFILE_RETENTION = timedelta(days=int(os.environ.get("EVEND_PROFILE_RETENTION_DAYS", "14")))
+PROFILE_MAX_BYTES = int(os.environ.get("EVEND_PROFILE_MAX_MB", "500")) * 1024 * 1024
+GC_INTERVAL = int(os.environ.get("EVEND_GC_INTERVAL", "3600"))
+GC_LOCK_FILE = os.path.join(UPLOAD_FOLDER, "evend_gc.lock")
+
+HASH_CHUNK = 1024 * 1024
+LEGACY_EXPORT_RE = re.compile(r"^(?P<user>.+)_ebay(_[0-9a-f]+)?(_part\d+)?\.csv$")
+LOG_RE = re.compile(r"^(?P<user>.+)_(import|selenium)_log\.txt$")
+PROGRESS_RE = re.compile(r"^progress_(?P<user>.+)\.txt$")
+IMAGE_RE = re.compile(r"^(?P<hash>[0-9a-f]{64})_\d+_\d+\.jpg$")
+
+# =====================================================
+# Références (evend.db)
+# =====================================================
+def get_db():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_storage_table():
+    conn = get_db()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS stored_files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        kind TEXT,
+        name TEXT,
+        sha256 TEXT NOT NULL,
+        size INTEGER,
+        created_at TEXT
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS stored_files_user ON stored_files(user_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS stored_files_sha ON stored_files(sha256)")
+    conn.commit()
+    conn.close()
+
+init_storage_table()
+
+# =====================================================
+# Stockage adressé par contenu
+# =====================================================
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def blob_path(sha256, ext=".csv"):
+    # Deux niveaux (ab/abcdef….csv) : aucun dossier ne grossit avec le nombre d'exports
+    return os.path.join(STORE_FOLDER, sha256[:2], sha256 + ext)
+
+def store_file(user_id, src_path, kind="export", name=None, created_at=None):
+    """Déplace src_path dans le stockage et y ajoute une référence pour user_id. Retourne le chemin stocké.
+
+    Un contenu déjà stocké (ré-export identique, même d'un autre utilisateur) n'est pas dupliqué :
+    le fichier source est supprimé et seule la référence est ajoutée.
+    """
+    sha256 = file_sha256(src_path)
+    size = os.path.getsize(src_path)
+    dest = blob_path(sha256, os.path.splitext(src_path)[1] or ".csv")
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if os.path.exists(dest):
+        os.utime(dest)  # rajeuni : le ménage ne le prend pas pour un orphelin pendant l'ajout de la référence
+        os.remove(src_path)
+    else:
+        os.replace(src_path, dest)
+
+    conn = get_db()
+    conn.execute("""
+        INSERT INTO stored_files (user_id, kind, name, sha256, size, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (user_id, kind, name or os.path.basename(src_path), sha256, size,
+          created_at or datetime.utcnow().isoformat()))
+    conn.commit()
+    conn.close()
+    return dest
+
+def user_files(user_id, kind=None, limit=20):
+    conn = get_db()
+    if kind:
+        rows = conn.execute("""
+            SELECT * FROM stored_files WHERE user_id=? AND kind=? ORDER BY created_at DESC LIMIT ?
+        """, (user_id, kind, limit)).fetchall()
+    else:
+        rows = conn.execute("SELECT * FROM stored_files WHERE user_id=? ORDER BY created_at DESC LIMIT ?",
+                            (user_id, limit)).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def usage():
+    """Octets réellement occupés par le stockage et octets référencés (l'écart = gain de la déduplication)."""
+    conn = get_db()
+    row = conn.execute("SELECT COALESCE(SUM(size), 0) AS referenced FROM stored_files").fetchone()
+    conn.close()
+    stored = sum(entry.stat().st_size for shard in os.scandir(STORE_FOLDER) if shard.is_dir()
+                 for entry in os.scandir(shard.path) if entry.is_file())
+    return {"stored": stored, "referenced": row["referenced"]}
+
+# =====================================================
+# Rétention et ménage
+# =====================================================
+def _protected_paths(conn):
+    """Fichiers encore utiles : dernier CSV de chaque utilisateur, CSV des jobs non terminés."""
+    paths = set()
+    for query in ("SELECT last_csv_path AS path FROM users",
+                  "SELECT csv_path AS path FROM publish_jobs WHERE status IN ('pending', 'running', 'paused')"):
+        try:
+            paths.update(row["path"] for row in conn.execute(query) if row["path"])
+        except sqlite3.OperationalError:
+            pass  # table pas encore créée (module utilisé sans l'app ou le daemon)
+    return paths
+
+def _active_users(conn):
+    try:
+        return {row["user_id"] for row in conn.execute(
+            "SELECT DISTINCT user_id FROM publish_jobs WHERE status IN ('pending', 'running', 'paused')")}
+    except sqlite3.OperationalError:
+        return set()
+
+def _remove(path, stats, key):
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except OSError:
+        return
+    stats[key] = stats.get(key, 0) + 1
+    stats[key + "_bytes"] = stats.get(key + "_bytes", 0) + size
+
+def _remove_tree(path, stats, key):
+    size, _ = _tree_usage(path)
+    shutil.rmtree(path, ignore_errors=True)
+    if os.path.exists(path):
+        return
+    stats[key] = stats.get(key, 0) + 1
+    stats[key + "_bytes"] = stats.get(key + "_bytes", 0) + size
+
+def _tree_usage(path):
+    """(octets, dernière modification) d'un dossier et de tout son contenu."""
+    size, latest = 0, 0.0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            size += st.st_size
+            latest = max(latest, st.st_mtime)
+    return size, latest
+
+def _older_than(path, age, now):
+    try:
+        return now - os.path.getmtime(path) > age.total_seconds()
+    except OSError:
+        return False
+
+def migrate_legacy_exports(stats, now=None):
+    """Range dans le stockage les exports {user}_ebay_*.csv laissés à la racine d'uploads/ avant ce module."""
+    now = now or time.time()
+    conn = get_db()
+    for entry in os.scandir(UPLOAD_FOLDER):
+        match = LEGACY_EXPORT_RE.match(entry.name)
+        # Récents : peut-être en cours d'écriture ou de publication par le watcher
+        if not entry.is_file() or not match or now - entry.stat().st_mtime < ORPHAN_GRACE:
+            continue
+        created_at = datetime.utcfromtimestamp(entry.stat().st_mtime).isoformat()
+        dest = store_file(match.group("user"), entry.path, "export", entry.name, created_at)
+        try:
+            conn.execute("UPDATE users SET last_csv_path=? WHERE last_csv_path=?", (dest, entry.path))
+            conn.commit()
+        except sqlite3.OperationalError:
+            pass
+        stats["migrated"] = stats.get("migrated", 0) + 1
+    conn.close()
+
+def prune_references(stats):
+    """Applique la rétention : STORE_KEEP_PER_USER références par utilisateur, aucune plus vieille que STORE_RETENTION."""
+    cutoff = (datetime.utcnow() - STORE_RETENTION).isoformat()
+    conn = get_db()
+    protected = _protected_paths(conn)
+    rows = conn.execute("""
+        SELECT id, sha256, name FROM (
+            SELECT id, sha256, name, created_at,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC, id DESC) AS rank
+            FROM stored_files
+        ) WHERE rank > ? OR created_at < ?
+    """, (STORE_KEEP_PER_USER, cutoff)).fetchall()
+    expired = [row["id"] for row in rows
+               if blob_path(row["sha256"], os.path.splitext(row["name"] or "")[1] or ".csv") not in protected]
+    conn.executemany("DELETE FROM stored_files WHERE id=?", [(ref_id,) for ref_id in expired])
+    conn.commit()
+    conn.close()
+    stats["references"] = len(expired)
+
+def sweep_store(stats, now=None):
+    """Supprime les fichiers du stockage qui n'ont plus aucune référence."""
+    now = now or time.time()
+    conn = get_db()
+    referenced = {row["sha256"] for row in conn.execute("SELECT DISTINCT sha256 FROM stored_files")}
+    protected = _protected_paths(conn)
+    conn.close()
+    for shard in os.scandir(STORE_FOLDER):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            sha256 = entry.name.split(".", 1)[0]
+            if (sha256 in referenced or entry.path in protected
+                    or now - entry.stat().st_mtime < ORPHAN_GRACE):
+                continue
+            _remove(entry.path, stats, "blobs")
+        try:
+            os.rmdir(shard.path)  # ne réussit que si le sous-dossier est vide
+        except OSError:
+            pass
+
+def sweep_uploads(stats, now=None):
+    """Logs, fichiers de reprise, sessions e-Vend et fichiers temporaires restés sans activité."""
+    now = now or time.time()
+    conn = get_db()
+    active = _active_users(conn)
+    conn.close()
+
+    for entry in os.scandir(UPLOAD_FOLDER):
+        if not entry.is_file():
+            continue
+        log_match = LOG_RE.match(entry.name)
+        progress_match = PROGRESS_RE.match(entry.name)
+        if log_match and log_match.group("user") not in active and _older_than(entry.path, LOG_RETENTION, now):
+            _remove(entry.path, stats, "logs")
+        elif (progress_match and progress_match.group("user") not in active
+              and _older_than(entry.path, PROGRESS_RETENTION, now)):
+            _remove(entry.path, stats, "progress")
+        elif entry.name.endswith("_cancel_flag") and _older_than(entry.path, SCRATCH_RETENTION, now):
+            _remove(entry.path, stats, "flags")
+
+    if os.path.isdir(SESSIONS_FOLDER):
+        for entry in os.scandir(SESSIONS_FOLDER):
+            if entry.is_file() and _older_than(entry.path, SESSION_RETENTION, now):
+                _remove(entry.path, stats, "sessions")
+    if os.path.isdir(EXPORT_FOLDER):
+        for entry in os.scandir(EXPORT_FOLDER):
+            # Zips livrés ; les pages des exports en cours sont dans des sous-dossiers
+            if entry.is_file() and entry.name.endswith(".zip") and _older_than(entry.path, SCRATCH_RETENTION, now):
+                _remove(entry.path, stats, "zips")
+
+def sweep_reports(stats, now=None):
+    """Rapports de rejets et d'échecs ({user}.csv) des utilisateurs sans job en cours, au-delà de REPORT_RETENTION."""
+    now = now or time.time()
+    conn = get_db()
+    active = _active_users(conn)
+    conn.close()
+    for folder in REPORT_FOLDERS:
+        if not os.path.isdir(folder):
+            continue
+        for entry in os.scandir(folder):
+            user_id = entry.name.split(".", 1)[0]
+            if entry.is_file() and user_id not in active and _older_than(entry.path, REPORT_RETENTION, now):
+                _remove(entry.path, stats, "reports")
+
+def sweep_image_cache(stats, now=None):
+    """Photos réduites : inutilisées depuis IMAGE_CACHE_RETENTION, puis les plus anciennes au-delà du plafond.
+
+    evend_images rajeunit une photo à chaque réutilisation ; l'index URL -> hash est ensuite purgé
+    des photos supprimées (une entrée perdue ne coûte qu'un nouveau téléchargement).
+    """
+    now = now or time.time()
+    if not os.path.isdir(IMAGE_CACHE_FOLDER):
+        return
+    images = []
+    for entry in os.scandir(IMAGE_CACHE_FOLDER):
+        if not entry.is_file():
+            continue
+        if entry.name.endswith(".tmp"):
+            if _older_than(entry.path, SCRATCH_RETENTION, now):
+                _remove(entry.path, stats, "images")
+        elif IMAGE_RE.match(entry.name):
+            st = entry.stat()
+            images.append((st.st_mtime, st.st_size, entry.path))
+
+    images.sort()
+    total = sum(size for _, size, _ in images)
+    kept = set()
+    for mtime, size, path in images:
+        expired = now - mtime > IMAGE_CACHE_RETENTION.total_seconds()
+        over_cap = total > IMAGE_CACHE_MAX_BYTES and now - mtime > IMAGE_CACHE_GRACE.total_seconds()
+        if expired or over_cap:
+            _remove(path, stats, "images")
+            total -= size
+        else:
+            kept.add(IMAGE_RE.match(os.path.basename(path)).group("hash"))
+
+    index_path = os.path.join(IMAGE_CACHE_FOLDER, "url_index.json")
+    if not stats.get("images") or not os.path.exists(index_path):
+        return
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return
+    pruned = {url: source_hash for url, source_hash in index.items() if source_hash in kept}
+    if len(pruned) != len(index):
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(pruned, f)
+        os.replace(tmp_path, index_path)
+
+def sweep_profiles(stats, now=None):
+    """Profils Chrome (chrome_profiles/{user}, pool_{slot}) : jamais ceux d'un job en cours.
+
+    Inactif depuis PROFILE_RETENTION : profil supprimé. Plus gros que PROFILE_MAX_BYTES : cache disque vidé.
+    """
+    now = now or time.time()
+    if not os.path.isdir(PROFILES_FOLDER):
+        return
+    conn = get_db()
+    active = _active_users(conn)
+    conn.close()
+    for entry in os.scandir(PROFILES_FOLDER):
+        if not entry.is_dir():
+            continue
+        # Les slots du pool servent à tous les jobs : intouchables tant qu'un job tourne
+        if entry.name in active or (entry.name.startswith("pool_") and active):
+            continue
+        size, latest = _tree_usage(entry.path)
+        if now - latest > PROFILE_RETENTION.total_seconds():
+            _remove_tree(entry.path, stats, "profiles")
+        elif size > PROFILE_MAX_BYTES and os.path.isdir(os.path.join(entry.path, "cache")):
+            _remove_tree(os.path.join(entry.path, "cache"), stats, "profile_caches")
+
+def collect_garbage(log=print):
+    """Un passage complet du ménage. Un seul processus à la fois (workers gunicorn, CLI)."""
+    with open(GC_LOCK_FILE, "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return None
+        started = time.time()
+        stats = {}
+        migrate_legacy_exports(stats)
+        prune_references(stats)
+        sweep_store(stats)
+        sweep_uploads(stats)
+        sweep_reports(stats)
+        sweep_image_cache(stats)
+        sweep_profiles(stats)
+        freed = sum(v for k, v in stats.items() if k.endswith("_bytes"))
+        removed = {k: v for k, v in stats.items() if not k.endswith("_bytes") and v}
+        if removed:
+            log(f"🧹 Ménage uploads/: {removed}, {freed / 1024 / 1024:.1f} Mo libérés "
+                f"en {time.time() - started:.1f}s")
+        return stats
+
+_gc_thread = None
+
+def start_gc(interval=GC_INTERVAL, log=print):
+    """Lance le ménage périodique en tâche de fond (une fois par processus)."""
+    global _gc_thread
+    if _gc_thread is not None or interval <= 0:
+        return
+    def run():
+        while True:
+            try:
+                collect_garbage(log)
+            except Exception as e:
+                log(f"⚠️ Ménage uploads/ en échec: {e}")
+            time.sleep(interval)
+    _gc_thread = threading.Thread(target=run, daemon=True, name="evend-gc")
+    _gc_thread.start()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--usage":
+        print(usage())
+    else:
+        print(collect_garbage())
@@ -0,0 +1,154 @@
+# evend_sync.py (synchronisation incrémentale eBay -> e-Vend : correspondance SKU/ItemID -> annonce)
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+# ---------------------------- Configuration ----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "evend.db")
+
+# "off" : tout est créé ; "on" : nouveaux + prix/stock modifiés ; "end" : idem + fin des annonces disparues
+SYNC_MODE = os.environ.get("EVEND_SYNC_MODE", "off")
+NO_KEY_VALUES = {"", "NO_SKU", "nan", "None"}
+# Garde-fous : un export tronqué ne doit pas terminer la moitié du catalogue
+MAX_END_RATIO = 0.5
+MAX_END_COUNT = int(os.environ.get("EVEND_SYNC_MAX_END", "200"))
+
+# =====================================================
+# Table de correspondance
+# =====================================================
+def get_db():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_listing_map():
+    conn = get_db()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS listing_map (
+        user_id TEXT,
+        ebay_key TEXT,
+        evend_listing_id TEXT,
+        prix REAL,
+        stock INTEGER,
+        titre TEXT,
+        updated_at TEXT,
+        PRIMARY KEY(user_id, ebay_key)
+    )""")
+    conn.commit()
+    conn.close()
+
+init_listing_map()
+
+def load_mapping(user_id):
+    conn = get_db()
+    mapping = pd.read_sql_query(
+        "SELECT ebay_key, evend_listing_id, prix AS prix_evend, stock AS stock_evend FROM listing_map WHERE user_id=?",
+        conn, params=(user_id,))
+    conn.close()
+    return mapping
+
+def record_listing(user_id, ebay_key, evend_listing_id, prix, stock, titre=None):
+    if not ebay_key:
+        return
+    conn = get_db()
+    conn.execute("""
+        INSERT INTO listing_map (user_id, ebay_key, evend_listing_id, prix, stock, titre, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, ebay_key) DO UPDATE SET
+            evend_listing_id=COALESCE(excluded.evend_listing_id, listing_map.evend_listing_id),
+            prix=excluded.prix,
+            stock=excluded.stock,
+            titre=COALESCE(excluded.titre, listing_map.titre),
+            updated_at=excluded.updated_at
+    """, (user_id, ebay_key, evend_listing_id, float(prix), int(stock), titre, datetime.utcnow().isoformat()))
+    conn.commit()
+    conn.close()
+
+def forget_listing(user_id, ebay_key):
+    conn = get_db()
+    conn.execute("DELETE FROM listing_map WHERE user_id=? AND ebay_key=?", (user_id, ebay_key))
+    conn.commit()
+    conn.close()
+
+# =====================================================
+# Diff export <-> correspondance
+# =====================================================
+def sync_keys(df):
+    """Clé de synchro par ligne : ItemID eBay si présent, sinon SKU. Vide si aucune clé fiable."""
+    keys = pd.Series("", index=df.index, dtype=object)
+    for col in ("sku", "item_id"):  # item_id l'emporte : appliqué en dernier
+        if col in df.columns:
+            values = df[col].astype("string").str.strip().fillna("")
+            values = values.str.replace(r"\.0$", "", regex=True)  # ItemID relu comme float par pandas
+            keys = keys.mask(~values.isin(NO_KEY_VALUES), values)
+    return keys
+
+def plan_sync(user_id, df, end_missing=False, export_complete=False, log=None):
+    """Retourne (à créer, à mettre à jour, à terminer, nb inchangés, rejetées).
+
+    Les fins d'annonces ne sont prévues que si end_missing ET export_complete : l'appelant garantit
+    que df est l'export eBay entier (aucune page en échec, pas de plafond). `log` reçoit les fins écartées.
+
+    à créer : lignes du CSV sans annonce connue (colonne sync_key ajoutée) ;
+    à mettre à jour : sync_key, evend_listing_id, prix, stock des annonces dont le prix ou le stock a changé ;
+    à terminer : sync_key, evend_listing_id des annonces absentes du nouvel export (si end_missing) ;
+    rejetées : lignes du CSV écartées, avec motif_rejet comme prevalidate_dataframe (clé en double,
+    annonce modifiée dont l'id e-Vend est inconnu).
+    """
+    df = df.copy()
+    df["sync_key"] = sync_keys(df)
+    has_key = df["sync_key"] != ""
+    duplicated = has_key & df["sync_key"].duplicated()
+    keyed = df[has_key & ~duplicated]
+    unkeyed = df[~has_key]
+
+    # Même clé sur plusieurs lignes : la première est traitée, les suivantes vont au rapport de rejet
+    first_line = df.index.to_series().groupby(df["sync_key"]).transform("first") + 2
+    duplicates = df[duplicated].copy()
+    duplicates.insert(0, "motif_rejet", "clé eBay en double (déjà ligne " + first_line[duplicated].astype(str) + ")")
+
+    mapping = load_mapping(user_id)
+    merged = keyed.reset_index().merge(mapping, how="outer", left_on="sync_key", right_on="ebay_key", indicator=True)
+
+    in_csv = merged[merged["_merge"] != "right_only"].set_index("index")
+    known = in_csv["_merge"] == "both"
+    changed = known & (
+        (in_csv["prix"].round(2) != in_csv["prix_evend"].round(2))
+        | (in_csv["stock"].astype(int) != in_csv["stock_evend"].fillna(-1).astype(int))
+    )
+
+    # Publiée sans id relevé (URL de confirmation inattendue) : ni recréée ni modifiable, signalée
+    no_id = changed & in_csv["evend_listing_id"].isna()
+    missing_id = df.loc[in_csv.index[no_id]].copy()
+    missing_id.insert(0, "motif_rejet", "id d'annonce e-Vend inconnu, modification à faire à la main")
+    changed &= ~no_id
+
+    to_create = pd.concat([df.loc[in_csv.index[~known]], unkeyed]).sort_index()
+    to_update = in_csv.loc[changed, ["sync_key", "evend_listing_id", "prix", "stock", "titre"]]
+    unchanged = int((known & ~changed & ~no_id).sum())
+    rejected = pd.concat([duplicates, missing_id]).sort_index()
+
+    to_end = merged.loc[merged["_merge"] == "right_only", ["ebay_key", "evend_listing_id"]]
+    to_end = to_end.rename(columns={"ebay_key": "sync_key"})
+    if end_missing and len(to_end):
+        reason = None
+        if not export_complete:
+            reason = "export eBay non garanti complet"
+        elif len(to_end) >= MAX_END_RATIO * len(mapping):
+            reason = f"au moins {MAX_END_RATIO:.0%} des annonces connues"
+        elif len(to_end) > MAX_END_COUNT:
+            reason = f"plus de {MAX_END_COUNT} annonces"
+        if reason:
+            if log:
+                log(f"⚠️ Synchro: {len(to_end)} annonce(s) absente(s) de l'export non terminée(s) ({reason})")
+            to_end = to_end.iloc[0:0]
+    elif not end_missing:
+        to_end = to_end.iloc[0:0]
+
+    # NaN -> None : un id d'annonce inconnu doit rester falsy
+    to_update = to_update.astype(object).where(to_update.notna(), None)
+    to_end = to_end.astype(object).where(to_end.notna(), None)
+    return to_create, to_update, to_end, unchanged, rejected
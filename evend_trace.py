@@ -0,0 +1,280 @@
+# evend_trace.py (durées par article et par phase du publisher, profilage par échantillonnage, rapport CLI)
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+import functools
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# ---------------------------- Configuration ----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRACE_DB = os.environ.get("EVEND_TRACE_DB", os.path.join(BASE_DIR, "uploads", "evend_traces.db"))
+TRACE_ENABLED = os.environ.get("EVEND_TRACE", "on") == "on"
+TRACE_KEEP_JOBS = int(os.environ.get("EVEND_TRACE_KEEP_JOBS", "200"))
+# Profileur par échantillonnage : 0 = désactivé ; sinon fréquence en Hz, piles au format "folded" (flamegraph)
+PROFILE_HZ = float(os.environ.get("EVEND_TRACE_PROFILE_HZ", "0"))
+PROFILE_DIR = os.path.join(BASE_DIR, "uploads", "profiles")
+
+_local = threading.local()
+_phase_by_thread = {}  # thread id -> phase en cours, lu par le profileur
+
+# =====================================================
+# Stockage (SQLite dédié : les écritures ne bloquent pas evend.db)
+# =====================================================
+def get_db():
+    conn = sqlite3.connect(TRACE_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_trace_db():
+    os.makedirs(os.path.dirname(TRACE_DB), exist_ok=True)
+    conn = get_db()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS trace_jobs (
+        job_id TEXT PRIMARY KEY,
+        user_id TEXT,
+        started_at TEXT,
+        ended_at TEXT,
+        items INTEGER
+    )""")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS spans (
+        job_id TEXT,
+        item TEXT,
+        phase TEXT,
+        duration REAL,
+        ok INTEGER
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS spans_job ON spans(job_id)")
+    conn.commit()
+    conn.close()
+
+if TRACE_ENABLED:
+    init_trace_db()
+
+def _flush():
+    spans = getattr(_local, "spans", None)
+    if not spans:
+        return
+    _local.spans = []
+    try:
+        conn = get_db()
+        conn.executemany("INSERT INTO spans (job_id, item, phase, duration, ok) VALUES (?, ?, ?, ?, ?)", spans)
+        conn.commit()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"⚠️ Traces non enregistrées: {e}", flush=True)
+
+def _prune(conn):
+    old = [row["job_id"] for row in conn.execute(
+        "SELECT job_id FROM trace_jobs ORDER BY started_at DESC LIMIT -1 OFFSET ?", (TRACE_KEEP_JOBS,))]
+    for job_id in old:
+        conn.execute("DELETE FROM spans WHERE job_id=?", (job_id,))
+        conn.execute("DELETE FROM trace_jobs WHERE job_id=?", (job_id,))
+
+# =====================================================
+# Enregistrement
+# =====================================================
+def begin_job(user_id):
+    """Ouvre une trace pour le thread courant (un import CSV). Retourne l'id de trace ou None."""
+    if not TRACE_ENABLED:
+        return None
+    job_id = uuid.uuid4().hex[:12]
+    _local.job_id, _local.item, _local.spans, _local.items = job_id, None, [], 0
+    conn = get_db()
+    conn.execute("INSERT INTO trace_jobs (job_id, user_id, started_at) VALUES (?, ?, ?)",
+                 (job_id, user_id, datetime.utcnow().isoformat()))
+    _prune(conn)
+    conn.commit()
+    conn.close()
+    _local.sampler = Sampler(threading.get_ident(), PROFILE_HZ, job_id) if PROFILE_HZ > 0 else None
+    if _local.sampler:
+        _local.sampler.start()
+    return job_id
+
+def end_job():
+    job_id = getattr(_local, "job_id", None)
+    if job_id is None:
+        return
+    _flush()
+    conn = get_db()
+    conn.execute("UPDATE trace_jobs SET ended_at=?, items=? WHERE job_id=?",
+                 (datetime.utcnow().isoformat(), _local.items, job_id))
+    conn.commit()
+    conn.close()
+    if _local.sampler:
+        _local.sampler.stop()
+    _local.job_id = None
+    _phase_by_thread.pop(threading.get_ident(), None)
+
+@contextmanager
+def span(phase):
+    """Mesure une phase de l'article en cours. Sans trace ouverte, ne fait rien."""
+    if getattr(_local, "job_id", None) is None:
+        yield
+        return
+    tid = threading.get_ident()
+    parent = _phase_by_thread.get(tid)
+    _phase_by_thread[tid] = phase
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        _local.spans.append((_local.job_id, _local.item, phase, time.perf_counter() - start, int(ok)))
+        _phase_by_thread[tid] = parent
+
+class Outcome:
+    def __init__(self):
+        self.ok = True
+
+@contextmanager
+def item(key, phase="item"):
+    """Article en cours : ses phases lui sont rattachées. outcome.ok = False marque un échec sans exception."""
+    outcome = Outcome()
+    if getattr(_local, "job_id", None) is None:
+        yield outcome
+        return
+    _local.item = str(key)
+    start = time.perf_counter()
+    try:
+        yield outcome
+    except BaseException:
+        outcome.ok = False
+        raise
+    finally:
+        _local.spans.append((_local.job_id, _local.item, phase, time.perf_counter() - start, int(outcome.ok)))
+        _local.items += 1
+        _local.item = None
+        _flush()
+
+def traced(phase):
+    """Décorateur : la fonction entière est une phase."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# =====================================================
+# Profileur par échantillonnage (optionnel)
+# =====================================================
+class Sampler:
+    """Échantillonne la pile d'un thread à `hz` Hz ; écrit uploads/profiles/<job>.folded (phase;pile compte)."""
+
+    def __init__(self, thread_id, hz, job_id):
+        self.thread_id = thread_id
+        self.interval = 1.0 / hz
+        self.path = os.path.join(PROFILE_DIR, f"{job_id}.folded")
+        self.counts = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True, name="evend-sampler")
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            phase = _phase_by_thread.get(self.thread_id) or "-"
+            self.counts[phase + ";" + ";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        if self.counts:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                for stack, count in self.counts.most_common():
+                    f.write(f"{stack} {count}\n")
+
+# =====================================================
+# Rapport
+# =====================================================
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+def load_jobs(user_id=None, last=20):
+    conn = get_db()
+    if user_id:
+        rows = conn.execute("SELECT * FROM trace_jobs WHERE user_id=? ORDER BY started_at DESC LIMIT ?",
+                            (user_id, last)).fetchall()
+    else:
+        rows = conn.execute("SELECT * FROM trace_jobs ORDER BY started_at DESC LIMIT ?", (last,)).fetchall()
+    conn.close()
+    return [dict(row) for row in reversed(rows)]
+
+def load_spans(job_ids):
+    if not job_ids:
+        return []
+    conn = get_db()
+    rows = conn.execute(f"SELECT * FROM spans WHERE job_id IN ({','.join('?' * len(job_ids))})",
+                        job_ids).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def report(user_id=None, last=20, top=10, out=print):
+    jobs = load_jobs(user_id, last)
+    spans = load_spans([job["job_id"] for job in jobs])
+    if not spans:
+        out("Aucune trace enregistrée.")
+        return
+
+    by_phase = {}
+    for s in spans:
+        by_phase.setdefault(s["phase"], []).append(s["duration"])
+    item_total = sum(by_phase.get("item", [])) or 1.0
+
+    out(f"== Phases ({len(jobs)} import(s)) ==")
+    out(f"{'phase':<26}{'n':>6}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'% article':>11}")
+    for phase, values in sorted(by_phase.items(), key=lambda kv: -sum(kv[1])):
+        share = "" if phase in ("item", "sync_item") else f"{sum(values) / item_total * 100:.0f}%"
+        out(f"{phase:<26}{len(values):>6}{percentile(values, 50):>9.2f}{percentile(values, 90):>9.2f}"
+            f"{percentile(values, 99):>9.2f}{max(values):>9.2f}{share:>11}")
+
+    out(f"\n== {top} articles les plus lents ==")
+    items = sorted((s for s in spans if s["phase"] == "item"), key=lambda s: -s["duration"])[:top]
+    for s in items:
+        phases = sorted((p for p in spans if p["job_id"] == s["job_id"] and p["item"] == s["item"]
+                         and p["phase"] != "item"), key=lambda p: -p["duration"])
+        worst = f"{phases[0]['phase']} {phases[0]['duration']:.2f}s" if phases else "-"
+        status = "ok" if s["ok"] else "échec"
+        out(f"{s['duration']:>8.2f}s  {s['job_id']}  {s['item']:<24} {status:<6} phase dominante: {worst}")
+
+    out("\n== Tendance par import ==")
+    out(f"{'début':<20}{'utilisateur':<24}{'articles':>9}{'p50 article':>13}{'articles/min':>14}")
+    for job in jobs:
+        durations = [s["duration"] for s in spans if s["job_id"] == job["job_id"] and s["phase"] == "item"]
+        rate = ""
+        if job["ended_at"] and durations:
+            elapsed = (datetime.fromisoformat(job["ended_at"]) - datetime.fromisoformat(job["started_at"])).total_seconds()
+            rate = f"{len(durations) / elapsed * 60:.1f}" if elapsed > 0 else ""
+        out(f"{job['started_at'][:19]:<20}{(job['user_id'] or '')[:22]:<24}{len(durations):>9}"
+            f"{percentile(durations, 50):>13.2f}{rate:>14}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rapport des traces du publisher e-Vend")
+    parser.add_argument("--user", help="limiter à un utilisateur")
+    parser.add_argument("--last", type=int, default=20, help="nombre d'imports récents analysés")
+    parser.add_argument("--top", type=int, default=10, help="nombre d'articles lents affichés")
+    args = parser.parse_args()
+    report(args.user, args.last, args.top)
@@ -0,0 +1,233 @@
+# fake_evend.py (faux site e-Vend local pour mesurer le publisher sans publier de vraies annonces)
+import os
+import time
+import uuid
+import io
+import random
+import threading
+
+from flask import Flask, request, redirect, jsonify, make_response
+from PIL import Image
+
+# ---------------------------- Configuration ----------------------------
+FAKE_LATENCY = float(os.environ.get("FAKE_EVEND_LATENCY", "0.05"))
+FAKE_FAILURE_RATE = float(os.environ.get("FAKE_EVEND_FAILURE_RATE", "0"))
+# Photo servie par /photos : assez grande pour que evend_images la réduise comme une vraie photo eBay
+FAKE_PHOTO_SIZE = (2400, 1800)
+SESSION_COOKIE = "evend_session"
+CSRF_TOKEN = "fake-csrf-token"
+
+app = Flask(__name__)
+app.config["LATENCY"] = FAKE_LATENCY
+app.config["FAILURE_RATE"] = FAKE_FAILURE_RATE
+
+_lock = threading.Lock()
+_sessions = set()
+stats = {"logins": 0, "drafts": 0, "published": 0, "failed": 0, "photos": 0, "photo_bytes": 0,
+         "updated": 0, "ended": 0}
+EMPTY_DRAFT_ID = "00000000-0000-0000-0000-000000000000"
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>e-Vend (faux)</title><link rel="stylesheet" href="/static/site.css"></head>
+<body>
+<button type="button" onclick="document.getElementById('login-form').style.display='block'">Connexion</button>
+<form id="login-form" method="post" action="/login" style="display:none">
+  <input name="email" type="email">
+  <input name="password" type="password">
+  <button type="submit">Se connecter</button>
+</form>
+</body></html>"""
+
+DASHBOARD_PAGE = """<!DOCTYPE html>
+<html><head><title>Tableau de bord</title></head>
+<body><div id="dashboard">Bienvenue</div></body></html>"""
+
+LISTING_PAGE = """<!DOCTYPE html>
+<html><head>
+<title>Nouvelle annonce</title>
+<meta name="csrf-token" content="{csrf}">
+<link rel="stylesheet" href="/static/site.css">
+<script src="/static/analytics.js"></script>
+</head>
+<body>
+<form id="listing" method="post" action="/l/draft/{draft_id}/details" enctype="multipart/form-data">
+  <input type="hidden" name="_token" value="{csrf}">
+  <select id="type_annonce" name="type_annonce">
+    <option value="Vente classique">Vente classique</option>
+    <option value="Encan">Encan</option>
+  </select>
+  <input id="categorie" name="categorie">
+  <input id="titre" name="titre">
+  <textarea id="description" name="description"></textarea>
+  <input id="condition" name="condition">
+  <input id="retour" name="retour">
+  <input id="garantie" name="garantie">
+  <input id="prix" name="prix">
+  <input id="stock" name="stock">
+  <input id="frais_port_article" name="frais_port_article">
+  <input id="frais_port_sup" name="frais_port_sup">
+  <label><input type="radio" name="livraison" value="livraison" checked> Livraison</label>
+  <label><input type="radio" name="livraison" value="ramassage"> Ramassage</label>
+  <input type="file" name="photos">
+  <input type="file" name="photos">
+  <input type="file" name="photos">
+  <button id="submitBtn" type="submit">Publier</button>
+</form>
+</body></html>"""
+
+EDIT_PAGE = """<!DOCTYPE html>
+<html><body>
+<form method="post" action="/l/{listing_id}/edit">
+  <input id="prix" name="prix">
+  <input id="stock" name="stock">
+  <button id="submitBtn" type="submit">Enregistrer</button>
+</form>
+</body></html>"""
+
+END_PAGE = """<!DOCTYPE html>
+<html><body>
+<form method="post" action="/l/{listing_id}/end">
+  <button id="endBtn" type="submit">Terminer l'annonce</button>
+</form>
+</body></html>"""
+
+SUCCESS_PAGE = """<!DOCTYPE html>
+<html><body><div class="success-message">Annonce {draft_id} publiée</div></body></html>"""
+
+ERROR_PAGE = """<!DOCTYPE html>
+<html><body><div class="alert-danger">Erreur lors de la publication</div></body></html>"""
+
+INVALID_PAGE = """<!DOCTYPE html>
+<html><body><div class="invalid-feedback">Le titre est obligatoire</div></body></html>"""
+
+
+def _logged_in():
+    return request.cookies.get(SESSION_COOKIE) in _sessions
+
+@app.before_request
+def simulate_latency():
+    if app.config["LATENCY"] > 0:
+        time.sleep(app.config["LATENCY"])
+
+# =====================================================
+# Connexion
+# =====================================================
+@app.route('/', methods=['GET'])
+@app.route('/login', methods=['GET'])
+def login_page():
+    return LOGIN_PAGE
+
+@app.route('/login', methods=['POST'])
+def login():
+    if not request.form.get("email") or not request.form.get("password"):
+        return redirect('/login')
+    token = uuid.uuid4().hex
+    with _lock:
+        _sessions.add(token)
+        stats["logins"] += 1
+    resp = make_response(redirect('/dashboard'))
+    resp.set_cookie(SESSION_COOKIE, token)
+    return resp
+
+@app.route('/dashboard')
+def dashboard():
+    if not _logged_in():
+        return redirect('/login')
+    return DASHBOARD_PAGE
+
+# =====================================================
+# Annonces
+# =====================================================
+@app.route('/l/draft/<draft_id>/new/details')
+def new_listing(draft_id):
+    if not _logged_in():
+        return redirect('/login')
+    if draft_id == EMPTY_DRAFT_ID:
+        draft_id = str(uuid.uuid4())
+    return LISTING_PAGE.format(csrf=CSRF_TOKEN, draft_id=draft_id)
+
+@app.route('/l/draft', methods=['POST'])
+def create_draft():
+    if not _logged_in():
+        return redirect('/login')
+    with _lock:
+        stats["drafts"] += 1
+    return jsonify({"id": str(uuid.uuid4())})
+
+@app.route('/l/draft/<draft_id>/details', methods=['POST'])
+def submit_details(draft_id):
+    if not _logged_in():
+        return redirect('/login')
+    photos = request.files.getlist("photos")
+    photo_bytes = sum(len(p.read()) for p in photos if p.filename)
+    invalid = not request.form.get("titre")
+    failed = invalid or random.random() < app.config["FAILURE_RATE"]
+    with _lock:
+        stats["photos"] += sum(1 for p in photos if p.filename)
+        stats["photo_bytes"] += photo_bytes
+        stats["failed" if failed else "published"] += 1
+    if invalid:
+        return INVALID_PAGE, 422
+    if failed:
+        return ERROR_PAGE, 500
+    return SUCCESS_PAGE.format(draft_id=draft_id)
+
+@app.route('/l/<listing_id>/edit', methods=['GET', 'POST'])
+def edit_listing(listing_id):
+    if not _logged_in():
+        return redirect('/login')
+    if request.method == 'GET':
+        return EDIT_PAGE.format(listing_id=listing_id)
+    with _lock:
+        stats["updated"] += 1
+    return SUCCESS_PAGE.format(draft_id=listing_id)
+
+@app.route('/l/<listing_id>/end', methods=['GET', 'POST'])
+def end_listing(listing_id):
+    if not _logged_in():
+        return redirect('/login')
+    if request.method == 'GET':
+        return END_PAGE.format(listing_id=listing_id)
+    with _lock:
+        stats["ended"] += 1
+    return SUCCESS_PAGE.format(draft_id=listing_id)
+
+# =====================================================
+# Assets (pour mesurer le blocage réseau) et statistiques
+# =====================================================
+@app.route('/static/site.css')
+def site_css():
+    return app.response_class("body { font-family: sans-serif; }", mimetype="text/css")
+
+@app.route('/static/analytics.js')
+def analytics_js():
+    return app.response_class("window.__analytics = true;", mimetype="application/javascript")
+
+_photo = None
+
+def fake_photo():
+    """Un vrai JPEG (bruit + dégradé, pour un poids réaliste), généré une seule fois."""
+    global _photo
+    with _lock:
+        if _photo is None:
+            noise = Image.effect_noise(FAKE_PHOTO_SIZE, 12)
+            gradient = Image.linear_gradient("L").resize(FAKE_PHOTO_SIZE)
+            img = Image.merge("RGB", (noise, gradient, gradient.transpose(Image.Transpose.ROTATE_180)))
+            buf = io.BytesIO()
+            img.save(buf, "JPEG", quality=85)  # ~500 Ko, le poids d'une photo eBay
+            _photo = buf.getvalue()
+        return _photo
+
+@app.route('/photos/<int:n>.jpg')
+def photo(n):
+    return app.response_class(fake_photo(), mimetype="image/jpeg")
+
+@app.route('/stats')
+def get_stats():
+    with _lock:
+        return jsonify(dict(stats))
+
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 5055))
+    app.run(host="127.0.0.1", port=port, threaded=True)
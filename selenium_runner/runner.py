@@ -14,6 +14,9 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import evend_sessions
+
 # ---------------------------- Configuration ----------------------------
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
@@ -23,7 +26,6 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 USER_ID = os.environ.get("user_id", f"user_{os.getpid()}")
 LOG_FILE = os.path.join(UPLOAD_FOLDER, f"{USER_ID}_import_log.txt")
-SESSION_FILE = os.path.join(UPLOAD_FOLDER, f"session_{USER_ID}.json")
 QUEUE_FILE = os.path.join(UPLOAD_FOLDER, "evend_publish_queue.json")
 PROGRESS_FILE = os.path.join(UPLOAD_FOLDER, f"progress_{USER_ID}.txt")
 
@@ -33,7 +35,6 @@ LIVRAISON_RAMASSAGE_CHECK = os.environ.get("livraison_ramassage_check") == 'on'
 FRAIS_PORT_ARTICLE = float(os.environ.get("frais_port_article", "0"))
 FRAIS_PORT_SUP = float(os.environ.get("frais_port_sup", "0"))
 
-SESSION_MAX_AGE = 24 * 3600  # 24h
 BATCH_SIZE = 20
 
 EVEND_LOGIN_URL = "https://www.e-vend.ca/login"
@@ -107,29 +108,18 @@ def get_driver():
 
 def save_session(driver):
     try:
-        cookies = driver.get_cookies()
-        session_data = {"timestamp": time.time(), "cookies": cookies}
-        with open(SESSION_FILE, "w", encoding="utf-8") as f:
-            json.dump(session_data, f)
+        evend_sessions.save_cookies(EVEND_EMAIL, driver.get_cookies(), EVEND_PASSWORD)
     except Exception as e:
         write_log(f"⚠️ Impossible de sauvegarder la session: {e}")
 
 def load_session(driver):
-    if os.path.exists(SESSION_FILE):
-        try:
-            with open(SESSION_FILE, "r", encoding="utf-8") as f:
-                session_data = json.load(f)
-            if time.time() - session_data.get("timestamp", 0) > SESSION_MAX_AGE:
-                write_log("⚠️ Session expirée, suppression.")
-                os.remove(SESSION_FILE)
-                return False
-            driver.get(EVEND_LOGIN_URL)
-            for cookie in session_data.get("cookies", []):
-                cookie.pop('sameSite', None)
-                driver.add_cookie(cookie)
+    try:
+        cookies = evend_sessions.load_cookies(EVEND_EMAIL, EVEND_PASSWORD)
+        if cookies:
+            evend_sessions.apply_to_driver(driver, cookies)
             return True
-        except Exception as e:
-            write_log(f"⚠️ Impossible de charger la session: {e}")
+    except Exception as e:
+        write_log(f"⚠️ Impossible de charger la session: {e}")
     return False
 
 # ---------------------------- Login ----------------------------
@@ -170,7 +160,10 @@ def process_csv(csv_path):
     driver = get_driver()
     wait = WebDriverWait(driver, 20)
     try:
-        login(driver, wait)
+        _, relogged = evend_sessions.get_session(EVEND_EMAIL, EVEND_PASSWORD, lambda: login(driver, wait))
+        if not relogged:
+            load_session(driver)
+            write_log("♻️ Session e-Vend réutilisée, connexion évitée")
         for idx, row in df.iterrows():
             titre = str(row.get('titre', 'Titre manquant'))
             write_log(f"📌 Publication article {idx+1}: {titre}")
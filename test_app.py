@@ -0,0 +1,119 @@
+# test_app.py (routes Flask sans eBay : flux SSE des logs)
+import os
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("pandas")
+os.environ.setdefault("EVEND_GC_INTERVAL", "0")  # pas de ménage d'uploads/ pendant les tests
+
+import app as evend_app
+import evend_storage
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(evend_app, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setattr(evend_app, "SSE_MAX_DURATION", 0.3)
+    monkeypatch.setattr(evend_app, "SSE_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(evend_app, "publish_progress", lambda user_id: {"queued": False})
+    client = evend_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = "u1"
+    return client
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if ": " in line)
+        events.append(fields)
+    return events
+
+
+# ===== /events =====
+def test_events_requires_session():
+    assert evend_app.app.test_client().get("/events").status_code == 204
+
+
+def test_events_stream_is_bounded_and_carries_offsets(client, tmp_path):
+    (tmp_path / "u1_import_log.txt").write_text("ligne 1\nligne 2\n", encoding="utf-8")
+
+    body = client.get("/events").get_data(as_text=True)  # se termine : flux borné
+    events = parse_events(body)
+    assert events[0] == {"id": "0:0", "retry": str(evend_app.SSE_RETRY_MS)}
+    log_events = [e for e in events if e.get("event") == "import_log"]
+    assert len(log_events) == 1
+    assert log_events[0]["id"] == "16:0"
+    assert '"log": "ligne 1\\nligne 2\\n"' in log_events[0]["data"]
+
+
+def test_events_resume_from_last_event_id(client, tmp_path):
+    log = tmp_path / "u1_import_log.txt"
+    log.write_text("ligne 1\nligne 2\n", encoding="utf-8")
+    with open(log, "a", encoding="utf-8") as f:
+        f.write("ligne 3\n")
+
+    body = client.get("/events", headers={"Last-Event-ID": "16:0"}).get_data(as_text=True)
+    events = parse_events(body)
+    assert events[0]["id"] == "16:0"
+    log_events = [e for e in events if e.get("event") == "import_log"]
+    assert len(log_events) == 1 and '"log": "ligne 3\\n"' in log_events[0]["data"]
+
+
+def test_events_query_offsets_when_no_event_id(client, tmp_path):
+    (tmp_path / "u1_import_log.txt").write_text("ligne 1\nligne 2\n", encoding="utf-8")
+    body = client.get("/events?import_offset=16").get_data(as_text=True)
+    assert not [e for e in parse_events(body) if e.get("event") == "import_log"]
+
+
+# ===== Export eBay =====
+def test_fetch_active_items_raises_instead_of_partial_list(monkeypatch):
+    def fake_page(oauth_token, page_number, per_page, sort="TimeLeft"):
+        if page_number == 2:
+            raise RuntimeError("timeout eBay")
+        return [{"item_id": str(page_number)}], 3
+    monkeypatch.setattr(evend_app, "fetch_active_page", fake_page)
+
+    with pytest.raises(RuntimeError):
+        evend_app.fetch_active_items("token", 300)
+
+
+# ===== Export complet par curseur =====
+@pytest.fixture
+def export_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(evend_app, "DB_PATH", str(tmp_path / "evend.db"))
+    monkeypatch.setattr(evend_app, "EXPORT_FOLDER", str(tmp_path / "exports"))
+    monkeypatch.setattr(evend_app, "EXPORT_PER_PAGE", 2)
+    monkeypatch.setattr(evend_storage, "DB_PATH", str(tmp_path / "evend.db"))
+    monkeypatch.setattr(evend_storage, "STORE_FOLDER", str(tmp_path / "store"))
+    evend_app.init_db()
+    evend_storage.init_storage_table()
+
+
+def test_export_cursor_resumes_without_losing_or_repeating_items(export_db, monkeypatch):
+    catalog = [f"i{n}" for n in range(6)]
+    failing = {2}
+
+    def fake_page(oauth_token, page, per_page, sort="TimeLeft"):
+        if page in failing:
+            raise RuntimeError("timeout eBay")
+        items = [{"item_id": item_id} for item_id in catalog[(page - 1) * per_page:page * per_page]]
+        return items, -(-len(catalog) // per_page)
+    monkeypatch.setattr(evend_app, "fetch_active_page", fake_page)
+
+    cursor = evend_app.new_export_cursor("u1")
+    assert evend_app.advance_export(cursor, "token", 100) == "timeout eBay"
+    assert evend_app.get_export_cursor("u1")["next_page"] == 2  # page 1 gardée
+
+    # Entre-temps i0 est terminée : i2 remonte en page 1 et ne doit pas être perdue
+    catalog.remove("i0")
+    failing.clear()
+    cursor = evend_app.get_export_cursor("u1")
+    assert evend_app.advance_export(cursor, "token", 100) is None
+    paths, count = evend_app.deliver_export(cursor)
+
+    exported = [line.split(",")[0] for path in paths
+                for line in open(path, encoding="utf-8-sig").read().splitlines()[1:]]
+    assert exported == ["i0", "i1", "i2", "i3", "i4", "i5"] and count == 6
+    assert evend_app.get_export_cursor("u1") is None  # export fini : curseur supprimé
@@ -0,0 +1,50 @@
+# test_ebay_prefetch.py (préchargement hors pointe : un export incomplet n'est jamais servi)
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("pandas")
+os.environ.setdefault("EVEND_GC_INTERVAL", "0")  # pas de ménage d'uploads/ pendant les tests
+
+import app as evend_app
+import ebay_prefetch
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(evend_app, "DB_PATH", str(tmp_path / "evend.db"))
+    monkeypatch.setattr(ebay_prefetch, "PREFETCH_FOLDER", str(tmp_path))
+    evend_app.init_db()
+    ebay_prefetch.init_budget()
+    monkeypatch.setattr(ebay_prefetch, "get_valid_token", lambda user_id: "token")
+
+
+def attempt(user_id):
+    conn = evend_app.get_db()
+    row = conn.execute("SELECT * FROM prefetch_attempts WHERE user_id=?", (user_id,)).fetchone()
+    conn.close()
+    return row
+
+
+def test_page_failure_is_recorded_as_failed(monkeypatch):
+    def fake_page(oauth_token, page_number, per_page, sort="TimeLeft"):
+        if page_number == 2:
+            raise RuntimeError("timeout eBay")
+        return [{"item_id": str(page_number)}], 5
+    monkeypatch.setattr(evend_app, "fetch_active_page", fake_page)
+
+    assert ebay_prefetch.prefetch_user("u1")
+    assert attempt("u1")["status"] == "failed"
+    assert evend_app.take_prefetched_export("u1", 1000) == (None, 0)
+
+
+def test_daemon_starts_prefetch_scheduler(monkeypatch):
+    pytest.importorskip("selenium")
+    import evend_daemon
+
+    started = threading.Event()
+    monkeypatch.setattr(ebay_prefetch, "run_scheduler", started.set)
+    evend_daemon.start_prefetch()
+    assert started.wait(2)
@@ -0,0 +1,69 @@
+# test_evend_categories.py (résolution catégorie eBay -> e-Vend)
+import pytest
+
+import evend_categories
+
+
+@pytest.fixture(autouse=True)
+def isolated_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(evend_categories, "DB_PATH", str(tmp_path / "evend.db"))
+    monkeypatch.setattr(evend_categories, "INDEX_FILE", str(tmp_path / "evend_categories.json"))
+    evend_categories.init_overrides_table()
+    evend_categories.reload()
+    yield
+    evend_categories.reload()
+
+
+def test_normalize_strips_accents_and_connectors():
+    assert evend_categories.normalize("Vêtements / Chaussures & Accessoires") == "vetements chaussures accessoires"
+    assert evend_categories.normalize("Livres et BD") == "livres bd"
+
+
+@pytest.mark.parametrize("name, category, method", [
+    ("Livres", "Livres", "exact"),
+    ("DVD", "DVD", "exact"),
+    ("Cell Phones & Smartphones", "Électronique", "mots-clés"),
+    ("Vintage Books Magazines", "Livres", "mots-clés"),
+    ("Électroniqe", "Électronique", "approché"),
+    ("Zzz inconnu", "Autre / Divers", "défaut"),
+])
+def test_resolve_methods(name, category, method):
+    assert evend_categories.resolve(name, with_method=True) == (category, method)
+
+
+def test_keyword_tie_does_not_depend_on_word_order():
+    # « books » -> Livres, « toys » -> Jouets / Jeux : une voix chacun
+    assert evend_categories.resolve("Books & Toys") == evend_categories.resolve("Toys & Books")
+    assert evend_categories.resolve("Books & Toys", with_method=True)[1] != "mots-clés"
+
+
+def test_resolved_value_is_stable():
+    value = evend_categories.resolve("Cell Phones & Smartphones")
+    assert evend_categories.resolve(value) == value
+
+
+def test_override_wins_and_can_be_removed():
+    evend_categories.set_override("Cell Phones & Smartphones", "Collection")
+    assert evend_categories.resolve("cell phones smartphones", with_method=True) == ("Collection", "forçage")
+
+    evend_categories.remove_override("Cell Phones & Smartphones")
+    assert evend_categories.resolve("Cell Phones & Smartphones") == "Électronique"
+
+
+def test_override_rejects_unknown_category():
+    with pytest.raises(ValueError, match="Livres"):
+        evend_categories.set_override("Books", "Livre")
+    assert evend_categories.load_overrides() == {}
+
+
+def test_build_index_from_html():
+    html = """<select id="categorie">
+        <option value="" disabled>Choisir</option>
+        <option value="Livres">Livres</option>
+        <option value="Autre / Divers">Autre / Divers</option>
+    </select>"""
+    index = evend_categories.build_index(evend_categories.categories_from_html(html))
+    assert [c["value"] for c in index["categories"]] == ["Livres", "Autre / Divers"]
+    assert index["default"] == "Autre / Divers"
+    assert index["keywords"]["books"] == "Livres"
+    assert "dvd" not in index["keywords"]  # catégorie absente de l'arbre : mots-clés ignorés
@@ -0,0 +1,76 @@
+# test_evend_http.py (publisher HTTP contre le faux e-Vend local de fake_evend.py)
+import threading
+
+import pytest
+
+requests = pytest.importorskip("requests")
+pytest.importorskip("flask")
+pytest.importorskip("PIL")
+
+from werkzeug.serving import make_server
+
+import evend_http
+import fake_evend
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    latency, fake_evend.app.config["LATENCY"] = fake_evend.app.config["LATENCY"], 0
+    server = make_server("127.0.0.1", 0, fake_evend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    fake_evend.app.config["LATENCY"] = latency
+
+
+@pytest.fixture(autouse=True)
+def fake_site(base_url, monkeypatch):
+    monkeypatch.setitem(fake_evend.app.config, "FAILURE_RATE", 0)
+    monkeypatch.setattr(evend_http, "EVEND_NEW_LISTING_URL",
+                        f"{base_url}/l/draft/{evend_http.EMPTY_DRAFT_ID}/new/details")
+    monkeypatch.setattr(evend_http, "EVEND_DRAFT_URL", f"{base_url}/l/draft")
+    monkeypatch.setattr(evend_http, "EVEND_DETAILS_URL", base_url + "/l/draft/{draft_id}/details")
+
+
+def login(base_url):
+    resp = requests.post(f"{base_url}/login", data={"email": "a@example.com", "password": "pw"},
+                         allow_redirects=False)
+    return [{"name": name, "value": value} for name, value in resp.cookies.items()]
+
+
+FIELDS = {"titre": "Livre", "prix": "12.5", "stock": "1"}
+
+
+def test_publish_with_photo(base_url, tmp_path):
+    photo = tmp_path / "a.jpg"
+    photo.write_bytes(b"jpeg")
+    before = dict(fake_evend.stats)
+
+    publisher = evend_http.EvendHttpPublisher(login(base_url))
+    draft_id = publisher.publish(FIELDS, {"livraison": "ramassage"}, [str(photo)])
+    publisher.close()
+
+    assert evend_http.listing_id_from_url(f"/l/draft/{draft_id}") == draft_id
+    assert fake_evend.stats["published"] == before["published"] + 1
+    assert fake_evend.stats["photos"] == before["photos"] + 1
+
+
+def test_rejected_form_falls_back_to_selenium(base_url):
+    publisher = evend_http.EvendHttpPublisher(login(base_url))
+    with pytest.raises(evend_http.HttpPublishError) as excinfo:
+        publisher.publish(dict(FIELDS, titre=""))
+    assert not isinstance(excinfo.value, evend_http.HttpSubmitUncertain)  # 422 : repli sans risque
+    assert excinfo.value.status == 422
+
+
+def test_server_error_after_submit_is_uncertain(base_url, monkeypatch):
+    monkeypatch.setitem(fake_evend.app.config, "FAILURE_RATE", 1)
+    publisher = evend_http.EvendHttpPublisher(login(base_url))
+    with pytest.raises(evend_http.HttpSubmitUncertain):
+        publisher.publish(FIELDS)  # l'annonce existe peut-être : pas de repli Selenium
+
+
+def test_expired_session_is_detected(base_url):
+    publisher = evend_http.EvendHttpPublisher([])
+    with pytest.raises(evend_http.HttpPublishError, match="session expirée"):
+        publisher.publish(FIELDS)
@@ -0,0 +1,55 @@
+# test_evend_images.py (préparation des photos en tâche de fond, pool "spawn" unique)
+import threading
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from functools import partial
+
+import pytest
+
+pytest.importorskip("requests")
+
+import evend_images
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    monkeypatch.setattr(evend_images, "IMAGE_CACHE_DIR", str(cache))
+    monkeypatch.setattr(evend_images, "URL_INDEX_FILE", str(cache / "url_index.json"))
+    return cache
+
+
+@pytest.fixture
+def photo_server(tmp_path):
+    site = tmp_path / "site"
+    site.mkdir()
+    (site / "a.jpg").write_bytes(b"pas vraiment un jpeg")
+    handler = partial(SimpleHTTPRequestHandler, directory=str(site))
+    handler.log_message = lambda *args: None
+    server = HTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_pool_is_shared_and_spawned():
+    pool = evend_images.get_pool()
+    assert evend_images.get_pool() is pool
+    assert pool._mp_context.get_start_method() == "spawn"
+
+
+def test_batch_runs_in_background_then_hits_cache(cache_dir, photo_server):
+    url, missing = f"{photo_server}/a.jpg", f"{photo_server}/absent.jpg"
+    logged, polls = [], []
+
+    batch = evend_images.ImageBatch([url, missing, url, ""], log=logged.append)
+    assert len(batch.futures) == 2  # soumis dès la création, avant l'attente du tour
+    ready = batch.result(on_poll=lambda: polls.append(1), poll_interval=0.01)
+
+    assert list(ready) == [url]
+    assert ready[url].startswith(str(cache_dir))
+    assert any("Erreur image" in line and "absent.jpg" in line for line in logged)
+
+    again = evend_images.ImageBatch([url], log=logged.append)
+    assert not again.futures and again.cached == 1
+    assert again.result() == {url: ready[url]}
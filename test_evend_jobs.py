@@ -0,0 +1,60 @@
+# test_evend_jobs.py (file des jobs : annulation, pause, reprise)
+import pytest
+
+import evend_jobs
+
+
+@pytest.fixture(autouse=True)
+def isolated_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(evend_jobs, "DB_PATH", str(tmp_path / "evend.db"))
+    monkeypatch.setattr(evend_jobs.evend_scheduler, "reset_queue", lambda: None)
+    evend_jobs.init_jobs_table()
+
+
+def new_job(user_id="u1"):
+    return evend_jobs.submit_job(user_id, "import.csv", "a@example.com", "pw")
+
+
+def test_pending_job_changes_state_immediately():
+    job_id = new_job()
+    assert evend_jobs.control_job(job_id, "pause") == "paused"
+    assert evend_jobs.claim_next_job() is None  # un job en pause n'est pas repris
+    assert evend_jobs.control_job(job_id, "resume") == "pending"
+    assert evend_jobs.control_job(job_id, "cancel") == "cancelled"
+    assert evend_jobs.get_job(job_id)["evend_password"] is None
+
+
+def test_running_job_gets_a_request_for_its_worker():
+    job_id = new_job()
+    evend_jobs.claim_next_job()
+    assert evend_jobs.control_job(job_id, "pause") == "pausing"
+    assert evend_jobs.get_control(job_id) == "pause"
+
+    assert evend_jobs.pause_job(job_id) == "paused"  # le worker applique la pause
+    job = evend_jobs.get_job(job_id)
+    assert job["control"] is None and job["evend_password"] == "pw"  # gardé pour la reprise
+
+
+def test_resume_before_worker_applies_pause():
+    job_id = new_job()
+    evend_jobs.claim_next_job()
+    evend_jobs.control_job(job_id, "pause")
+    assert evend_jobs.control_job(job_id, "resume") == "running"
+    assert evend_jobs.pause_job(job_id) == "pending"  # le worker s'était déjà arrêté : repart aussitôt
+
+
+def test_requeue_applies_requests_left_by_a_stopped_daemon():
+    cancelled, paused, resumed = new_job("a"), new_job("b"), new_job("c")
+    for _ in range(3):
+        evend_jobs.claim_next_job()
+    evend_jobs.control_job(cancelled, "cancel")
+    evend_jobs.control_job(paused, "pause")
+
+    evend_jobs.requeue_interrupted_jobs()
+    assert [evend_jobs.get_job(j)["status"] for j in (cancelled, paused, resumed)] == [
+        "cancelled", "paused", "pending"]
+
+
+def test_unknown_action_is_refused():
+    with pytest.raises(ValueError):
+        evend_jobs.control_job(new_job(), "restart")
@@ -0,0 +1,173 @@
+# test_evend_publish.py (pré-validation, rapports et contrôles du publisher, sans navigateur)
+import os
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("selenium")
+
+import evend_publish
+
+
+@pytest.fixture
+def job(tmp_path, monkeypatch):
+    monkeypatch.setattr(evend_publish, "UPLOAD_FOLDER", str(tmp_path))
+    job = evend_publish.PublishJob("u1", "vendeur@example.com", "pw")
+    monkeypatch.setattr(evend_publish._current, "job", job, raising=False)
+    return job
+
+
+# ===== Pré-validation et rapport de rejet =====
+def test_prevalidate_splits_valid_and_rejected(job):
+    df = pd.DataFrame({
+        "sku": ["A", "", "C", "D"],
+        "titre": ["Livre", "Sans sku", "", "Épuisé"],
+        "prix": ["12.5", "3", "4", "oops"],
+        "stock": [2, 1, 1, 0],
+        "image_url": ["http://img/a.jpg", "", "", ""],
+    })
+    valid, rejected = evend_publish.prevalidate_dataframe(df)
+
+    assert valid.index.tolist() == [0]
+    assert valid.loc[0, "photo_defaut"] == "http://img/a.jpg"
+    assert valid.loc[0, "prix"] == 12.5
+    assert valid.loc[0, "description"] == evend_publish.CSV_DEFAULTS["description"]
+    assert rejected["motif_rejet"].to_dict() == {
+        1: "sku manquant",
+        2: "titre manquant",
+        3: "prix manquant ou invalide;stock épuisé",
+    }
+
+
+def test_rejection_report_lives_outside_watched_root(job, tmp_path):
+    rejected = pd.DataFrame({"motif_rejet": ["titre manquant"], "sku": ["A"]}, index=[4])
+    evend_publish.write_rejection_report(rejected, job.rejects_file)
+
+    assert job.rejects_file == os.path.join(str(tmp_path), "rejects", "u1.csv")
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".csv")]  # rien pour watch_folder
+    report = pd.read_csv(job.rejects_file, encoding="utf-8-sig")
+    assert report.to_dict("records") == [{"ligne_csv": 6, "motif_rejet": "titre manquant", "sku": "A"}]
+
+    evend_publish.write_rejection_report(rejected.iloc[0:0], job.rejects_file)
+    assert not os.path.exists(job.rejects_file)
+
+
+# ===== Liste des échecs (dead letters) =====
+def dead_row(idx, sku, error="refusé"):
+    return {"ligne_csv": idx + 2, "sku": sku, "type_erreur": evend_publish.PERMANENT, "erreur": error}
+
+
+def test_dead_letters_survive_resume_and_dedupe(job):
+    evend_publish.save_progress(job, 0, 4, "import.csv")
+    evend_publish.write_dead_letter_report([dead_row(1, "A"), dead_row(3, "B")], job.dead_letter_file)
+
+    run = evend_publish.ImportRun(job, "import.csv")  # reprise : la liste existante est gardée
+    run.dead = [dead_row(3, "B", "refusé encore"), dead_row(7, "C")]
+    run.close()
+
+    report = pd.read_csv(job.dead_letter_file, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    assert report["sku"].tolist() == ["A", "B", "C"]
+    assert report.loc[report["sku"] == "B", "erreur"].item() == "refusé encore"
+
+
+def test_fresh_run_clears_previous_dead_letters(job):
+    evend_publish.write_dead_letter_report([dead_row(1, "A")], job.dead_letter_file)
+
+    run = evend_publish.ImportRun(job, "nouveau.csv")
+    assert not os.path.exists(job.dead_letter_file)
+    run.close()
+    assert not os.path.exists(job.dead_letter_file)
+
+
+# ===== Statut final d'un import =====
+def test_missing_csv_fails_the_job(job, tmp_path, monkeypatch):
+    monkeypatch.setattr(evend_publish.evend_scheduler, "leave_queue", lambda user_id: None)
+    with pytest.raises(FileNotFoundError):
+        evend_publish.process_csv(str(tmp_path / "absent.csv"), job)
+
+
+def test_empty_or_invalid_csv_is_reported_empty(job, tmp_path):
+    empty = tmp_path / "vide.csv"
+    empty.write_text("sku,titre,prix,stock\n", encoding="utf-8")
+    invalid = tmp_path / "invalide.csv"
+    invalid.write_text("sku,titre,prix,stock\nA,,3,1\n", encoding="utf-8")
+
+    assert evend_publish.process_csv(str(empty), job) == "empty"
+    assert evend_publish.process_csv(str(invalid), job) == "empty"
+
+
+# ===== Remplissage du formulaire (faux driver) =====
+class FakeElement:
+    def __init__(self, value="", selected=False):
+        self.value, self.selected, self.clicks, self.typed = value, selected, 0, []
+
+    def get_attribute(self, name):
+        return self.value
+
+    def is_selected(self):
+        return self.selected
+
+    def click(self):
+        self.clicks += 1
+        self.selected = True
+
+    def clear(self):
+        self.typed = []
+
+    def send_keys(self, text):
+        self.typed.append(text)
+
+
+class FakeDriver:
+    def __init__(self, script_failed, fields, radios):
+        self.script_failed, self.fields, self.radios, self.scripts = script_failed, fields, radios, 0
+
+    def execute_script(self, script, *args):
+        self.scripts += 1
+        return self.script_failed
+
+    def find_element(self, by, field_id):
+        if field_id not in self.fields:
+            raise LookupError(field_id)
+        return self.fields[field_id]
+
+    def find_elements(self, by, name):
+        return self.radios.get(name, [])
+
+
+def test_check_radio_already_selected_is_success(job):
+    chosen = FakeElement("ramassage", selected=True)
+    driver = FakeDriver([], {}, {"livraison": [FakeElement("livraison"), chosen]})
+
+    assert evend_publish.check_radio(driver, "livraison", "ramassage")
+    assert chosen.clicks == 0
+    assert not evend_publish.check_radio(driver, "livraison", "inconnu")
+
+
+def test_fill_form_one_script_then_per_field_fallback(job):
+    titre = FakeElement()
+    ramassage = FakeElement("ramassage")
+    driver = FakeDriver(["titre", "radio:livraison", "absent"], {"titre": titre},
+                        {"livraison": [FakeElement("livraison", selected=True), ramassage]})
+
+    failed = evend_publish.fill_form(driver, {"titre": "Livre", "prix": "12", "absent": "x"},
+                                     {"livraison": "ramassage"})
+    assert driver.scripts == 1
+    assert titre.typed == ["Livre"]
+    assert ramassage.selected
+    assert failed == ["absent"]
+
+
+# ===== Contrôle du job pendant les attentes =====
+@pytest.mark.parametrize("action, error", [("cancel", evend_publish.ImportCancelled),
+                                           ("pause", evend_publish.ImportPaused)])
+def test_check_control_reads_the_job_store(job, tmp_path, monkeypatch, action, error):
+    monkeypatch.setattr(evend_publish.evend_jobs, "DB_PATH", str(tmp_path / "evend.db"))
+    evend_publish.evend_jobs.init_jobs_table()
+    job.job_id = evend_publish.evend_jobs.submit_job("u1", "import.csv", job.email, job.password)
+    evend_publish.evend_jobs.claim_next_job()
+
+    evend_publish.check_control(job)  # aucune demande : continue
+    evend_publish.evend_jobs.control_job(job.job_id, action)
+    with pytest.raises(error):
+        evend_publish.interruptible_sleep(job, 5)
@@ -0,0 +1,123 @@
+# test_evend_scheduler.py (file de publication : choix du tour, entrées abandonnées)
+import time
+
+import pytest
+
+import evend_scheduler
+
+
+@pytest.fixture(autouse=True)
+def queue_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(evend_scheduler, "QUEUE_FILE", str(tmp_path / "queue.json"))
+    monkeypatch.setattr(evend_scheduler, "QUEUE_LOCK_FILE", str(tmp_path / "queue.json.lock"))
+    monkeypatch.setattr(evend_scheduler, "THROUGHPUT_FILE", str(tmp_path / "throughput.json"))
+    monkeypatch.setattr(evend_scheduler, "PUBLISH_SLOTS", 1)
+
+
+def entry(user_id, remaining=100, served=0, priority=0, enqueued_at=0.0, **extra):
+    return {"id": user_id, "articles": remaining, "remaining": remaining, "served": served,
+            "weight": 1, "priority": priority, "enqueued_at": enqueued_at,
+            "last_seen": time.time(), "running": False, **extra}
+
+
+# ===== _pick_next =====
+def test_pick_next_fair_prefers_least_served():
+    jobs = [entry("a", served=40, enqueued_at=1), entry("b", served=20, enqueued_at=2)]
+    assert evend_scheduler._pick_next(jobs, "fair")["id"] == "b"
+
+
+def test_pick_next_srpt_prefers_smallest_remaining():
+    jobs = [entry("big", remaining=500, enqueued_at=1), entry("small", remaining=10, enqueued_at=2)]
+    assert evend_scheduler._pick_next(jobs, "srpt")["id"] == "small"
+
+
+def test_pick_next_fifo_prefers_oldest():
+    jobs = [entry("late", enqueued_at=5), entry("early", enqueued_at=1)]
+    assert evend_scheduler._pick_next(jobs, "fifo")["id"] == "early"
+
+
+@pytest.mark.parametrize("policy", ["fair", "srpt", "fifo"])
+def test_pick_next_priority_beats_policy(policy):
+    jobs = [entry("normal", remaining=10, enqueued_at=1), entry("urgent", remaining=500, served=100,
+                                                              priority=5, enqueued_at=9)]
+    assert evend_scheduler._pick_next(jobs, policy)["id"] == "urgent"
+
+
+def test_pick_next_skips_running_and_done():
+    jobs = [entry("running", running=True), entry("done", remaining=0, enqueued_at=1),
+            entry("waiting", enqueued_at=2)]
+    assert evend_scheduler._pick_next(jobs, "fifo", skip_done=True)["id"] == "waiting"
+    assert evend_scheduler._pick_next([entry("x", running=True)], "fifo") is None
+
+
+# ===== try_acquire_turn =====
+def test_try_acquire_turn_unknown_user_passes():
+    assert evend_scheduler.try_acquire_turn("absent")
+
+
+def test_try_acquire_turn_takes_turns():
+    evend_scheduler.enter_queue("a", 100)
+    evend_scheduler.enter_queue("b", 100)
+    assert evend_scheduler.try_acquire_turn("a")
+    assert not evend_scheduler.try_acquire_turn("b")  # slot occupé par a
+
+    evend_scheduler.release_turn("a", 20)
+    assert evend_scheduler.try_acquire_turn("b")  # a déjà servi : b passe
+
+
+def test_try_acquire_turn_drops_stale_waiting_entry(monkeypatch):
+    evend_scheduler.enter_queue("dead", 10, priority=5)
+    evend_scheduler.enter_queue("alive", 10)
+
+    jobs = evend_scheduler.load_queue()
+    for job in jobs:
+        if job["id"] == "dead":
+            job["last_seen"] = time.time() - evend_scheduler.STALE_ENTRY_SECONDS - 1
+    evend_scheduler._write_json(evend_scheduler.QUEUE_FILE, jobs)
+
+    # Sans le ménage, "dead" (priorité 5) resterait élu et bloquerait la file
+    assert evend_scheduler.try_acquire_turn("alive")
+    assert [j["id"] for j in evend_scheduler.load_queue()] == ["alive"]
+
+
+def test_try_acquire_turn_frees_abandoned_turn():
+    evend_scheduler.enter_queue("crashed", 100)
+    evend_scheduler.enter_queue("next", 100)
+    assert evend_scheduler.try_acquire_turn("crashed")
+
+    jobs = evend_scheduler.load_queue()
+    for job in jobs:
+        if job["id"] == "crashed":
+            job["turn_started_at"] = time.time() - evend_scheduler.STALE_TURN_SECONDS - 1
+            job["served"] = 20
+    evend_scheduler._write_json(evend_scheduler.QUEUE_FILE, jobs)
+
+    assert evend_scheduler.try_acquire_turn("next")
+
+
+def test_heartbeat_keeps_waiting_entry():
+    evend_scheduler.enter_queue("streaming", 10)
+    jobs = evend_scheduler.load_queue()
+    jobs[0]["last_seen"] = time.time() - evend_scheduler.STALE_ENTRY_SECONDS - 1
+    evend_scheduler._write_json(evend_scheduler.QUEUE_FILE, jobs)
+
+    evend_scheduler.heartbeat("streaming")
+    evend_scheduler.enter_queue("other", 10)
+    evend_scheduler.try_acquire_turn("other")
+    assert "streaming" in [j["id"] for j in evend_scheduler.load_queue()]
+
+
+def test_newcomer_starts_at_current_virtual_time():
+    evend_scheduler.enter_queue("old", 200)
+    for _ in range(5):
+        assert evend_scheduler.try_acquire_turn("old")
+        evend_scheduler.release_turn("old", 20)
+
+    evend_scheduler.enter_queue("new", 200)
+    # Même temps virtuel : l'ancien n'attend pas que le nouveau ait rattrapé ses 100 articles
+    assert evend_scheduler.try_acquire_turn("old")
+    evend_scheduler.release_turn("old", 20)
+    assert not evend_scheduler.try_acquire_turn("old")
+    assert evend_scheduler.try_acquire_turn("new")
+    evend_scheduler.release_turn("new", 20)
+    assert evend_scheduler.try_acquire_turn("old")
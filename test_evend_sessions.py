@@ -0,0 +1,59 @@
+# test_evend_sessions.py (cache de sessions e-Vend : réutilisation liée au mot de passe)
+import pytest
+
+pytest.importorskip("requests")
+
+import evend_sessions
+
+
+@pytest.fixture(autouse=True)
+def isolated_sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(evend_sessions, "SESSIONS_DIR", str(tmp_path))
+    monkeypatch.setattr(evend_sessions, "SECRET_FILE", str(tmp_path / ".secret"))
+    monkeypatch.setattr(evend_sessions, "SESSION_SECRET", None)
+    monkeypatch.setattr(evend_sessions, "probe", lambda cookies: True)
+    evend_sessions._probe_cache.clear()
+
+
+def owner_login(email="vendeur@example.com", password="bon"):
+    calls = []
+    def login():
+        calls.append(password)
+        evend_sessions.save_cookies(email, [{"name": "sid", "value": "abc"}], password)
+    return login, calls
+
+
+def test_cached_session_reused_with_same_password():
+    login, calls = owner_login()
+    assert evend_sessions.get_session("vendeur@example.com", "bon", login) == ([{"name": "sid", "value": "abc"}], True)
+    assert evend_sessions.get_session("Vendeur@Example.com ", "bon", login) == ([{"name": "sid", "value": "abc"}], False)
+    assert calls == ["bon"]
+
+
+def test_wrong_password_is_a_cache_miss():
+    login, _ = owner_login()
+    evend_sessions.get_session("vendeur@example.com", "bon", login)
+
+    attempts = []
+    def failing_login():
+        attempts.append(1)
+        raise RuntimeError("identifiants refusés")
+
+    with pytest.raises(RuntimeError):
+        evend_sessions.get_session("vendeur@example.com", "mauvais", failing_login)
+    assert attempts == [1]
+    assert evend_sessions.load_cookies("vendeur@example.com", "mauvais") is None
+    # La session du titulaire n'est pas effacée par l'essai raté
+    assert evend_sessions.load_cookies("vendeur@example.com", "bon") == [{"name": "sid", "value": "abc"}]
+
+
+def test_legacy_session_without_verifier_is_ignored(tmp_path):
+    (tmp_path / f"{evend_sessions.account_key('vendeur@example.com')}.json").write_text(
+        '{"timestamp": 9999999999, "cookies": [{"name": "sid", "value": "old"}]}')
+    assert evend_sessions.load_cookies("vendeur@example.com", "bon") is None
+
+
+def test_verifier_depends_on_secret(monkeypatch):
+    first = evend_sessions.password_verifier("a@example.com", "pw")
+    monkeypatch.setattr(evend_sessions, "SESSION_SECRET", "autre-secret")
+    assert evend_sessions.password_verifier("a@example.com", "pw") != first
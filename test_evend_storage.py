@@ -0,0 +1,158 @@
+# test_evend_storage.py (stockage adressé par contenu : déduplication et rétention)
+import os
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import evend_storage
+
+
+@pytest.fixture(autouse=True)
+def isolated_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(evend_storage, "DB_PATH", str(tmp_path / "evend.db"))
+    monkeypatch.setattr(evend_storage, "STORE_FOLDER", str(tmp_path / "store"))
+    monkeypatch.setattr(evend_storage, "STORE_KEEP_PER_USER", 2)
+    monkeypatch.setattr(evend_storage, "ORPHAN_GRACE", 0)
+    os.makedirs(evend_storage.STORE_FOLDER)
+    evend_storage.init_storage_table()
+
+
+def make_csv(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+def test_store_file_deduplicates_content(tmp_path):
+    first = evend_storage.store_file("u1", make_csv(tmp_path, "a.csv", "sku\n1\n"))
+    second = evend_storage.store_file("u2", make_csv(tmp_path, "b.csv", "sku\n1\n"))
+    assert first == second
+    assert not os.path.exists(tmp_path / "b.csv")
+    assert evend_storage.usage()["referenced"] == 2 * evend_storage.usage()["stored"]
+
+
+def test_prune_references_keeps_latest_per_user(tmp_path):
+    now = datetime.utcnow()
+    for i in range(4):
+        evend_storage.store_file("u1", make_csv(tmp_path, f"e{i}.csv", f"sku\n{i}\n"),
+                                 created_at=(now - timedelta(minutes=10 - i)).isoformat())
+    evend_storage.store_file("u2", make_csv(tmp_path, "other.csv", "sku\nx\n"))
+
+    stats = {}
+    evend_storage.prune_references(stats)
+    assert stats["references"] == 2
+    assert [f["name"] for f in evend_storage.user_files("u1")] == ["e3.csv", "e2.csv"]
+    assert len(evend_storage.user_files("u2")) == 1
+
+
+def test_prune_references_drops_expired(tmp_path):
+    old = (datetime.utcnow() - evend_storage.STORE_RETENTION - timedelta(days=1)).isoformat()
+    evend_storage.store_file("u1", make_csv(tmp_path, "old.csv", "sku\nold\n"), created_at=old)
+
+    stats = {}
+    evend_storage.prune_references(stats)
+    assert stats["references"] == 1
+    assert evend_storage.user_files("u1") == []
+
+
+def test_prune_references_keeps_protected_last_csv(tmp_path):
+    old = (datetime.utcnow() - evend_storage.STORE_RETENTION - timedelta(days=1)).isoformat()
+    path = evend_storage.store_file("u1", make_csv(tmp_path, "last.csv", "sku\nlast\n"), created_at=old)
+    conn = evend_storage.get_db()
+    conn.execute("CREATE TABLE users (id TEXT PRIMARY KEY, last_csv_path TEXT)")
+    conn.execute("INSERT INTO users VALUES (?, ?)", ("u1", path))
+    conn.commit()
+    conn.close()
+
+    stats = {}
+    evend_storage.prune_references(stats)
+    assert stats["references"] == 0
+
+
+def test_sweep_store_removes_unreferenced_blobs_only(tmp_path):
+    kept = evend_storage.store_file("u1", make_csv(tmp_path, "kept.csv", "sku\nkept\n"))
+    orphan = evend_storage.blob_path("ff" * 32)
+    os.makedirs(os.path.dirname(orphan), exist_ok=True)
+    open(orphan, "w").close()
+
+    stats = {}
+    evend_storage.sweep_store(stats, now=os.path.getmtime(orphan) + 1)
+    assert os.path.exists(kept)
+    assert not os.path.exists(orphan)
+
+
+# ===== Ménage hors stockage : rapports, photos, profils Chrome =====
+DAY = 86400
+
+
+def age(path, seconds, now):
+    os.utime(path, (now - seconds, now - seconds))
+
+
+def mark_active(user_id):
+    conn = evend_storage.get_db()
+    conn.execute("CREATE TABLE IF NOT EXISTS publish_jobs (user_id TEXT, csv_path TEXT, status TEXT)")
+    conn.execute("INSERT INTO publish_jobs VALUES (?, NULL, 'running')", (user_id,))
+    conn.commit()
+    conn.close()
+
+
+def test_sweep_reports_spares_active_users(tmp_path, monkeypatch):
+    folder = tmp_path / "dead_letters"
+    folder.mkdir()
+    monkeypatch.setattr(evend_storage, "REPORT_FOLDERS", [str(folder)])
+    now = 10 * 365 * DAY
+    for user_id in ("idle", "busy", "recent"):
+        (folder / f"{user_id}.csv").write_text("sku\n")
+    age(folder / "idle.csv", 60 * DAY, now)
+    age(folder / "busy.csv", 60 * DAY, now)
+    age(folder / "recent.csv", DAY, now)
+    mark_active("busy")
+
+    stats = {}
+    evend_storage.sweep_reports(stats, now=now)
+    assert sorted(os.listdir(folder)) == ["busy.csv", "recent.csv"]
+    assert stats["reports"] == 1
+
+
+def test_sweep_image_cache_by_age_then_size(tmp_path, monkeypatch):
+    cache = tmp_path / "images_cache"
+    cache.mkdir()
+    monkeypatch.setattr(evend_storage, "IMAGE_CACHE_FOLDER", str(cache))
+    monkeypatch.setattr(evend_storage, "IMAGE_CACHE_MAX_BYTES", 250)
+    now = 10 * 365 * DAY
+    ages = {"a": 30 * DAY, "b": 5 * DAY, "c": 3 * DAY, "d": 60}  # d : utilisée à l'instant
+    index = {}
+    for name, seconds in ages.items():
+        path = cache / f"{name * 64}_1600_82.jpg"
+        path.write_bytes(b"x" * 100)
+        age(path, seconds, now)
+        index[f"http://img/{name}.jpg"] = name * 64
+    (cache / "url_index.json").write_text(json.dumps(index))
+
+    stats = {}
+    evend_storage.sweep_image_cache(stats, now=now)
+    # a : trop vieille ; b : la plus ancienne au-delà du plafond ; d : dans le délai de grâce
+    assert sorted(p[0] for p in os.listdir(cache) if p.endswith(".jpg")) == ["c", "d"]
+    assert sorted(json.loads((cache / "url_index.json").read_text())) == [
+        "http://img/c.jpg", "http://img/d.jpg"]
+
+
+def test_sweep_profiles_keeps_active_and_caps_cache(tmp_path, monkeypatch):
+    profiles = tmp_path / "chrome_profiles"
+    monkeypatch.setattr(evend_storage, "PROFILES_FOLDER", str(profiles))
+    monkeypatch.setattr(evend_storage, "PROFILE_MAX_BYTES", 100)
+    now = 10 * 365 * DAY
+    for name, seconds in (("idle", 60 * DAY), ("busy", 60 * DAY), ("big", DAY), ("pool_0", 60 * DAY)):
+        (profiles / name / "cache").mkdir(parents=True)
+        data = profiles / name / "cache" / "blob"
+        data.write_bytes(b"x" * 200)
+        age(data, seconds, now)
+    mark_active("busy")
+
+    stats = {}
+    evend_storage.sweep_profiles(stats, now=now)
+    assert sorted(os.listdir(profiles)) == ["big", "busy", "pool_0"]  # pool partagé : un job tourne
+    assert not (profiles / "big" / "cache").exists()
+    assert (profiles / "busy" / "cache" / "blob").exists()
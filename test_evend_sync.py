@@ -0,0 +1,96 @@
+# test_evend_sync.py (diff export eBay <-> annonces e-Vend connues)
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+import evend_sync
+
+
+@pytest.fixture(autouse=True)
+def isolated_map(tmp_path, monkeypatch):
+    monkeypatch.setattr(evend_sync, "DB_PATH", str(tmp_path / "evend.db"))
+    evend_sync.init_listing_map()
+
+
+def export(*rows):
+    return pd.DataFrame([dict(zip(["item_id", "sku", "titre", "prix", "stock"], row)) for row in rows])
+
+
+def test_sync_keys_prefers_item_id():
+    df = pd.DataFrame({"item_id": ["111", None, "333.0"], "sku": ["A", "B", "NO_SKU"]})
+    assert evend_sync.sync_keys(df).tolist() == ["111", "B", "333"]
+
+
+def test_plan_sync_splits_new_changed_unchanged():
+    evend_sync.record_listing("u1", "1", "L1", 10.0, 1)
+    evend_sync.record_listing("u1", "2", "L2", 20.0, 1)
+    df = export(("1", "A", "Same", 10.0, 1), ("2", "B", "Changed", 25.0, 1), ("3", "C", "New", 5.0, 1))
+
+    to_create, to_update, to_end, unchanged, rejected = evend_sync.plan_sync("u1", df)
+    assert to_create["sync_key"].tolist() == ["3"]
+    assert to_update.to_dict("records") == [
+        {"sync_key": "2", "evend_listing_id": "L2", "prix": 25.0, "stock": 1, "titre": "Changed"}]
+    assert to_end.empty
+    assert unchanged == 1
+    assert rejected.empty
+
+
+def test_plan_sync_reports_duplicate_keys():
+    df = export(("1", "A", "First", 10.0, 1), ("1", "A", "Again", 12.0, 1))
+
+    to_create, _, _, _, rejected = evend_sync.plan_sync("u1", df)
+    assert to_create["titre"].tolist() == ["First"]
+    assert rejected.index.tolist() == [1]
+    assert rejected["motif_rejet"].iloc[0] == "clé eBay en double (déjà ligne 2)"
+
+
+def test_plan_sync_rejects_changes_without_listing_id():
+    evend_sync.record_listing("u1", "1", None, 10.0, 1)
+    df = export(("1", "A", "Changed", 15.0, 1))
+
+    to_create, to_update, _, unchanged, rejected = evend_sync.plan_sync("u1", df)
+    assert to_create.empty and to_update.empty
+    assert unchanged == 0
+    assert rejected["motif_rejet"].str.contains("id d'annonce e-Vend inconnu").all()
+
+
+def test_plan_sync_ends_missing_listings_within_ratio():
+    for key in ("1", "2", "3"):
+        evend_sync.record_listing("u1", key, f"L{key}", 10.0, 1)
+    df = export(("1", "A", "Kept", 10.0, 1), ("2", "B", "Kept", 10.0, 1))
+
+    _, _, to_end, _, _ = evend_sync.plan_sync("u1", df, end_missing=True, export_complete=True)
+    assert to_end.to_dict("records") == [{"sync_key": "3", "evend_listing_id": "L3"}]
+
+
+def test_plan_sync_never_ends_without_complete_export():
+    for key in ("1", "2", "3"):
+        evend_sync.record_listing("u1", key, f"L{key}", 10.0, 1)
+    logged = []
+    df = export(("1", "A", "Kept", 10.0, 1), ("2", "B", "Kept", 10.0, 1))
+
+    _, _, to_end, _, _ = evend_sync.plan_sync("u1", df, end_missing=True, log=logged.append)
+    assert to_end.empty
+    assert "non garanti complet" in logged[0]
+
+
+def test_plan_sync_exactly_half_missing_is_not_ended():
+    for key in range(10):
+        evend_sync.record_listing("u1", str(key), f"L{key}", 10.0, 1)
+    logged = []
+    df = export(*[(str(key), "S", "Kept", 10.0, 1) for key in range(5)])
+
+    _, _, to_end, _, _ = evend_sync.plan_sync("u1", df, end_missing=True, export_complete=True,
+                                              log=logged.append)
+    assert to_end.empty
+    assert "5 annonce(s)" in logged[0]
+
+
+def test_plan_sync_caps_absolute_end_count(monkeypatch):
+    monkeypatch.setattr(evend_sync, "MAX_END_COUNT", 2)
+    for key in range(10):
+        evend_sync.record_listing("u1", str(key), f"L{key}", 10.0, 1)
+    df = export(*[(str(key), "S", "Kept", 10.0, 1) for key in range(7)])
+
+    _, _, to_end, _, _ = evend_sync.plan_sync("u1", df, end_missing=True, export_complete=True)
+    assert to_end.empty  # 3 fins > plafond de 2